@@ -3,6 +3,10 @@ import numpy as np
 import os
 from pathlib import Path
 from sqlutils import sqlutils
+from schemaDB import schemaDB, indexesDB, ftsDB, rtreeDB
+
+# Le schéma (tables et index) n'est vérifié qu'une fois par processus
+_schema_checked = False
 
 
 def transform_to_df_join(db, query):
@@ -57,11 +61,28 @@ def get_db():
     """
     Récupère la base de données SQLite
 
+    Les connexions sont empruntées au pool partagé par tout le processus :
+    chaque rerun streamlit réutilise la connexion de lecture de son thread
+    et les écritures passent par l'unique connexion d'écriture.
+
     Returns :
         db : bdd sqlutils
     """
+    global _schema_checked
+
     db_path = Path("data/friands.db")
-    db = sqlutils(db_path)
+    db = sqlutils(db_path, pooled=True)
+
+    # Créer les tables et index manquants (migration des bases existantes)
+    if not _schema_checked:
+        for table_name, schema in schemaDB.items():
+            db.create_table(table_name, schema, indexesDB.get(table_name))
+        for fts_name, spec in ftsDB.items():
+            db.create_fts(fts_name, spec)
+        for rtree_name, spec in rtreeDB.items():
+            db.create_rtree(rtree_name, spec)
+        db.commit()
+        _schema_checked = True
     return db
 
 
@@ -205,9 +226,9 @@ def check_url(url, db):
     Returns:
         bool: True si l'URL est déjà dans la base, False
     """
-    query = transform_to_df("restaurants", db, "SELECT url FROM restaurants;")
-    existing_urls = query["url"].tolist()
-    return url in existing_urls
+    # Recherche via l'index unique idx_restaurants_url
+    success, result = db.select("SELECT 1 FROM restaurants WHERE url = ?", (url,))
+    return success and len(result) > 0
 
 
 def delete_restaurant(bdd, id_restaurant):
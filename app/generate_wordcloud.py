@@ -86,7 +86,7 @@ def generate_wordcloud(id_restaurant):
 
     # Accès à la base de données
     db_path = Path("data/friands.db")
-    bdd = sqlutils(db_path)
+    bdd = sqlutils(db_path, pooled=True)
 
     # Select des avis pour le restaurant d'id 'id_restaurant'
     query = f"SELECT avis.id_restaurant, avis.contenu_avis, restaurants.nom FROM avis JOIN restaurants ON avis.id_restaurant = restaurants.id_restaurant WHERE avis.id_restaurant = {id_restaurant}"
@@ -0,0 +1,344 @@
+import math
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from pathlib import Path
+
+
+# Fichier par défaut du cache géographique (géocodage et points d'intérêt OSM)
+GEO_CACHE_PATH = Path(__file__).parent / "data" / "geo_cache.db"
+
+# Précision des tuiles : 6 caractères de geohash, soit environ 0,9 x 0,6 km à Lyon
+GEOHASH_PRECISION = 6
+_GEOHASH_BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+
+EARTH_RADIUS = 6371000  # mètres
+
+
+def normalize_address(address: str) -> str:
+    """
+    Returns the cache key of an address: lowercase, without accents or punctuation.
+    """
+    address = unicodedata.normalize("NFKD", address.lower())
+    address = "".join(c for c in address if not unicodedata.combining(c))
+    return " ".join(re.sub(r"[^\w]+", " ", address).split())
+
+
+def _tile_bits(precision: int) -> tuple:
+    # Nombre de bits de longitude et de latitude d'un geohash de `precision` caractères
+    nb_bits = 5 * precision
+    return (nb_bits + 1) // 2, nb_bits // 2
+
+
+def _tile_index(lat: float, lon: float, precision: int) -> tuple:
+    lon_bits, lat_bits = _tile_bits(precision)
+    ix = min(int((lon + 180) / 360 * 2**lon_bits), 2**lon_bits - 1)
+    iy = min(int((lat + 90) / 180 * 2**lat_bits), 2**lat_bits - 1)
+    return ix, iy
+
+
+def _tile_geohash(ix: int, iy: int, precision: int) -> str:
+    lon_bits, lat_bits = _tile_bits(precision)
+    # Entrelacement des bits : longitude d'abord, comme dans la définition du geohash
+    bits = []
+    for i in range(5 * precision):
+        if i % 2 == 0:
+            lon_bits -= 1
+            bits.append((ix >> lon_bits) & 1)
+        else:
+            lat_bits -= 1
+            bits.append((iy >> lat_bits) & 1)
+    return "".join(
+        _GEOHASH_BASE32[int("".join(map(str, bits[i : i + 5])), 2)]
+        for i in range(0, len(bits), 5)
+    )
+
+
+def geohash(lat: float, lon: float, precision: int = GEOHASH_PRECISION) -> str:
+    """
+    Returns the geohash of a point.
+
+    Args:
+        lat (float): Latitude in degrees.
+        lon (float): Longitude in degrees.
+        precision (int): Number of characters of the geohash.
+
+    Returns:
+        str: The geohash.
+    """
+    return _tile_geohash(*_tile_index(lat, lon, precision), precision)
+
+
+def bounding_box(lat: float, lon: float, radius: float) -> tuple:
+    """
+    Returns the (south, west, north, east) box containing the circle of `radius` metres.
+    """
+    dlat = math.degrees(radius / EARTH_RADIUS)
+    dlon = math.degrees(radius / (EARTH_RADIUS * math.cos(math.radians(lat))))
+    return lat - dlat, lon - dlon, lat + dlat, lon + dlon
+
+
+def tiles_covering(bbox: tuple, precision: int = GEOHASH_PRECISION) -> list:
+    """
+    Returns the geohash tiles covering a (south, west, north, east) box.
+    """
+    south, west, north, east = bbox
+    ix_min, iy_min = _tile_index(south, west, precision)
+    ix_max, iy_max = _tile_index(north, east, precision)
+    return [
+        _tile_geohash(ix, iy, precision)
+        for ix in range(ix_min, ix_max + 1)
+        for iy in range(iy_min, iy_max + 1)
+    ]
+
+
+def tile_bbox(tile: str) -> tuple:
+    """
+    Returns the (south, west, north, east) box of a geohash tile.
+    """
+    bits = "".join(f"{_GEOHASH_BASE32.index(c):05b}" for c in tile)
+    lon_bits, lat_bits = bits[0::2], bits[1::2]
+    ix, iy = int(lon_bits, 2), int(lat_bits, 2)
+    width, height = 360 / 2 ** len(lon_bits), 180 / 2 ** len(lat_bits)
+    west, south = -180 + ix * width, -90 + iy * height
+    return south, west, south + height, west + width
+
+
+def distances(lat: float, lon: float, points: list) -> list:
+    """
+    Returns the haversine distances (metres) between a point and (lat, lon) pairs.
+    """
+    phi = math.radians(lat)
+    result = []
+    for p_lat, p_lon in points:
+        dphi = math.radians(p_lat - lat)
+        dlambda = math.radians(p_lon - lon)
+        a = (
+            math.sin(dphi / 2) ** 2
+            + math.cos(phi) * math.cos(math.radians(p_lat)) * math.sin(dlambda / 2) ** 2
+        )
+        result.append(2 * EARTH_RADIUS * math.asin(math.sqrt(a)))
+    return result
+
+
+def overpass_pois_query(bbox: tuple) -> str:
+    """
+    Returns the single Overpass query fetching restaurants and public transport stops
+    of a (south, west, north, east) box, with coordinates for ways and relations.
+    """
+    box = ",".join(f"{v:.6f}" for v in bbox)
+    return f"""
+    [out:json][timeout:60];
+    (
+      nwr["amenity"="restaurant"]({box});
+      node["highway"="bus_stop"]({box});
+      node["railway"="station"]({box});
+      node["amenity"="subway"]({box});
+    );
+    out center;
+    """
+
+
+def poi_kind(element: dict) -> str:
+    """
+    Returns "restaurant" or "transport" for an element of an Overpass answer.
+    """
+    if element.get("tags", {}).get("amenity") == "restaurant":
+        return "restaurant"
+    return "transport"
+
+
+class GeoCache:
+    """
+    Persistent cache of geocoding results and OpenStreetMap points of interest.
+
+    Geocoding results are keyed by normalized address. Points of interest
+    (restaurants and public transport stops) are stored per geohash tile, so that
+    neighbouring restaurants reuse the same tiles and the counts around any point
+    are computed locally.
+
+    Attributes:
+        filepath (Path): Path of the SQLite file.
+        ttl (float): Seconds after which a tile or an address is fetched again.
+        precision (int): Geohash precision of the tiles.
+    """
+
+    def __init__(
+        self,
+        filepath: Path = GEO_CACHE_PATH,
+        ttl: float = 90 * 86400,
+        precision: int = GEOHASH_PRECISION,
+    ) -> None:
+        """
+        Opens (or creates) the cache.
+
+        Args:
+            filepath (Path): Path of the SQLite file.
+            ttl (float): Seconds after which a tile or an address is fetched again.
+            precision (int): Geohash precision of the tiles.
+        """
+        self.filepath = Path(filepath)
+        self.ttl = ttl
+        self.precision = precision
+        self.filepath.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(
+            self.filepath, check_same_thread=False, isolation_level=None
+        )
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS geocode (
+                address_key TEXT PRIMARY KEY,
+                address TEXT,
+                latitude FLOAT,
+                longitude FLOAT,
+                fetched_at REAL
+            );
+            CREATE TABLE IF NOT EXISTS poi_tiles (
+                geohash TEXT PRIMARY KEY,
+                fetched_at REAL
+            );
+            CREATE TABLE IF NOT EXISTS pois (
+                osm_id TEXT PRIMARY KEY,
+                geohash TEXT,
+                kind TEXT,
+                latitude FLOAT,
+                longitude FLOAT
+            );
+            CREATE INDEX IF NOT EXISTS idx_pois_geohash ON pois(geohash, kind);
+            """
+        )
+
+    def get_coordinates(self, address: str):
+        """
+        Returns the cached (latitude, longitude) of an address, or None.
+        """
+        with self._lock:
+            row = self._db.execute(
+                "SELECT latitude, longitude FROM geocode WHERE address_key = ? AND fetched_at > ?",
+                (normalize_address(address), time.time() - self.ttl),
+            ).fetchone()
+        return row
+
+    def store_coordinates(self, address: str, lat: float, lon: float) -> None:
+        """
+        Stores the geocoding result of an address.
+        """
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO geocode VALUES (?, ?, ?, ?, ?)",
+                (normalize_address(address), address, float(lat), float(lon), time.time()),
+            )
+
+    def tiles(self, lat: float, lon: float, radius: float) -> list:
+        """
+        Returns the tiles covering the circle of `radius` metres around a point.
+        """
+        return tiles_covering(bounding_box(lat, lon, radius), self.precision)
+
+    def missing_tiles(self, lat: float, lon: float, radius: float) -> list:
+        """
+        Returns the tiles around a point that are not cached (or are too old).
+        """
+        tiles = self.tiles(lat, lon, radius)
+        with self._lock:
+            fresh = {
+                tile
+                for (tile,) in self._db.execute(
+                    f"SELECT geohash FROM poi_tiles WHERE fetched_at > ? "
+                    f"AND geohash IN ({','.join('?' * len(tiles))})",
+                    (time.time() - self.ttl, *tiles),
+                )
+            }
+        return [tile for tile in tiles if tile not in fresh]
+
+    @staticmethod
+    def tiles_bbox(tiles: list) -> tuple:
+        """
+        Returns the (south, west, north, east) box containing several tiles.
+        """
+        boxes = [tile_bbox(tile) for tile in tiles]
+        return (
+            min(b[0] for b in boxes),
+            min(b[1] for b in boxes),
+            max(b[2] for b in boxes),
+            max(b[3] for b in boxes),
+        )
+
+    def store_tiles(self, tiles: list, elements: list) -> int:
+        """
+        Stores the points of interest of freshly fetched tiles.
+
+        Args:
+            tiles (list): The fetched tiles, marked as cached even if empty.
+            elements (list): Elements of the Overpass answer (see `overpass_pois_query`),
+                which may cover more than `tiles`: the others are ignored.
+
+        Returns:
+            int: The number of points of interest stored.
+        """
+        tiles = set(tiles)
+        rows = []
+        for element in elements:
+            lat = element.get("lat", element.get("center", {}).get("lat"))
+            lon = element.get("lon", element.get("center", {}).get("lon"))
+            if lat is None or lon is None:
+                continue
+            tile = geohash(lat, lon, self.precision)
+            if tile in tiles:
+                rows.append(
+                    (f"{element['type']}/{element['id']}", tile, poi_kind(element), lat, lon)
+                )
+        now = time.time()
+        with self._lock:
+            self._db.execute("BEGIN")
+            self._db.executemany(
+                "DELETE FROM pois WHERE geohash = ?", [(tile,) for tile in tiles]
+            )
+            self._db.executemany("INSERT OR REPLACE INTO pois VALUES (?, ?, ?, ?, ?)", rows)
+            self._db.executemany(
+                "INSERT OR REPLACE INTO poi_tiles VALUES (?, ?)",
+                [(tile, now) for tile in tiles],
+            )
+            self._db.execute("COMMIT")
+        return len(rows)
+
+    def count_nearby(self, lat: float, lon: float, radius: float = 500) -> tuple:
+        """
+        Counts the cached points of interest within `radius` metres of a point.
+
+        Args:
+            lat (float): Latitude in degrees.
+            lon (float): Longitude in degrees.
+            radius (float): The radius, in metres.
+
+        Returns:
+            tuple: (restaurant_density, transport_count).
+
+        Notes:
+            The tiles around the point must have been fetched (see `missing_tiles`).
+        """
+        tiles = self.tiles(lat, lon, radius)
+        with self._lock:
+            rows = self._db.execute(
+                f"SELECT kind, latitude, longitude FROM pois "
+                f"WHERE geohash IN ({','.join('?' * len(tiles))})",
+                tiles,
+            ).fetchall()
+        counts = {"restaurant": 0, "transport": 0}
+        for (kind, _, _), distance in zip(
+            rows, distances(lat, lon, [(r[1], r[2]) for r in rows])
+        ):
+            if distance <= radius:
+                counts[kind] += 1
+        return counts["restaurant"], counts["transport"]
+
+    def close(self) -> None:
+        """
+        Closes the cache.
+        """
+        with self._lock:
+            self._db.close()
@@ -0,0 +1,141 @@
+import os
+import re
+from datetime import datetime
+
+from bs4 import BeautifulSoup
+
+try:
+    from lxml import etree
+    from lxml import html as lxml_html
+except ImportError:
+    etree = lxml_html = None
+
+
+# Analyseur utilisé par BeautifulSoup : lxml (C) s'il est installé, sinon html.parser
+BS4_FEATURES = "lxml" if lxml_html is not None else "html.parser"
+
+# Champs d'un avis TripAdvisor : (balise, classe) -> champ.
+# Une classe contenant des espaces doit correspondre exactement à l'attribut class
+# (comme `class_=` de BeautifulSoup), une classe simple n'est qu'un des tokens.
+AVIS_SELECTORS = {
+    ("span", "biGQs _P fiohW fOtGX"): "nom_utilisateur",
+    ("svg", "UctUV"): "note_restaurant",
+    ("div", "biGQs _P pZUbB ncFvv osNWb"): "date_avis",
+    ("div", "biGQs _P fiohW qWPrE ncFvv fOtGX"): "titre_avis",
+    ("span", "JguWG"): "contenu_avis",
+}
+_EXACT_SELECTORS = {k: v for k, v in AVIS_SELECTORS.items() if " " in k[1]}
+_TOKEN_SELECTORS = {k: v for k, v in AVIS_SELECTORS.items() if " " not in k[1]}
+
+# Sélecteurs XPath précompilés
+if etree is not None:
+    AVIS_CONTAINERS = etree.XPath(
+        '//div[contains(concat(" ", normalize-space(@class), " "), " _c ")]'
+    )
+    SVG_TITLE = etree.XPath("./title")
+
+
+# Suppression des espaces et ponctuations bizarres dans les champs texte
+def clean_text(text):
+    if isinstance(text, str):
+        text = re.sub(r"\s+", " ", text)
+        text = re.sub(r"[\"\'”“‘’]", "", text)
+        text = re.sub(r"[^\w\s,.-]", "", text)
+        text = text.strip()
+    return text
+
+
+def default_backend():
+    """Analyseur des pages d'avis : variable SCRAPING_PARSER, sinon lxml s'il est installé."""
+    return os.getenv("SCRAPING_PARSER") or ("lxml" if lxml_html is not None else "bs4")
+
+
+def build_avis(id_restaurant, fields):
+    """Convertit les textes bruts extraits d'un avis en ligne de la table `avis`."""
+    note_restaurant = None
+    if fields.get("note_restaurant"):
+        note_restaurant = float(fields["note_restaurant"].split(" ")[0].replace(",", "."))
+
+    # Supprimer "Rédigé le " et convertir la date au format des avis importés
+    # (YYYY-MM-DD), pour que la clé naturelle des avis soit la même
+    cleaned_date = re.sub(r"^Rédigé le ", "", fields.get("date_avis")).strip()
+    date_avis = datetime.strptime(cleaned_date, "%d %B %Y").strftime("%Y-%m-%d")
+
+    return {
+        "id_restaurant": id_restaurant,
+        "nom_utilisateur": fields.get("nom_utilisateur", "Anonyme"),
+        "note_restaurant": note_restaurant,
+        "date_avis": date_avis,
+        "titre_avis": clean_text(fields.get("titre_avis", "Titre non disponible")),
+        "contenu_avis": clean_text(fields.get("contenu_avis", "Contenu non disponible")),
+    }
+
+
+def parse_avis_page_bs4(html, id_restaurant, features="html.parser"):
+    """Extrait les avis d'une page avec BeautifulSoup (chemin de référence)."""
+    soup = BeautifulSoup(html, features)
+    avis_list = []
+
+    # Sélectionner les conteneurs d'avis
+    for avis in soup.find_all("div", class_="_c"):
+        fields = {}
+        for (tag, class_), field in AVIS_SELECTORS.items():
+            element = avis.find(tag, class_=class_)
+            if element is None:
+                continue
+            if field == "note_restaurant":
+                # La note est le titre du pictogramme ("4,0 sur 5 bulles")
+                element = element.find("title")
+                if element is None:
+                    continue
+            fields[field] = element.text.strip()
+        avis_list.append(build_avis(id_restaurant, fields))
+
+    return avis_list
+
+
+def extract_avis_fields(container):
+    """Extrait les champs d'un conteneur d'avis lxml en un seul parcours de ses descendants."""
+    fields = {}
+    for element in container.iterdescendants():
+        class_ = element.get("class")
+        if not class_ or not isinstance(element.tag, str):
+            continue
+        field = _EXACT_SELECTORS.get((element.tag, class_))
+        if field is None:
+            for token in class_.split():
+                field = _TOKEN_SELECTORS.get((element.tag, token))
+                if field is not None:
+                    break
+        # Seule la première occurrence de chaque champ compte
+        if field is None or field in fields:
+            continue
+        if field == "note_restaurant":
+            title = SVG_TITLE(element)
+            fields[field] = title[0].text_content().strip() if title else None
+        else:
+            fields[field] = element.text_content().strip()
+        if len(fields) == len(AVIS_SELECTORS):
+            break
+    return fields
+
+
+def parse_avis_page_lxml(html, id_restaurant):
+    """Extrait les avis d'une page avec lxml et des sélecteurs précompilés."""
+    if lxml_html is None:
+        raise ImportError("Le parseur lxml nécessite le paquet lxml : pip install lxml")
+    tree = lxml_html.fromstring(html)
+    return [
+        build_avis(id_restaurant, extract_avis_fields(container))
+        for container in AVIS_CONTAINERS(tree)
+    ]
+
+
+def parse_avis_page(html, id_restaurant, backend=None):
+    """Extrait les avis d'une page d'avis TripAdvisor (sans identifiant d'avis).
+
+    `backend` vaut "lxml" ou "bs4" ; par défaut, voir `default_backend()`.
+    """
+    if (backend or default_backend()) == "lxml":
+        return parse_avis_page_lxml(html, id_restaurant)
+    return parse_avis_page_bs4(html, id_restaurant)
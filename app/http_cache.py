@@ -0,0 +1,221 @@
+import gzip
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+
+# Dossier par défaut du cache des réponses HTTP du scraper
+HTTP_CACHE_DIR = Path(__file__).parent / "data" / "http_cache"
+
+
+class ResponseCache:
+    """
+    On-disk cache of raw HTTP responses (HTML pages, Nominatim and Overpass JSON).
+
+    Bodies are stored gzip-compressed under the SHA-256 of their content, so identical
+    bodies are stored once; a small SQLite index maps each URL to its body, its
+    validators and its fetch date.
+
+    Attributes:
+        cache_dir (Path): Folder of the cache (index.db and objects/).
+        ttl (float): Seconds during which an entry is served without contacting the server.
+        max_age (float): Seconds after which an entry is evicted.
+        max_bytes (int): Maximum size of the compressed bodies.
+    """
+
+    # En-têtes conservés avec chaque réponse
+    KEPT_HEADERS = ("Content-Type", "ETag", "Last-Modified")
+
+    def __init__(
+        self,
+        cache_dir: Path = HTTP_CACHE_DIR,
+        ttl: float = 86400,
+        max_age: float = 30 * 86400,
+        max_bytes: int = 512 * 1024**2,
+    ) -> None:
+        """
+        Opens (or creates) the cache.
+
+        Args:
+            cache_dir (Path): Folder of the cache.
+            ttl (float): Seconds during which an entry is served without revalidation.
+            max_age (float): Seconds after which an entry is evicted.
+            max_bytes (int): Maximum size of the compressed bodies.
+        """
+        self.cache_dir = Path(cache_dir)
+        self.ttl = ttl
+        self.max_age = max_age
+        self.max_bytes = max_bytes
+        (self.cache_dir / "objects").mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(
+            self.cache_dir / "index.db", check_same_thread=False, isolation_level=None
+        )
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            """CREATE TABLE IF NOT EXISTS entries (
+                url TEXT PRIMARY KEY,
+                digest TEXT NOT NULL,
+                status INTEGER NOT NULL,
+                headers TEXT NOT NULL,
+                fetched_at REAL NOT NULL,
+                accessed_at REAL NOT NULL,
+                size INTEGER NOT NULL
+            )"""
+        )
+        self._db.execute(
+            "CREATE INDEX IF NOT EXISTS idx_entries_accessed ON entries(accessed_at)"
+        )
+
+    @classmethod
+    def from_env(cls):
+        """
+        Builds the cache from the SCRAPING_CACHE_* environment variables.
+
+        Returns:
+            ResponseCache: The cache, or None if SCRAPING_CACHE_DIR is set to "off".
+        """
+        cache_dir = os.getenv("SCRAPING_CACHE_DIR", str(HTTP_CACHE_DIR))
+        if cache_dir.lower() in ("off", "none", ""):
+            return None
+        return cls(
+            cache_dir,
+            ttl=float(os.getenv("SCRAPING_CACHE_TTL", 86400)),
+            max_bytes=int(float(os.getenv("SCRAPING_CACHE_MAX_MB", 512)) * 1024**2),
+        )
+
+    def _blob_path(self, digest: str) -> Path:
+        return self.cache_dir / "objects" / digest[:2] / f"{digest}.gz"
+
+    def get(self, url: str):
+        """
+        Returns the cached response of `url`.
+
+        Args:
+            url (str): The full URL (query string included).
+
+        Returns:
+            dict: status, headers, content, fetched_at and fresh (younger than `ttl`),
+            or None if the URL is not cached (or its body is missing).
+        """
+        with self._lock:
+            row = self._db.execute(
+                "SELECT digest, status, headers, fetched_at FROM entries WHERE url = ?",
+                (url,),
+            ).fetchone()
+            if row is None:
+                return None
+            self._db.execute(
+                "UPDATE entries SET accessed_at = ? WHERE url = ?", (time.time(), url)
+            )
+        digest, status, headers, fetched_at = row
+        try:
+            content = gzip.decompress(self._blob_path(digest).read_bytes())
+        except (OSError, EOFError):
+            return None
+        return {
+            "status": status,
+            "headers": json.loads(headers),
+            "content": content,
+            "fetched_at": fetched_at,
+            "fresh": time.time() - fetched_at < self.ttl,
+        }
+
+    def put(self, url: str, status: int, headers, content: bytes) -> None:
+        """
+        Stores a response, then evicts old entries if the cache is too large.
+
+        Args:
+            url (str): The full URL (query string included).
+            status (int): The HTTP status.
+            headers: The response headers (case-insensitive mapping).
+            content (bytes): The decoded body.
+        """
+        digest = hashlib.sha256(content).hexdigest()
+        path = self._blob_path(digest)
+        if not path.exists():
+            path.parent.mkdir(exist_ok=True)
+            # Écriture atomique : un lecteur ne voit jamais un fichier tronqué
+            tmp = path.with_suffix(f".{threading.get_ident()}.tmp")
+            tmp.write_bytes(gzip.compress(content, compresslevel=6))
+            tmp.replace(path)
+        kept = {k: headers[k] for k in self.KEPT_HEADERS if headers.get(k)}
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (url, digest, status, json.dumps(kept), now, now, path.stat().st_size),
+            )
+        self.evict()
+
+    def touch(self, url: str) -> None:
+        """
+        Marks the entry of `url` as freshly fetched (after a 304 Not Modified answer).
+        """
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "UPDATE entries SET fetched_at = ?, accessed_at = ? WHERE url = ?",
+                (now, now, url),
+            )
+
+    def size(self) -> int:
+        """
+        Returns the size of the compressed bodies, in bytes.
+        """
+        with self._lock:
+            return self._db.execute(
+                "SELECT coalesce(sum(size), 0) FROM (SELECT DISTINCT digest, size FROM entries)"
+            ).fetchone()[0]
+
+    def evict(self) -> int:
+        """
+        Removes the entries older than `max_age`, then the least recently used ones
+        until the cache is under `max_bytes`.
+
+        Returns:
+            int: The number of entries removed.
+        """
+        with self._lock:
+            removed = self._db.execute(
+                "DELETE FROM entries WHERE fetched_at < ? RETURNING digest",
+                (time.time() - self.max_age,),
+            ).fetchall()
+            total = self._db.execute(
+                "SELECT coalesce(sum(size), 0) FROM (SELECT DISTINCT digest, size FROM entries)"
+            ).fetchone()[0]
+            if total > self.max_bytes:
+                rows = self._db.execute(
+                    "SELECT url, digest, size FROM entries ORDER BY accessed_at"
+                ).fetchall()
+                references = {}
+                for _, digest, _ in rows:
+                    references[digest] = references.get(digest, 0) + 1
+                # On descend à 90 % de la taille maximale pour ne pas évincer à chaque ajout
+                for url, digest, size in rows:
+                    if total <= self.max_bytes * 0.9:
+                        break
+                    self._db.execute("DELETE FROM entries WHERE url = ?", (url,))
+                    removed.append((digest,))
+                    references[digest] -= 1
+                    if not references[digest]:
+                        total -= size
+            # Un corps n'est supprimé que s'il n'est plus référencé par aucune URL
+            for (digest,) in set(removed):
+                still_used = self._db.execute(
+                    "SELECT 1 FROM entries WHERE digest = ? LIMIT 1", (digest,)
+                ).fetchone()
+                if not still_used:
+                    self._blob_path(digest).unlink(missing_ok=True)
+        return len(removed)
+
+    def close(self) -> None:
+        """
+        Closes the index.
+        """
+        with self._lock:
+            self._db.close()
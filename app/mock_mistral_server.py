@@ -0,0 +1,195 @@
+import argparse
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from summary_backends import ExtractiveSummarizer
+
+"""
+Serveur local imitant l'API Mistral (POST /v1/chat/completions), pour exercer et
+mesurer la génération des résumés sans clé ni réseau (tests, hôtes isolés).
+
+Les réponses sont déterministes : résumé extractif (TextRank) du prompt reçu, après un
+délai simulant la latence du modèle. Avec "stream": true, le résumé est envoyé mot à
+mot en Server-Sent Events (chat.completion.chunk, puis [DONE]), comme par l'API.
+Une requête sur `rate_limit_every` reçoit une réponse 429 avec un en-tête Retry-After,
+pour tester la reprise et le ralentissement.
+
+Exemple (depuis le dossier app) :
+    python mock_mistral_server.py --port 8765 --latency 0.5 --rate-limit-every 10
+    MISTRAL_API_KEY=mock MISTRAL_SERVER_URL=http://127.0.0.1:8765 python summarize_restaurants.py
+"""
+
+
+class MockMistralServer(ThreadingHTTPServer):
+    """
+    HTTP server answering the chat completions of the Mistral API deterministically.
+
+    Attributes:
+        latency (float): Seconds waited before each answer (first token when streaming).
+        rate_limit_every (int): Every n-th request is answered 429, 0 to disable.
+        retry_after (float): Retry-After delay sent with the 429 answers.
+        token_latency (float): Seconds between two streamed pieces.
+        nb_requests (int): Number of requests received.
+    """
+
+    daemon_threads = True
+
+    def __init__(
+        self,
+        address: tuple = ("127.0.0.1", 8765),
+        latency: float = 0.0,
+        rate_limit_every: int = 0,
+        retry_after: float = 1.0,
+        token_latency: float = 0.0,
+    ) -> None:
+        """
+        Creates the server (call `serve_forever` to start it).
+
+        Args:
+            address (tuple): (host, port) to listen on, port 0 for any free port.
+            latency (float): Seconds waited before each answer (first token when streaming).
+            rate_limit_every (int): Every n-th request is answered 429, 0 to disable.
+            retry_after (float): Retry-After delay sent with the 429 answers.
+            token_latency (float): Seconds between two streamed pieces.
+        """
+        super().__init__(address, MockMistralHandler)
+        self.latency = latency
+        self.rate_limit_every = rate_limit_every
+        self.retry_after = retry_after
+        self.token_latency = token_latency
+        self.nb_requests = 0
+        self.summarizer = ExtractiveSummarizer()
+        self._lock = threading.Lock()
+
+    @property
+    def url(self) -> str:
+        """
+        Returns the URL to use as MISTRAL_SERVER_URL.
+        """
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def next_request(self) -> int:
+        """
+        Counts a new request and returns its number (starting at 1).
+        """
+        with self._lock:
+            self.nb_requests += 1
+            return self.nb_requests
+
+
+class MockMistralHandler(BaseHTTPRequestHandler):
+    def _send_json(self, status, payload, headers=None):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_stream(self, number, model, content):
+        # Server-Sent Events : un chat.completion.chunk par mot, puis la sentinelle [DONE]
+        # (sans Content-Length : la fin de la connexion HTTP/1.0 termine la réponse)
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+        pieces = re.findall(r"\S+\s*", content) or [content]
+        for i, piece in enumerate(pieces):
+            delta = {"role": "assistant", "content": piece} if i == 0 else {"content": piece}
+            chunk = {
+                "id": f"mock-{number}",
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [
+                    {
+                        "index": 0,
+                        "delta": delta,
+                        "finish_reason": "stop" if i == len(pieces) - 1 else None,
+                    }
+                ],
+            }
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+            self.wfile.flush()
+            time.sleep(self.server.token_latency)
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
+
+    def do_POST(self):
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self._send_json(404, {"message": f"Unknown endpoint {self.path}"})
+            return
+        length = int(self.headers.get("Content-Length", 0))
+        request = json.loads(self.rfile.read(length) or b"{}")
+
+        server = self.server
+        number = server.next_request()
+        if server.rate_limit_every and number % server.rate_limit_every == 0:
+            self._send_json(
+                429,
+                {"message": "Requests rate limit exceeded"},
+                {"Retry-After": f"{server.retry_after:g}"},
+            )
+            return
+
+        time.sleep(server.latency)
+        prompt = request.get("messages", [{}])[-1].get("content", "")
+        content = server.summarizer.query(prompt)
+        if request.get("stream"):
+            self._send_stream(number, request.get("model", "mock"), content)
+            return
+        self._send_json(
+            200,
+            {
+                "id": f"mock-{number}",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": request.get("model", "mock"),
+                "choices": [
+                    {
+                        "index": 0,
+                        "message": {"role": "assistant", "content": content},
+                        "finish_reason": "stop",
+                    }
+                ],
+                "usage": {
+                    "prompt_tokens": len(prompt.split()),
+                    "completion_tokens": len(content.split()),
+                    "total_tokens": len(prompt.split()) + len(content.split()),
+                },
+            },
+        )
+
+    def log_message(self, format, *args):
+        # Pas de ligne de journal par requête : le débit est affiché par le client
+        pass
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serveur local imitant l'API Mistral")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--rate-limit-every", type=int, default=0)
+    parser.add_argument("--retry-after", type=float, default=1.0)
+    parser.add_argument("--token-latency", type=float, default=0.0)
+    args = parser.parse_args()
+
+    server = MockMistralServer(
+        (args.host, args.port),
+        args.latency,
+        args.rate_limit_every,
+        args.retry_after,
+        args.token_latency,
+    )
+    print(f"Serveur Mistral simulé sur {server.url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
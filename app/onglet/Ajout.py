@@ -1,11 +1,13 @@
+import asyncio
 import streamlit as st
-from function_app import get_db, transform_to_df, check_url
+from function_app import get_db, check_url
 import os
 import dotenv
 from scraping import *
 from summary_generator import *
 from sentiment_analysis import *
 from generate_wordcloud import *
+from refresh_restaurants import refresh_restaurant
 
 # Chargement des variables d'environnement
 dotenv.load_dotenv()
@@ -14,9 +16,8 @@ api_key = os.getenv('MISTRAL_API_KEY')
 # Chargement de la base de données
 db = get_db()
 
-# Récupérer les URLs des restaurants existants
-query = transform_to_df("restaurants",db,"SELECT url FROM restaurants;")
-existing_urls = query['url'].tolist()
+# Chargement du modèle de sentiment en arrière-plan (une seule fois par processus)
+SentimentEngine.preload()
 
 st.markdown("""
     <h1 style="font-size: 36px; color: #3C6E47; text-align: center; font-family: 'Arial', sans-serif;">
@@ -41,8 +42,16 @@ if submit_button:
     if url:
         if url.startswith("https://www.tripadvisor.fr/Restaurant_Review") and url.endswith(".html"):
             
-            if url in existing_urls:
-                st.error("Le restaurant existe déjà dans la base de données.")
+            if check_url(url, db):
+                # Restaurant déjà présent : mise à jour incrémentale (nouveaux avis seulement)
+                with st.spinner("Le restaurant existe déjà, recherche de nouveaux avis..."):
+                    success, result = refresh_restaurant(url, db, api_key, nb_mois=18)
+                if not success:
+                    st.error(f"Erreur lors de la mise à jour du restaurant : {result}")
+                elif result == 0:
+                    st.info("Le restaurant existe déjà dans la base de données et ses avis sont à jour.")
+                else:
+                    st.success(f"Restaurant mis à jour : {result} nouveaux avis, labels et résumé recalculés.")
             else:
                 
                 # Préparation des messages de chargement
@@ -50,8 +59,8 @@ if submit_button:
                 placeholder_info = st.empty()
                 placeholder_info.write("Récupération des informations du restaurant en cours...")
                 
-                # Exécuter le pipeline de scraping
-                process_pipeline(url, db)
+                # Exécuter le pipeline de scraping (étapes indépendantes en parallèle)
+                asyncio.run(process_pipeline_async([url], db))
                 
                 # Vérifer si le restaurant est bien été ajouté dans la base
                 if check_url(url, db) :
@@ -59,14 +68,21 @@ if submit_button:
                     placeholder_info.write("Génération du résumé en cours...")
                     
                     # Récupérer l'identifiant du restaurant
-                    success, id_resto = db.select("SELECT max(id_restaurant) FROM restaurants")
+                    success, id_resto = db.select("SELECT id_restaurant FROM restaurants WHERE url = ?", (url,))
 
-                    # Fermuture de la base pour éviter les conflits
-                    db.__del__()
+                    # Libération de la connexion d'écriture pour éviter les conflits
+                    db.close()
 
                     try : 
-                            # Génération du résumé
-                            success, message = generate_summary((id_resto[0][0]), api_key, nb_mois=18)
+                            # Résumé extractif immédiat (local), remplacé par celui du LLM ensuite
+                            generate_summary((id_resto[0][0]), api_key, nb_mois=18, backend="extractive")
+
+                            # Génération du résumé, affiché au fur et à mesure de sa génération
+                            placeholder_info.write("Génération du résumé en cours :")
+                            stream = stream_summary((id_resto[0][0]), api_key, nb_mois=18)
+                            with st.container(border=True):
+                                st.write_stream(stream)
+                            success, message = stream.result
                             
                             if success:
                                 print(f"Résumé généré pour le restaurant {(id_resto[0][0])} : {message}")
@@ -6,8 +6,11 @@ from function_app import (
     retrieve_year,
     delete_restaurant,
 )
+from poi_index import has_poi_index, count_nearby_pois
+from summary_generator import MODEL, stream_summary
 import plotly.graph_objects as go
 import pandas as pd
+import dotenv
 import os
 
 
@@ -22,7 +25,7 @@ restaurants = transform_to_df_join(
 
 avis_requete = transform_to_df_join(
     db,
-    f"""SELECT avis.date_avis, avis.titre_avis, avis.contenu_avis, avis.note_restaurant, avis.label, restaurants.nom 
+    f"""SELECT avis.date_avis, avis.titre_avis, avis.contenu_avis, avis.note_restaurant, avis.label, restaurants.nom, avis.id_avis 
                                         FROM restaurants, avis 
                                         WHERE restaurants.id_restaurant = avis.id_restaurant;""",
 )
@@ -60,7 +63,32 @@ selected_restaurant = st.selectbox(
 
 # Filtrer les données en fonction du restaurant sélectionné
 selected_data = restaurants[restaurants["restaurants.nom"] == selected_restaurant]
-avis = avis_requete[avis_requete["restaurants.nom"] == selected_restaurant].copy()
+# L'identifiant de l'avis sert d'index pour croiser avec la recherche plein texte
+avis = (
+    avis_requete[avis_requete["restaurants.nom"] == selected_restaurant]
+    .set_index("avis.id_avis")
+    .copy()
+)
+
+# Rayon de voisinage : modifiable si les points d'intérêt OSM ont été importés
+# (poi_index.py), sinon comptes à 500 mètres calculés lors de l'ajout
+radius = 500
+restaurant_density = selected_data["geographie.restaurant_density"].values[0]
+transport_count = selected_data["geographie.transport_count"].values[0]
+if has_poi_index(db):
+    radius = st.select_slider(
+        "Rayon de voisinage (mètres)", options=[250, 500, 750, 1000, 1500], value=500
+    )
+    counts = count_nearby_pois(
+        db,
+        selected_data[["geographie.latitude", "geographie.longitude"]].rename(
+            columns={"geographie.latitude": "latitude", "geographie.longitude": "longitude"}
+        ),
+        radius,
+    )
+    if not counts.empty:
+        restaurant_density = counts["restaurant_density"].values[0]
+        transport_count = counts["transport_count"].values[0]
 
 col1, col2 = st.columns([1, 2])
 
@@ -79,8 +107,8 @@ with col1:
                 <strong style="color: #f09e3f; font-size: 14px;">Prix :</strong> {selected_data['restaurants.price'].values[0]}<br>
                 <strong style="color: #f09e3f; font-size: 14px;">Note globale :</strong> {selected_data['restaurants.note_globale'].values[0]} ⭐<br>
                 <strong style="color: #f09e3f; font-size: 14px;">Nombre d'avis :</strong> {avis['avis.contenu_avis'].count()}<br>
-                <strong style="color: #f09e3f; font-size: 14px;">Transports dans un rayon de 500 mètres :</strong> {selected_data['geographie.transport_count'].values[0]} 🚇<br>
-                <strong style="color: #f09e3f; font-size: 14px;">Restaurants dans un rayon de 500 mètres :</strong> {selected_data['geographie.restaurant_density'].values[0]} 🍴
+                <strong style="color: #f09e3f; font-size: 14px;">Transports dans un rayon de {radius} mètres :</strong> {transport_count} 🚇<br>
+                <strong style="color: #f09e3f; font-size: 14px;">Restaurants dans un rayon de {radius} mètres :</strong> {restaurant_density} 🍴
             </p>
             <div style="text-align: center; margin-top: 10px;">
                 <a href="{selected_data['restaurants.url'].values[0]}" target="_blank" 
@@ -99,7 +127,7 @@ with col2:
     longitude = selected_data["geographie.longitude"].values[0]
 
     # Générer les coordonnées du cercle autour du point central
-    circle_lats, circle_lons = generate_circle(latitude, longitude, 500)
+    circle_lats, circle_lons = generate_circle(latitude, longitude, radius)
 
     # Créer la carte avec Plotly
     fig = go.Figure(
@@ -110,7 +138,7 @@ with col2:
             fill="toself",
             fillcolor="rgba(0, 0, 255, 0.2)",
             line=dict(width=2, color="blue"),
-            name="Périmètre de 500m",
+            name=f"Périmètre de {radius}m",
         )
     )
 
@@ -124,8 +152,8 @@ with col2:
             text=(
                 f"""{selected_restaurant}
             <br>Adresse: {selected_data['geographie.localisation'].values[0]}
-            <br>Nombre de restaurants à proximité : {selected_data['geographie.restaurant_density'].values[0]}
-            <br>Nombre de transports à proximité : {selected_data['geographie.transport_count'].values[0]}"""
+            <br>Nombre de restaurants à proximité : {restaurant_density}
+            <br>Nombre de transports à proximité : {transport_count}"""
             ),
             name="Restaurant",
         )
@@ -147,8 +175,10 @@ st.write("")
 st.write("")
 st.write("")
 
+selected_id = selected_data["restaurants.id_restaurant"].values[0]
 st.subheader(f"Résumé des avis clients de {selected_restaurant} des 18 derniers mois")
-st.markdown(
+summary_box = st.empty()
+summary_box.markdown(
     f"""
     <div style='border: 2px solid #ccc; padding: 10px; border-radius: 10px; background-color: #fff; color: #000; font-weight: normal;'>
         {selected_data['restaurants.summary'].values[0]}
@@ -157,7 +187,24 @@ st.markdown(
     unsafe_allow_html=True,
 )
 
-selected_id = selected_data["restaurants.id_restaurant"].values[0]
+# Résumé absent ou provisoire (extractif) : génération par le LLM, affichée en streaming.
+# Un résumé sans modèle enregistré date d'avant les backends (initiate_db) : c'est
+# un résumé du LLM (colonne absente ou vide)
+summary = selected_data["restaurants.summary"].values[0]
+summary_model = selected_data.get("restaurants.summary_model", pd.Series([None])).values[0]
+if pd.isna(summary) or not summary or not (pd.isna(summary_model) or summary_model == MODEL):
+    if st.button("Générer le résumé détaillé (Mistral)"):
+        dotenv.load_dotenv()
+        stream = stream_summary(int(selected_id), os.getenv("MISTRAL_API_KEY"), nb_mois=18)
+        try:
+            with summary_box.container(border=True):
+                st.write_stream(stream)
+            success, message = stream.result
+        except Exception as e:
+            success, message = False, e
+        if not success:
+            st.error(f"Erreur lors de la génération du résumé : {message}")
+
 st.subheader(f"Wordcloud pour {selected_restaurant}")
 col_left, col_mid, col_right = st.columns([0.5, 2, 0.5])
 with col_mid:
@@ -495,11 +542,17 @@ if st.session_state["show_avis"]:
         ]
 
     if search_text:
-        filtered_avis = filtered_avis[
-            filtered_avis["Contenu de l'avis"].str.contains(
-                search_text, case=False, na=False
-            )
-        ]
+        # Recherche via l'index plein texte avis_fts (accents et casse ignorés)
+        success, resultats = db.search_reviews(
+            search_text, id_restaurant=selected_id, limit=-1, snippet_tokens=0
+        )
+        if success:
+            contenus = {r[0]: r[4] for r in resultats}
+            filtered_avis = filtered_avis[filtered_avis.index.isin(contenus)].copy()
+            # Afficher le contenu avec les mots trouvés surlignés
+            filtered_avis.loc[:, "Contenu de l'avis"] = filtered_avis.index.map(contenus)
+        else:
+            st.error(f"Erreur lors de la recherche : {resultats}")
 
     # Formater les dates pour l'affichage
     filtered_avis.loc[:, "Date de l'avis"] = pd.to_datetime(
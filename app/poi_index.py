@@ -0,0 +1,292 @@
+import argparse
+import json
+import math
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from sqlutils import sqlutils
+from schemaDB import schemaDB, indexesDB, rtreeDB
+
+
+EARTH_RADIUS = 6371000  # mètres
+
+# Nombre maximal de points par requête (3 paramètres par point, limite sqlite : 32766)
+POINTS_PER_QUERY = 10000
+
+
+def classify_tags(tags: dict):
+    """
+    Returns "restaurant", "transport" or None for the tags of an OSM object.
+    """
+    if tags.get("amenity") == "restaurant":
+        return "restaurant"
+    if (
+        tags.get("highway") == "bus_stop"
+        or tags.get("railway") == "station"
+        or tags.get("amenity") == "subway"
+    ):
+        return "transport"
+    return None
+
+
+def _centroid(coordinates) -> tuple:
+    # Moyenne des sommets d'une géométrie GeoJSON (suffisant pour un bâtiment ou une place)
+    points = []
+
+    def walk(coords):
+        if coords and isinstance(coords[0], (int, float)):
+            points.append(coords)
+        else:
+            for c in coords:
+                walk(c)
+
+    walk(coordinates)
+    lon = sum(p[0] for p in points) / len(points)
+    lat = sum(p[1] for p in points) / len(points)
+    return lat, lon
+
+
+def read_geojson(filepath: Path) -> list:
+    """
+    Reads the points of interest of a GeoJSON export of OSM objects.
+
+    Args:
+        filepath (Path): A FeatureCollection (e.g. from Overpass Turbo or osmium export)
+            whose properties hold the OSM tags, directly or under "tags".
+
+    Returns:
+        list: (osm_id, kind, latitude, longitude) tuples; polygons are reduced to the
+        mean of their vertices. Features without id get "kind/lat,lon" as osm_id.
+    """
+    with open(filepath, encoding="utf-8") as f:
+        data = json.load(f)
+
+    pois = []
+    for feature in data.get("features", []):
+        properties = feature.get("properties") or {}
+        kind = classify_tags(properties.get("tags", properties))
+        geometry = feature.get("geometry")
+        if kind is None or not geometry:
+            continue
+        osm_id = properties.get("@id") or properties.get("id") or feature.get("id")
+        lat, lon = _centroid(geometry["coordinates"])
+        if osm_id is None:
+            # Objet sans identifiant : clé stable tirée de sa nature et de sa position
+            # (sinon tous ces objets s'écraseraient sous l'osm_id "None")
+            osm_id = f"{kind}/{lat:.7f},{lon:.7f}"
+        pois.append((str(osm_id), kind, lat, lon))
+    return pois
+
+
+def read_pbf(filepath: Path) -> list:
+    """
+    Reads the points of interest of an OSM extract (.osm.pbf).
+
+    Returns:
+        list: (osm_id, kind, latitude, longitude) tuples; ways are reduced to the
+        mean of their nodes.
+
+    Raises:
+        ImportError: If pyosmium is not installed.
+    """
+    try:
+        import osmium
+    except ImportError as e:
+        raise ImportError(
+            "L'import de fichiers .pbf nécessite pyosmium : pip install osmium"
+        ) from e
+
+    pois = []
+
+    class Handler(osmium.SimpleHandler):
+        def node(self, n):
+            kind = classify_tags({tag.k: tag.v for tag in n.tags})
+            if kind and n.location.valid():
+                pois.append((f"node/{n.id}", kind, n.location.lat, n.location.lon))
+
+        def way(self, w):
+            kind = classify_tags({tag.k: tag.v for tag in w.tags})
+            locations = [nd.location for nd in w.nodes if nd.location.valid()]
+            if kind and locations:
+                lat = sum(loc.lat for loc in locations) / len(locations)
+                lon = sum(loc.lon for loc in locations) / len(locations)
+                pois.append((f"way/{w.id}", kind, lat, lon))
+
+    # locations=True : coordonnées des nœuds disponibles dans les chemins
+    Handler().apply_file(str(filepath), locations=True)
+    return pois
+
+
+def import_pois(db: sqlutils, filepath: Path) -> tuple:
+    """
+    Loads an OSM extract (GeoJSON or PBF) into the `pois` table and its R*Tree index.
+
+    Args:
+        db (sqlutils): The database.
+        filepath (Path): A .geojson/.json or .osm.pbf file.
+
+    Returns:
+        tuple: (True, message) or (False, error message). The transaction is committed.
+    """
+    filepath = Path(filepath)
+    db.create_table("pois", schemaDB["pois"], indexesDB.get("pois"))
+    for rtree_name, spec in rtreeDB.items():
+        db.create_rtree(rtree_name, spec)
+
+    if filepath.suffix == ".pbf":
+        pois = read_pbf(filepath)
+    else:
+        pois = read_geojson(filepath)
+
+    # Un objet déjà importé (même osm_id) est mis à jour, le R*Tree suit par trigger
+    success, report = db.upsert(
+        "pois",
+        pois,
+        column_names=["osm_id", "kind", "latitude", "longitude"],
+        update=True,
+    )
+    if not success:
+        db.rollback()
+        return (False, f"Erreur lors de l'import de {filepath} : {report}")
+    db.commit()
+    return (
+        True,
+        f"{len(report['inserted'])} points d'intérêt ajoutés, "
+        f"{len(report['updated'])} mis à jour depuis {filepath.name}",
+    )
+
+
+def has_poi_index(db: sqlutils) -> bool:
+    """
+    Returns True if points of interest have been imported.
+    """
+    success, rows = db.select("SELECT EXISTS (SELECT 1 FROM pois)")
+    return success and bool(rows[0][0])
+
+
+def count_nearby_pois(db: sqlutils, points: pd.DataFrame, radius: float = 500) -> pd.DataFrame:
+    """
+    Counts the restaurants and transport stops within `radius` metres of many points.
+
+    Args:
+        db (sqlutils): The database, with an imported POI index.
+        points (pd.DataFrame): "latitude" and "longitude" columns, any index.
+        radius (float): The radius, in metres.
+
+    Returns:
+        pd.DataFrame: "restaurant_density" and "transport_count" columns, with the
+        index of `points` (points without coordinates are left out).
+
+    Notes:
+        Candidates come from a single R*Tree query per batch of points (bounding
+        boxes of the circles); the exact haversine filtering and the counting are
+        vectorized with numpy.
+    """
+    points = points.dropna(subset=["latitude", "longitude"])
+    lats = points["latitude"].to_numpy(dtype=float)
+    lons = points["longitude"].to_numpy(dtype=float)
+    restaurant_density = np.zeros(len(points), dtype=int)
+    transport_count = np.zeros(len(points), dtype=int)
+    if len(points) == 0:
+        return pd.DataFrame(
+            {"restaurant_density": restaurant_density, "transport_count": transport_count},
+            index=points.index,
+        )
+
+    # Demi-côtés de la boîte englobante, en degrés (longitude : à la latitude extrême)
+    dlat = math.degrees(radius / EARTH_RADIUS)
+    dlon = math.degrees(
+        radius / (EARTH_RADIUS * math.cos(math.radians(np.abs(lats).max())))
+    )
+
+    for start in range(0, len(points), POINTS_PER_QUERY):
+        batch = range(start, min(start + POINTS_PER_QUERY, len(points)))
+        values = ", ".join(["(?, ?, ?)"] * len(batch))
+        params = [v for i in batch for v in (i, lats[i], lons[i])]
+        success, rows = db.select(
+            f"""WITH pts(pos, lat, lon) AS (VALUES {values})
+                SELECT pts.pos, p.kind = 'restaurant', p.latitude, p.longitude
+                FROM pts
+                JOIN pois_rtree r
+                  ON r.min_lat <= pts.lat + ? AND r.max_lat >= pts.lat - ?
+                 AND r.min_lon <= pts.lon + ? AND r.max_lon >= pts.lon - ?
+                JOIN pois p ON p.id_poi = r.id""",
+            tuple(params) + (dlat, dlat, dlon, dlon),
+        )
+        if not success:
+            raise RuntimeError(f"Erreur lors de la recherche des points d'intérêt : {rows}")
+        if not rows:
+            continue
+
+        pos, is_restaurant, poi_lat, poi_lon = (np.array(col) for col in zip(*rows))
+        pos = pos.astype(int)
+        # Distance de haversine entre chaque point et ses candidats
+        phi1, phi2 = np.radians(lats[pos]), np.radians(poi_lat.astype(float))
+        dphi = phi2 - phi1
+        dlambda = np.radians(poi_lon.astype(float) - lons[pos])
+        a = np.sin(dphi / 2) ** 2 + np.cos(phi1) * np.cos(phi2) * np.sin(dlambda / 2) ** 2
+        within = 2 * EARTH_RADIUS * np.arcsin(np.sqrt(a)) <= radius
+
+        is_restaurant = is_restaurant.astype(bool)
+        restaurant_density += np.bincount(
+            pos[within & is_restaurant], minlength=len(points)
+        )
+        transport_count += np.bincount(pos[within & ~is_restaurant], minlength=len(points))
+
+    return pd.DataFrame(
+        {"restaurant_density": restaurant_density, "transport_count": transport_count},
+        index=points.index,
+    )
+
+
+def recompute_geo_counts(db: sqlutils, radius: float = 500) -> tuple:
+    """
+    Recomputes restaurant_density and transport_count of every row of `geographie`.
+
+    Args:
+        db (sqlutils): The database, with an imported POI index.
+        radius (float): The radius, in metres.
+
+    Returns:
+        tuple: (True, message) or (False, error message). The transaction is committed.
+    """
+    success, rows = db.select("SELECT id_localisation, latitude, longitude FROM geographie")
+    if not success:
+        return (False, f"Erreur lors de la lecture de 'geographie' : {rows}")
+    points = pd.DataFrame(
+        rows, columns=["id_localisation", "latitude", "longitude"]
+    ).set_index("id_localisation")
+
+    counts = count_nearby_pois(db, points, radius)
+    success, message = db.update_many(
+        table_name="geographie",
+        key_column="id_localisation",
+        rows=[
+            (int(row.restaurant_density), int(row.transport_count), int(id_localisation))
+            for id_localisation, row in counts.iterrows()
+        ],
+        columns=["restaurant_density", "transport_count"],
+    )
+    if not success:
+        db.rollback()
+        return (False, f"Erreur lors de la mise à jour de 'geographie' : {message}")
+    db.commit()
+    return (True, f"Comptes recalculés pour {len(counts)} restaurants (rayon {radius} m)")
+
+
+if __name__ == "__main__":
+    # Exécution depuis le dossier app : python poi_index.py lyon.geojson --radius 500
+    parser = argparse.ArgumentParser(
+        description="Importe un extrait OSM et recalcule les comptes de la table geographie"
+    )
+    parser.add_argument("extract", nargs="?", help="Fichier .geojson ou .osm.pbf")
+    parser.add_argument("--radius", type=float, default=500)
+    parser.add_argument("--db", default="data/friands.db")
+    args = parser.parse_args()
+
+    db = sqlutils(Path(args.db))
+    if args.extract:
+        print(import_pois(db, args.extract)[1])
+    print(recompute_geo_counts(db, args.radius)[1])
+    db.close()
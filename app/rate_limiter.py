@@ -0,0 +1,217 @@
+import asyncio
+import random
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+from urllib.parse import urlparse
+
+
+# Intervalle (secondes) entre deux essais d'une coroutine en attente d'une place
+IN_FLIGHT_POLL = 0.05
+
+
+class BudgetExceeded(Exception):
+    """Raised when the request budget of a `HostRateLimiter` is exhausted."""
+
+
+class TokenBucket:
+    """
+    Token bucket limiting the request rate towards one host.
+
+    Attributes:
+        rate (float): Tokens added per second (sustained requests per second).
+        capacity (int): Maximum number of tokens, i.e. the allowed burst.
+        jitter (tuple): Bounds (seconds) of the random delay added to each request.
+    """
+
+    def __init__(self, rate: float, capacity: int = 1, jitter: tuple = (0, 0)) -> None:
+        """
+        Initializes a full bucket.
+
+        Args:
+            rate (float): Tokens added per second.
+            capacity (int): Maximum number of tokens.
+            jitter (tuple): Bounds (seconds) of the random delay added to each request.
+        """
+        self.rate = rate
+        self.capacity = capacity
+        self.jitter = jitter
+        self._tokens = float(capacity)
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self) -> None:
+        # Jetons accumulés depuis le dernier appel, au débit courant (verrou tenu par l'appelant)
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate)
+        self._last = now
+
+    def slow_down(self, factor: float = 0.5, min_rate: float = 0.02, pause: float = 0) -> None:
+        """
+        Reduces the rate after a rate-limit answer (multiplicative decrease).
+
+        Args:
+            factor (float): Multiplier applied to the rate.
+            min_rate (float): Rate below which the bucket never goes.
+            pause (float): Seconds during which no token is available (e.g. Retry-After).
+        """
+        with self._lock:
+            self._refill()
+            self.rate = max(min_rate, self.rate * factor)
+            self._tokens = min(self._tokens, -pause * self.rate)
+
+    def speed_up(self, max_rate: float, step: float) -> None:
+        """
+        Raises the rate by `step` after a successful request (additive increase),
+        up to `max_rate`.
+        """
+        with self._lock:
+            self._refill()
+            self.rate = min(max_rate, self.rate + step)
+
+    def reserve(self) -> float:
+        """
+        Takes a token and returns how long the caller must wait before using it.
+
+        Returns:
+            float: The delay in seconds (0 if a token was available), jitter included.
+
+        Notes:
+            The token is taken immediately, possibly driving the bucket negative:
+            concurrent callers are thus spaced out instead of all waking up together.
+        """
+        with self._lock:
+            self._refill()
+            self._tokens -= 1
+            delay = 0.0 if self._tokens >= 0 else -self._tokens / self.rate
+        return delay + random.uniform(*self.jitter)
+
+    def acquire(self) -> None:
+        """
+        Blocks the current thread until a token is available.
+        """
+        time.sleep(self.reserve())
+
+    async def acquire_async(self) -> None:
+        """
+        Waits, without blocking the event loop, until a token is available.
+        """
+        await asyncio.sleep(self.reserve())
+
+
+class HostRateLimiter:
+    """
+    Politeness rules shared by every request of the process.
+
+    Each host gets its own `TokenBucket`, the number of requests in flight is
+    capped, and an optional budget bounds the total number of requests. The cap
+    is shared by the threads (`slot`) and every event loop (`async_slot`).
+
+    Attributes:
+        default_rate (float): Requests per second allowed for hosts without a specific rate.
+        rates (dict): Hosts mapped to their own rate (e.g. Nominatim: 1 request per second).
+        capacity (int): Burst allowed per host.
+        jitter (tuple): Bounds (seconds) of the random delay added to each request.
+        max_in_flight (int): Maximum number of concurrent requests.
+        budget (int): Maximum number of requests, None for no limit.
+        nb_requests (int): Number of requests made so far.
+    """
+
+    def __init__(
+        self,
+        default_rate: float = 0.5,
+        rates: dict = None,
+        capacity: int = 2,
+        jitter: tuple = (0, 2),
+        max_in_flight: int = 4,
+        budget: int = None,
+    ) -> None:
+        """
+        Initializes the limiter.
+
+        Args:
+            default_rate (float): Requests per second for hosts without a specific rate.
+            rates (dict, optional): Hosts mapped to their own rate.
+            capacity (int): Burst allowed per host.
+            jitter (tuple): Bounds (seconds) of the random delay added to each request.
+            max_in_flight (int): Maximum number of concurrent requests.
+            budget (int, optional): Maximum number of requests.
+        """
+        self.default_rate = default_rate
+        self.rates = rates or {}
+        self.capacity = capacity
+        self.jitter = jitter
+        self.max_in_flight = max_in_flight
+        self.budget = budget
+        self.nb_requests = 0
+        self._buckets = {}
+        self._lock = threading.Lock()
+        self._in_flight = threading.BoundedSemaphore(max_in_flight)
+
+    def bucket(self, url: str) -> TokenBucket:
+        """
+        Returns the bucket of the host of `url`, creating it if needed.
+        """
+        host = urlparse(url).netloc
+        with self._lock:
+            if host not in self._buckets:
+                self._buckets[host] = TokenBucket(
+                    self.rates.get(host, self.default_rate), self.capacity, self.jitter
+                )
+            return self._buckets[host]
+
+    def slow_down(self, url: str, retry_after: float = None) -> None:
+        """
+        Halves the rate of the host of `url` after a rate-limit answer (HTTP 429),
+        and holds its requests during `retry_after` seconds if the server gave a delay.
+        """
+        self.bucket(url).slow_down(pause=retry_after or 0)
+
+    def speed_up(self, url: str) -> None:
+        """
+        Brings the rate of the host of `url` back towards its configured rate after a
+        successful request (a tenth of the configured rate per request).
+        """
+        max_rate = self.rates.get(urlparse(url).netloc, self.default_rate)
+        self.bucket(url).speed_up(max_rate, max_rate / 10)
+
+    def _consume_budget(self) -> None:
+        with self._lock:
+            if self.budget is not None and self.nb_requests >= self.budget:
+                raise BudgetExceeded(f"Budget de {self.budget} requêtes épuisé")
+            self.nb_requests += 1
+
+    @contextmanager
+    def slot(self, url: str):
+        """
+        Context manager to wrap around a blocking request to `url`.
+
+        Raises:
+            BudgetExceeded: If the request budget is exhausted.
+        """
+        self._consume_budget()
+        with self._in_flight:
+            self.bucket(url).acquire()
+            yield
+
+    @asynccontextmanager
+    async def async_slot(self, url: str):
+        """
+        Asynchronous counterpart of `slot()`, for requests made from an event loop.
+
+        Raises:
+            BudgetExceeded: If the request budget is exhausted.
+
+        Notes:
+            The place is taken in the same semaphore as `slot()`, without blocking
+            the event loop (non-blocking attempts every `IN_FLIGHT_POLL` seconds), so
+            that `max_in_flight` bounds the requests of all threads and loops.
+        """
+        self._consume_budget()
+        while not self._in_flight.acquire(blocking=False):
+            await asyncio.sleep(IN_FLIGHT_POLL)
+        try:
+            await self.bucket(url).acquire_async()
+            yield
+        finally:
+            self._in_flight.release()
@@ -0,0 +1,89 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import dotenv
+from sqlutils import sqlutils
+from scraping import update_restaurant_avis
+from sentiment_analysis import generate_label
+from summary_generator import generate_summary
+from summarize_restaurants import summarize_restaurants
+
+
+def refresh_restaurant(url, db, api_key, nb_mois=18, db_path=Path("data/friands.db")):
+    """Met à jour un restaurant déjà enregistré : nouveaux avis, labels et résumé.
+
+    Seuls les avis absents de la base sont ajoutés puis labellisés ; le résumé
+    n'est régénéré que s'il y a de nouveaux avis. `db_path` est le fichier de `db`,
+    dans lequel sont aussi écrits labels et résumé.
+    Retourne (True, nombre d'avis ajoutés) ou (False, message).
+    """
+    success, result = update_restaurant_avis(url, db)
+    if not success:
+        return False, result
+    id_restaurant, nb_new = result
+    if nb_new == 0:
+        return True, 0
+
+    # generate_label ne traite que les avis sans label, c'est-à-dire les nouveaux
+    success, message = generate_label(id_restaurant, db_path=db_path)
+    if not success:
+        return False, f"Erreur lors de la génération des labels : {message}"
+
+    success, message = generate_summary(
+        id_restaurant, api_key, nb_mois=nb_mois, db_path=db_path
+    )
+    if not success:
+        return False, f"Erreur lors de la génération du résumé : {message}"
+    return True, nb_new
+
+
+def refresh_restaurants(db_path, api_key, max_workers=4, nb_mois=18):
+    """Mise à jour incrémentale de tous les restaurants de la base (tâche nocturne).
+
+    Les pages d'avis sont parcourues en parallèle (sous les limites du scraper),
+    puis labels et résumés ne sont recalculés que pour les restaurants ayant de
+    nouveaux avis. Retourne un dictionnaire URL -> nombre d'avis ajoutés (None en
+    cas d'erreur).
+    """
+    db = sqlutils(db_path, pooled=True)
+    success, urls = db.select("SELECT url FROM restaurants WHERE url IS NOT NULL")
+    db.close()
+    if not success:
+        print(f"Erreur lors de la lecture des restaurants : {urls}")
+        return {}
+    urls = [url for (url,) in urls]
+
+    def crawl(url):
+        db = sqlutils(db_path, pooled=True)
+        try:
+            success, result = update_restaurant_avis(url, db)
+            if not success:
+                print(result)
+                return None
+            return result
+        finally:
+            db.close()
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        results = dict(zip(urls, executor.map(crawl, urls)))
+
+    # Labels puis résumés (en parallèle), uniquement pour les restaurants mis à jour
+    updated = [result[0] for result in results.values() if result and result[1]]
+    for id_restaurant in updated:
+        success, message = generate_label(id_restaurant, db_path=db_path)
+        if not success:
+            print(f"Erreur (labels) pour le restaurant {id_restaurant} : {message}")
+    summarize_restaurants(
+        db_path, api_key, ids=updated, max_workers=max_workers, nb_mois=nb_mois
+    )
+
+    return {url: result[1] if result else None for url, result in results.items()}
+
+
+if __name__ == "__main__":
+    # Exécution depuis le dossier app : python refresh_restaurants.py
+    dotenv.load_dotenv()
+    results = refresh_restaurants(Path("data/friands.db"), os.getenv("MISTRAL_API_KEY"))
+    nb_new = sum(n for n in results.values() if n)
+    print(f"{len(results)} restaurants parcourus, {nb_new} nouveaux avis")
@@ -1,6 +1,8 @@
+# Les identifiants des restaurants, localisations et avis sont attribués par sqlite
+# à l'insertion (AUTOINCREMENT : un identifiant supprimé n'est jamais réutilisé)
 schemaDB = {
     "avis": {
-        "id_avis": "INTEGER PRIMARY KEY",
+        "id_avis": "INTEGER PRIMARY KEY AUTOINCREMENT",
         "id_restaurant": "INTEGER REFERENCES restaurants(id_restaurant)",
         "nom_utilisateur": "TEXT",
         "note_restaurant": "FLOAT",
@@ -10,7 +12,7 @@ schemaDB = {
         "label": "INTEGER",
     },
     "restaurants": {
-        "id_restaurant": "INTEGER PRIMARY KEY",
+        "id_restaurant": "INTEGER PRIMARY KEY AUTOINCREMENT",
         "nom": "TEXT",
         "categorie": "TEXT",
         "tags": "TEXT",
@@ -19,9 +21,14 @@ schemaDB = {
         "total_comments": "FLOAT",
         "url": "TEXT",
         "summary": "TEXT",
+        # Empreinte des avis et du prompt ayant produit `summary`, plus grand
+        # id_avis couvert et backend utilisé (voir summary_generator.generate_summary)
+        "summary_digest": "TEXT",
+        "summary_id_avis": "INTEGER",
+        "summary_model": "TEXT",
     },
     "geographie": {
-        "id_localisation": "INTEGER PRIMARY KEY",
+        "id_localisation": "INTEGER PRIMARY KEY AUTOINCREMENT",
         "id_restaurant": "INTEGER REFERENCES restaurants(id_restaurant)",
         "localisation": "TEXT",
         "latitude": "FLOAT",
@@ -29,4 +36,63 @@ schemaDB = {
         "restaurant_density": "INTEGER",
         "transport_count": "INTEGER",
     },
+    # Points d'intérêt OpenStreetMap (restaurants et arrêts de transport en commun)
+    "pois": {
+        "id_poi": "INTEGER PRIMARY KEY",
+        "osm_id": "TEXT",
+        "kind": "TEXT",
+        "latitude": "FLOAT",
+        "longitude": "FLOAT",
+    },
+}
+
+# Index secondaires, déclarés par table : nom de l'index -> définition
+# - columns : colonnes indexées
+# - unique : index d'unicité (optionnel), sert aussi de clé naturelle pour
+#   la détection des doublons à l'insertion (sqlutils.insert / upsert)
+# - where : condition d'un index partiel (optionnel)
+indexesDB = {
+    "avis": {
+        "idx_avis_restaurant_date": {"columns": "id_restaurant, date_avis"},
+        "idx_avis_unlabeled": {"columns": "id_restaurant", "where": "label IS NULL"},
+        # Clé naturelle d'un avis, utilisée pour détecter les doublons
+        "idx_avis_natural_key": {
+            "columns": "id_restaurant, nom_utilisateur, date_avis, titre_avis",
+            "unique": True,
+        },
+    },
+    "restaurants": {
+        "idx_restaurants_url": {"columns": "url", "unique": True},
+    },
+    "geographie": {
+        "idx_geographie_restaurant": {"columns": "id_restaurant", "unique": True},
+    },
+    "pois": {
+        "idx_pois_osm_id": {"columns": "osm_id", "unique": True},
+    },
+}
+
+# Index plein texte FTS5, synchronisés avec leur table source par triggers
+# - content / content_rowid : table indexée et sa clé primaire
+# - columns : colonnes texte indexées
+# - tokenize : tokenizer FTS5 (remove_diacritics : "cafe" trouve "café")
+ftsDB = {
+    "avis_fts": {
+        "content": "avis",
+        "content_rowid": "id_avis",
+        "columns": "titre_avis, contenu_avis",
+        "tokenize": "unicode61 remove_diacritics 2",
+    },
+}
+
+# Index spatiaux R*Tree, synchronisés avec leur table source par triggers
+# - content / content_rowid : table indexée et sa clé primaire (entière)
+# - latitude / longitude : colonnes des coordonnées des points
+rtreeDB = {
+    "pois_rtree": {
+        "content": "pois",
+        "content_rowid": "id_poi",
+        "latitude": "latitude",
+        "longitude": "longitude",
+    },
 }
@@ -1,13 +1,22 @@
+import asyncio
+import json
+import random
 import re
+import time
+import httpx
 import pandas as pd
-from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from math import ceil
 from pathlib import Path
 import requests
-import time
-import random
 from bs4 import BeautifulSoup
 from sqlutils import sqlutils
 from schemaDB import schemaDB
+from rate_limiter import HostRateLimiter
+from scraping_client import ACCEPT_ENCODING, ScrapingClient
+from http_cache import ResponseCache
+from geo_cache import GeoCache, overpass_pois_query
+from html_parsing import BS4_FEATURES, parse_avis_page
 import locale
 
 
@@ -22,15 +31,41 @@ headers = {
     "accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,image/apng,*/*;q=0.8",
 }
 
+# Règles de politesse partagées par toutes les requêtes du processus : débit
+# limité par hôte (avec jitter), nombre de requêtes simultanées plafonné
+rate_limiter = HostRateLimiter(
+    default_rate=0.5,
+    rates={"nominatim.openstreetmap.org": 1.0},
+    jitter=(0, 2),
+    max_in_flight=4,
+)
+
+# Session HTTP partagée : connexions keep-alive, compression, retries sur 429/5xx,
+# requêtes conditionnelles (ETag / Last-Modified) et cache disque des réponses.
+# Le mode rejeu (`with client.replay():` ou SCRAPING_OFFLINE=1) n'utilise que le cache.
+client = ScrapingClient(rate_limiter, headers=headers, cache=ResponseCache.from_env())
+
+
+def fetch(url, **kwargs):
+    """Requête GET via la session partagée `client`, soumise aux limites de `rate_limiter`."""
+    return client.get(url, **kwargs)
 
-# Suppression des espaces et ponctuations bizarres dans les champs texte
-def clean_text(text):
-    if isinstance(text, str):
-        text = re.sub(r"\s+", " ", text)
-        text = re.sub(r"[\"\'”“‘’]", "", text)
-        text = re.sub(r"[^\w\s,.-]", "", text)
-        text = text.strip()
-    return text
+
+def crawl_pages(urls, max_workers=None):
+    """Télécharge plusieurs pages en parallèle, sous les limites de `rate_limiter`.
+
+    Retourne les réponses dans l'ordre des URLs (None pour une page en erreur).
+    """
+
+    def fetch_or_none(url):
+        try:
+            return fetch(url)
+        except Exception as e:
+            print(f"Erreur lors de la récupération de la page {url} : {e}")
+            return None
+
+    with ThreadPoolExecutor(max_workers=max_workers or rate_limiter.max_in_flight) as executor:
+        return list(executor.map(fetch_or_none, urls))
 
 
 def extract_address(soup):
@@ -53,201 +88,254 @@ def extract_address(soup):
     return None
 
 
-def scrape_restaurant_info(restaurant_url, db):
-    id_restaurant = db.select("select max(id_restaurant)+1 from restaurants")
-    id_restaurant = id_restaurant[1][0][0]
-    try:
+def extract_address_fallback(soup):
+    """Sélecteur alternatif : premier texte de la page ayant la forme d'une adresse postale."""
+    address = soup.find(string=re.compile(r"^\s*\d+[^,]{3,80},\s*\d{5}\s+\S"))
+    return address.strip() if address else None
 
-        time.sleep(random.uniform(5, 10))
-        response = requests.get(restaurant_url, headers=headers)
 
-        # Vérification du statut de la requête
-        if response.status_code == 200:
-            soup = BeautifulSoup(response.text, "html.parser")
+def extract_json_ld(soup):
+    """Retourne l'objet JSON-LD décrivant l'établissement, ou un dictionnaire vide."""
+    for script in soup.find_all("script", type="application/ld+json"):
+        try:
+            data = json.loads(script.string or "")
+        except ValueError:
+            continue
+        for item in data if isinstance(data, list) else [data]:
+            if isinstance(item, dict) and item.get("@type") in (
+                "FoodEstablishment",
+                "Restaurant",
+            ):
+                return item
+    return {}
 
-            # Extraire les informations principales
-            nom = (
-                soup.find("h1", class_="rRtyp").text.strip()
-                if soup.find("h1", class_="rRtyp")
-                else "Nom non trouvé"
-            )
-            localisation = extract_address(soup)
-            print("localisation", localisation)
-            categorie = "Restaurant"
-
-            # Extraire les tags et séparer les catégories du prix
-            tags_element = soup.find("span", class_=re.compile(r"(VdWAl|HUMGB cPbcf)"))
-            tags_text = tags_element.text.strip() if tags_element else ""
-
-            # Séparer les tags et le prix
-            price = re.search(r"[€$£]+(?:\s*-\s*[€$£]+)?", tags_text).group(
-                0
-            )  # Extraire le prix
-            tags = (
-                tags_text.replace(price, "").strip().strip(",")
-            )  # Supprimer le prix des tags
-
-            # Note globale
-            note_globale = soup.find("div", class_="biGQs _P fiohW hzzSG uuBRH")
-            note_globale = (
-                float(note_globale.text.strip().replace(",", "."))
-                if note_globale
-                else 0.0
-            )
 
-            # Nombre total de commentaires
-            total_comments_element = soup.find("span", class_="GPKsO")
-            if total_comments_element:
-                total_comments_text = total_comments_element.text.strip()
-                # Extraire uniquement le nombre avant "avis"
-                total_comments = int(re.search(r"\d+", total_comments_text).group(0))
-            else:
-                total_comments = 0
-
-            # Retourner les informations
-            return {
-                "id_restaurant": id_restaurant,
-                "nom": nom,
-                "localisation": localisation,
-                "categorie": categorie,
-                "tags": tags,
-                "price": price,
-                "note_globale": note_globale,
-                "total_comments": total_comments,
-                "url": restaurant_url,
-            }
+def json_ld_address(json_ld):
+    """Adresse au format de la table `geographie` ("rue, code postal ville pays")."""
+    address = json_ld.get("address") or {}
+    if not address.get("streetAddress"):
+        return None
+    country = address.get("addressCountry") or ""
+    if isinstance(country, dict):
+        country = country.get("name", "")
+    country = "France" if country == "FR" else country
+    city = " ".join(
+        part
+        for part in (address.get("postalCode"), address.get("addressLocality"), country)
+        if part
+    )
+    return f"{address['streetAddress']}, {city}".strip(", ")
+
+
+def apply_fallback_extractors(soup, info):
+    """Complète les champs manquants de `info` sans re-télécharger la page.
+
+    Les données structurées (JSON-LD) sont essayées d'abord, puis des sélecteurs
+    alternatifs.
+    """
+    json_ld = extract_json_ld(soup)
+    rating = json_ld.get("aggregateRating") or {}
+
+    if info["nom"] == "Nom non trouvé" and json_ld.get("name"):
+        info["nom"] = json_ld["name"]
+    if not info["localisation"]:
+        info["localisation"] = json_ld_address(json_ld) or extract_address_fallback(
+            soup
+        )
+    if not info["total_comments"]:
+        if rating.get("reviewCount"):
+            info["total_comments"] = int(rating["reviewCount"])
         else:
+            # Texte du type "298 avis" n'importe où dans la page
+            match = soup.find(string=re.compile(r"^\s*\d[\d\s\u202f]*\s+avis\b"))
+            if match:
+                info["total_comments"] = int(re.sub(r"\D", "", match.split("avis")[0]))
+    if not info["note_globale"] and rating.get("ratingValue"):
+        info["note_globale"] = float(rating["ratingValue"])
+    if not info["price"] and json_ld.get("priceRange"):
+        info["price"] = json_ld["priceRange"]
+    return info
+
+
+def restaurant_info_complete(info):
+    """Vrai si l'adresse et le nombre d'avis ont été trouvés."""
+    return bool(info and info["localisation"] and info["total_comments"])
+
+
+def retry_delay(attempt, base_delay=2.0, max_delay=30.0):
+    """Délai exponentiel borné (avec jitter) avant le re-téléchargement n° `attempt`."""
+    delay = min(max_delay, base_delay * 2 ** (attempt - 1))
+    return delay + random.uniform(0, delay / 2)
+
+
+def parse_restaurant_info(html, restaurant_url):
+    """Extrait les informations principales d'une page restaurant TripAdvisor."""
+    soup = BeautifulSoup(html, BS4_FEATURES)
+
+    # Extraire les informations principales
+    nom = (
+        soup.find("h1", class_="rRtyp").text.strip()
+        if soup.find("h1", class_="rRtyp")
+        else "Nom non trouvé"
+    )
+    localisation = extract_address(soup)
+    categorie = "Restaurant"
+
+    # Extraire les tags et séparer les catégories du prix
+    tags_element = soup.find("span", class_=re.compile(r"(VdWAl|HUMGB cPbcf)"))
+    tags_text = tags_element.text.strip() if tags_element else ""
+
+    # Séparer les tags et le prix
+    price = re.search(r"[€$£]+(?:\s*-\s*[€$£]+)?", tags_text)
+    price = price.group(0) if price else ""  # Extraire le prix
+    tags = tags_text.replace(price, "").strip().strip(",")  # Supprimer le prix des tags
+
+    # Note globale
+    note_globale = soup.find("div", class_="biGQs _P fiohW hzzSG uuBRH")
+    note_globale = (
+        float(note_globale.text.strip().replace(",", ".")) if note_globale else 0.0
+    )
+
+    # Nombre total de commentaires
+    total_comments_element = soup.find("span", class_="GPKsO")
+    if total_comments_element:
+        total_comments_text = total_comments_element.text.strip()
+        # Extraire uniquement le nombre avant "avis"
+        total_comments = int(re.search(r"\d+", total_comments_text).group(0))
+    else:
+        total_comments = 0
+
+    info = {
+        "nom": nom,
+        "localisation": localisation,
+        "categorie": categorie,
+        "tags": tags,
+        "price": price,
+        "note_globale": note_globale,
+        "total_comments": total_comments,
+        "url": restaurant_url,
+    }
+    # Champs manquants : nouvelle analyse de la même page avant tout re-téléchargement
+    if not restaurant_info_complete(info) or not price or not note_globale:
+        apply_fallback_extractors(soup, info)
+    return info
+
+
+def fetch_restaurant_info(restaurant_url, max_fetches=3):
+    """Télécharge et analyse une page restaurant.
+
+    La page n'est re-téléchargée (délai exponentiel borné) que si l'adresse ou le
+    nombre d'avis restent introuvables après les extracteurs de repli.
+    Retourne les dernières informations extraites (éventuellement incomplètes) ou None.
+    """
+    info = None
+    # En mode rejeu, un re-téléchargement renverrait la même page
+    max_fetches = 1 if client.offline else max_fetches
+    for attempt in range(max_fetches):
+        if attempt:
+            time.sleep(retry_delay(attempt))
+        try:
+            # Un re-téléchargement ne doit pas être servi par une réponse 304
+            response = fetch(restaurant_url, conditional=attempt == 0)
+        except requests.exceptions.RequestException as e:
+            print(f"Erreur de connexion pour {restaurant_url}: {e}")
+            continue
+        if response.status_code != 200:
             print(
                 f"Erreur: code de statut {response.status_code} pour {restaurant_url}"
             )
-            return None
+            continue
 
-    except requests.exceptions.RequestException as e:
-        print(f"Erreur de connexion pour {restaurant_url}: {e}")
-        return None
+        info = parse_restaurant_info(response.text, restaurant_url)
+        if restaurant_info_complete(info):
+            break
+        print(f"Tentative {attempt + 1}: localisation ou nombre d'avis introuvable")
+
+    print(f"Téléchargement de {restaurant_url} : {client.url_stats.get(restaurant_url)}")
+    return info
+
+
+def scrape_restaurant_info(restaurant_url, db):
+    try:
+        info = fetch_restaurant_info(restaurant_url)
+        if info is None:
+            return None
+        # L'identifiant est attribué par la base à l'insertion (store_restaurant)
+        return {"id_restaurant": None, **info}
 
     except Exception as e:
         print(f"Erreur lors du scraping de {restaurant_url} : {e}")
         return None
 
 
-def scrape_avis(restaurant_url, id_restaurant, db, max_pages=5):
+def scrape_avis(restaurant_url, id_restaurant, db, max_pages=5, total_comments=None):
     avis_list = []
-    page_num = 0  # Numéro de page des avis
-    success, avis_id = db.select("select max(id_avis)+1 from avis")
-    if not success:
-        print(f"Erreur lors de la récupération de l'ID de l'avis : {avis_id}")
-    else:
-        avis_id = avis_id[0][0]
 
-    while page_num < max_pages:
-        try:
-            url = f"{restaurant_url}-or{page_num * 15}"
-            print(
-                f"Scraping des avis pour le restaurant {id_restaurant}, page {page_num + 1}: {url}"
-            )
+    # Nombre de pages à parcourir (15 avis par page), connu si total_comments l'est
+    nb_pages = max_pages
+    if total_comments:
+        nb_pages = min(max_pages, ceil(total_comments / 15))
 
-            # Requête HTTP
-            response = requests.get(url, headers=headers)
-            if response.status_code != 200:
-                print(
-                    f"Erreur lors de la récupération de la page {url}, code de statut {response.status_code}"
-                )
-                break
-
-            soup = BeautifulSoup(response.text, "html.parser")
+    # Les pages sont téléchargées en parallèle, sous les limites de rate_limiter
+    urls = [f"{restaurant_url}-or{page_num * 15}" for page_num in range(nb_pages)]
+    print(f"Scraping des avis pour le restaurant {id_restaurant} : {nb_pages} pages")
+    responses = crawl_pages(urls)
 
-            # Sélectionner les conteneurs d'avis
-            avis_containers = soup.find_all("div", class_="_c")
-            if not avis_containers:
-                break
+    # Les identifiants sont attribués par la base à l'insertion (store_restaurant)
+    for avis in parse_avis_pages(urls, responses, id_restaurant):
+        avis_list.append({"id_avis": None, **avis})
 
-            for avis in avis_containers:
-                # Nom de l'utilisateur
-                nom_utilisateur = (
-                    avis.find("span", class_="biGQs _P fiohW fOtGX").text.strip()
-                    if avis.find("span", class_="biGQs _P fiohW fOtGX")
-                    else "Anonyme"
-                )
-
-                # Note du restaurant
-                svg_element = avis.find("svg", class_="UctUV")
-                note_restaurant = None
-                if svg_element:
-                    title_element = svg_element.find("title")
-                    if title_element:
-                        note_text = title_element.text.strip()
-                        note_restaurant = float(
-                            note_text.split(" ")[0].replace(",", ".")
-                        )
-
-                # Date de l'avis
-                date_avis = (
-                    avis.find("div", class_="biGQs _P pZUbB ncFvv osNWb").text.strip()
-                    if avis.find("div", class_="biGQs _P pZUbB ncFvv osNWb")
-                    else None
-                )
-                # Supprimer "Rédigé le " et convertir la date
-                cleaned_date = re.sub(r"^Rédigé le ", "", date_avis).strip()
-                date_avis = datetime.strptime(cleaned_date, "%d %B %Y")
-
-                # Titre avis
-                titre_avis = (
-                    avis.find(
-                        "div", class_="biGQs _P fiohW qWPrE ncFvv fOtGX"
-                    ).text.strip()
-                    if avis.find("div", class_="biGQs _P fiohW qWPrE ncFvv fOtGX")
-                    else "Titre non disponible"
-                )
-                titre_avis = clean_text(titre_avis)
+    return avis_list
 
-                # Contenu de l'avis
-                contenu_avis = (
-                    avis.find("span", class_="JguWG").text.strip()
-                    if avis.find("span", class_="JguWG")
-                    else "Contenu non disponible"
-                )
-                contenu_avis = clean_text(contenu_avis)
-
-                # Ajouter les informations à la liste des avis
-                avis_list.append(
-                    {
-                        "id_avis": avis_id,
-                        "id_restaurant": id_restaurant,
-                        "nom_utilisateur": nom_utilisateur,
-                        "note_restaurant": note_restaurant,
-                        "date_avis": date_avis,
-                        "titre_avis": titre_avis,
-                        "contenu_avis": contenu_avis,
-                    }
-                )
-                avis_id += 1
 
-            # Pause aléatoire pour éviter d'être bloqué par le site
-            time.sleep(random.uniform(5, 15))
+def parse_avis_pages(urls, responses, id_restaurant):
+    """Extrait les avis de pages téléchargées, dans l'ordre des pages.
 
-            # Passer à la page suivante
-            page_num += 1
+    S'arrête à la première page vide ou en erreur (réponse None ou statut != 200).
+    """
+    avis_list = []
+    for url, response in zip(urls, responses):
+        if response is None or response.status_code != 200:
+            print(
+                f"Erreur lors de la récupération de la page {url}, code de statut {getattr(response, 'status_code', None)}"
+            )
+            break
 
+        try:
+            page_avis = parse_avis_page(response.text, id_restaurant)
         except Exception as e:
             print(f"Erreur lors du scraping des avis : {e}")
             break
+        if not page_avis:
+            break
+        avis_list.extend(page_avis)
 
     return avis_list
 
 
-def get_coordinates(address):
-    """Utilise l'API Nominatim pour obtenir latitude et longitude à partir d'une adresse."""
-    url = "https://nominatim.openstreetmap.org/search"
-    params = {
+NOMINATIM_URL = "https://nominatim.openstreetmap.org/search"
+NOMINATIM_HEADERS = {"User-Agent": "YourAppName/1.0 (your@email.com)"}
+OVERPASS_URL = "http://overpass-api.de/api/interpreter"
+
+# Cache persistant des géocodages et des points d'intérêt OSM (tuiles geohash)
+geo_cache = GeoCache()
+
+
+def nominatim_params(address):
+    """Paramètres de la requête Nominatim pour une adresse."""
+    return {
         "q": address,
         "format": "json",
         "addressdetails": 1,
         "limit": 1,
     }
-    headers = {"User-Agent": "YourAppName/1.0 (your@email.com)"}
 
-    response = requests.get(url, params=params, headers=headers)
+
+def get_coordinates(address):
+    """Utilise l'API Nominatim pour obtenir latitude et longitude à partir d'une adresse."""
+    response = fetch(
+        NOMINATIM_URL, params=nominatim_params(address), headers=NOMINATIM_HEADERS
+    )
 
     if response.status_code == 200:
         data = response.json()
@@ -263,72 +351,57 @@ def get_coordinates(address):
     return None, None
 
 
-def get_density_of_restaurants(lat, lon, radius=500):
-    """Utilise l'API Overpass pour récupérer les restaurants à proximité d'une latitude/longitude."""
-    overpass_url = "http://overpass-api.de/api/interpreter"
-    overpass_query = f"""
-    [out:json];
-    (
-      node["amenity"="restaurant"](around:{radius},{lat},{lon});
-      way["amenity"="restaurant"](around:{radius},{lat},{lon});
-      relation["amenity"="restaurant"](around:{radius},{lat},{lon});
-    );
-    out body;
-    """
-    response = requests.get(overpass_url, params={"data": overpass_query})
+def geocode(address):
+    """Coordonnées (lat, lon) d'une adresse, depuis le cache géographique ou Nominatim."""
+    cached = geo_cache.get_coordinates(address)
+    if cached is not None:
+        return cached
+    lat, lon = get_coordinates(address)
+    if lat is not None and lon is not None:
+        geo_cache.store_coordinates(address, lat, lon)
+        return float(lat), float(lon)
+    return None, None
 
-    if response.status_code == 200:
-        data = response.json()
-        # Le nombre total de restaurants trouvés
-        return len(data["elements"])
-    else:
-        print(f"Erreur lors de la requête Overpass : {response.status_code}")
-        return 0
-
-
-def get_transport_info(lat, lon, radius=500):
-    """Récupère les informations sur les transports publics à proximité d'une latitude/longitude."""
-    overpass_url = "http://overpass-api.de/api/interpreter"
-    overpass_query = f"""
-    [out:json];
-    (
-      node["highway"="bus_stop"](around:{radius},{lat},{lon});
-      node["railway"="station"](around:{radius},{lat},{lon});
-      node["amenity"="subway"](around:{radius},{lat},{lon});
-    );
-    out body;
-    """
-    response = requests.get(overpass_url, params={"data": overpass_query})
 
-    if response.status_code == 200:
-        data = response.json()
-        return len(data["elements"])
-    else:
+def fetch_poi_tiles(tiles):
+    """Télécharge les points d'intérêt de tuiles manquantes en une seule requête Overpass."""
+    response = fetch(
+        OVERPASS_URL, params={"data": overpass_pois_query(geo_cache.tiles_bbox(tiles))}
+    )
+    if response.status_code != 200:
         print(f"Erreur lors de la requête Overpass : {response.status_code}")
-        return 0
+        return False
+    geo_cache.store_tiles(tiles, response.json()["elements"])
+    return True
+
+
+def count_pois(lat, lon, radius=500):
+    """Densité de restaurants et nombre d'arrêts de transport autour d'un point.
+
+    Les comptes sont calculés localement à partir des tuiles du cache géographique ;
+    seules les tuiles manquantes sont demandées à Overpass.
+    """
+    missing = geo_cache.missing_tiles(lat, lon, radius)
+    if missing and not fetch_poi_tiles(missing):
+        return 0, 0
+    return geo_cache.count_nearby(lat, lon, radius)
 
 
 def enrich_geographic_data(localisation, id_restaurant, db):
     """Récupère les données géographiques pour la table `geographie`."""
-    id_localisation = db.select("select max(id_localisation)+1 from geographie")
-    id_localisation = id_localisation[1][0][0]
-
-    # Obtenir les coordonnées géographiques
-    lat, lon = get_coordinates(localisation)
+    # Obtenir les coordonnées géographiques (cache par adresse normalisée)
+    lat, lon = geocode(localisation)
 
     if lat is None or lon is None:
         print(f"Impossible de récupérer les coordonnées pour {localisation}")
         return None
 
-    # Récupérer la densité des restaurants dans les environs
-    restaurant_density = get_density_of_restaurants(lat, lon)
-
-    # Récupérer les informations sur les transports à proximité
-    transport_count = get_transport_info(lat, lon)
+    # Densité des restaurants et transports à proximité (cache par tuile geohash)
+    restaurant_density, transport_count = count_pois(lat, lon)
 
     # Enrichir les données géographiques
     return {
-        "id_localisation": id_localisation,
+        "id_localisation": None,
         "id_restaurant": id_restaurant,
         "localisation": localisation,
         "latitude": lat,
@@ -339,40 +412,22 @@ def enrich_geographic_data(localisation, id_restaurant, db):
 
 
 def process_pipeline(url, db):
-    """Pipeline complet pour scraper, nettoyer et insérer un restaurant dans la base de données."""
+    """Pipeline complet pour scraper, nettoyer et insérer un restaurant dans la base de données.
 
-    # Étape 0 : Vérifier si l'URL existe déjà dans la table "restaurants"
-    # sanitized_url = url.replace(
-    #     "'", "''"
-    # )  # Échappement des guillemets simples pour SQL
-    # query = f"SELECT * FROM restaurants WHERE url = '{sanitized_url}'"
-    # existing_record = db.select(query)
+    L'enregistrement est validé ici (commit), ou annulé en cas d'erreur : la
+    connexion d'écriture n'est pas conservée après l'appel.
+    """
 
-    # if existing_record[1]:
-    #     print("L'URL existe déjà dans la base de données. Arrêt du pipeline.")
-    #     return
+    # Étape 0 : Vérifier si l'URL existe déjà dans la table "restaurants"
+    if existing_restaurant(db, url) is not None:
+        return
 
     # Étape 1 : Scraper les infos principales
 
     try:
-        attempts = 0
-        max_attempts = 15
-
-        while attempts < max_attempts:
-            # Appeler la fonction de scraping
-            restaurant_info = scrape_restaurant_info(url, db)
-            # Vérifier si localisation est trouvée
-            if (
-                restaurant_info["total_comments"] != 0
-                and restaurant_info["localisation"]
-            ):
-                print(f"Localisation trouvée après {attempts + 1} tentatives.")
-                break
-
-            print(f"Tentative {attempts + 1}: Localisation non trouvée. Retrying...")
-            attempts += 1
-
-        if not restaurant_info:
+        # Les re-téléchargements éventuels sont gérés par fetch_restaurant_info
+        restaurant_info = scrape_restaurant_info(url, db)
+        if not restaurant_info_complete(restaurant_info):
             print(
                 "Impossible de scraper les informations principales. Arrêt du pipeline."
             )
@@ -396,7 +451,9 @@ def process_pipeline(url, db):
 
     # Étape 3 : Scraper les avis
     try:
-        avis_data = scrape_avis(url, restaurant_info[0], db)
+        avis_data = scrape_avis(
+            url, restaurant_info[0], db, total_comments=restaurant_info[7]
+        )
         if not avis_data:
             print("Impossible de scraper les avis. Arrêt du pipeline.")
             return
@@ -406,10 +463,54 @@ def process_pipeline(url, db):
         return
 
     # Étape 4 : Enregistrement dans la base de données
+    # (store_restaurant annule lui-même la transaction en cas d'échec)
+    if store_restaurant(db, restaurant_info_without_loc, geo_data, avis_data):
+        db.commit()
+
+
+# Colonnes des lignes d'avis produites par le scraping
+COLAVIS = [
+    "id_avis",
+    "id_restaurant",
+    "nom_utilisateur",
+    "note_restaurant",
+    "date_avis",
+    "titre_avis",
+    "contenu_avis",
+]
+
+
+def existing_restaurant(db, url):
+    """Identifiant du restaurant déjà enregistré pour `url` (message affiché), ou None."""
+    success, found = db.select("SELECT id_restaurant FROM restaurants WHERE url = ?", (url,))
+    if not success or not found:
+        return None
+    print(
+        f"Restaurant déjà enregistré (id {found[0][0]}) : {url}. "
+        "Ses nouveaux avis sont ajoutés par update_restaurant_avis."
+    )
+    return found[0][0]
+
+
+def store_restaurant(db, restaurant_row, geo_row, avis_rows):
+    """Insère un restaurant, sa localisation et ses avis en une seule transaction.
+
+    Les identifiants présents dans les lignes sont ignorés : ils sont attribués par
+    la base à l'insertion, et celui du restaurant est récupéré (RETURNING) pour sa
+    localisation et ses avis. Retourne True si tout a été inséré (la transaction
+    reste à valider par l'appelant), False sinon (tout est annulé), notamment si le
+    restaurant (même URL) est déjà enregistré.
+    """
     try:
+        db.begin()
+
+        # Vérifié dans la transaction : un autre pipeline a pu l'ajouter entre-temps
+        if existing_restaurant(db, restaurant_row[-1]) is not None:
+            db.rollback()
+            return False
+
         # Insérer les données dans la table "restaurants"
         colresto = [
-            "id_restaurant",
             "nom",
             "categorie",
             "tags",
@@ -418,43 +519,429 @@ def process_pipeline(url, db):
             "total_comments",
             "url",
         ]
-
-        success, message = db.insert(
+        success, ids = db.insert(
             table_name="restaurants",
-            rows=[restaurant_info_without_loc],
+            rows=[tuple(restaurant_row[1:])],
             column_names=colresto,
-            chk_duplicates=True,
+            returning="id_restaurant",
         )
         if not success:
-            print(f"Erreur lors de l'insertion dans 'restaurants': {message}")
-            return
+            print(f"Erreur lors de l'insertion dans 'restaurants': {ids}")
+            db.rollback()
+            return False
+        id_restaurant = ids[0]
 
         # Insérer les données dans la table "geographie"
-        success, message = db.insert("geographie", [geo_data], chk_duplicates=True)
+        colgeo = [
+            "id_restaurant",
+            "localisation",
+            "latitude",
+            "longitude",
+            "restaurant_density",
+            "transport_count",
+        ]
+        success, message = db.insert(
+            "geographie", [(id_restaurant,) + tuple(geo_row[2:])], column_names=colgeo
+        )
         if not success:
             print(f"Erreur lors de l'insertion dans 'geographie': {message}")
-            return
+            db.rollback()
+            return False
 
         # Insérer les données dans la table "avis"
-        colavis = [
-            "id_avis",
-            "id_restaurant",
-            "nom_utilisateur",
-            "note_restaurant",
-            "date_avis",
-            "titre_avis",
-            "contenu_avis",
-        ]
-        success, message = db.insert(
-            "avis", avis_data, column_names=colavis, chk_duplicates=True
+        # Les avis déjà présents (même clé naturelle) sont ignorés
+        success, message = db.upsert(
+            "avis",
+            [(id_restaurant,) + tuple(avis[2:]) for avis in avis_rows],
+            column_names=COLAVIS[1:],
         )
         if not success:
             print(f"Erreur lors de l'insertion dans 'avis': {message}")
-            return
+            db.rollback()
+            return False
+        print(
+            f"Restaurant {id_restaurant} : {len(message['inserted'])} avis insérés, "
+            f"{len(message['skipped'])} doublons ignorés"
+        )
 
         print("Pipeline exécuté avec succès.")
+        return True
     except Exception as e:
         print(f"Erreur lors de l'enregistrement dans la base de données : {e}")
+        db.rollback()
+        return False
+
+
+def process_pipelines(urls, db_path, max_workers=4):
+    """Ajoute plusieurs restaurants en parallèle, sous le même budget de requêtes.
+
+    Chaque restaurant est traité dans son propre thread avec sa propre connexion
+    (pool sqlutils) ; toutes les requêtes HTTP partagent `rate_limiter`.
+    Retourne un dictionnaire URL -> True si le restaurant a été ajouté.
+    """
+
+    def run(url):
+        db = sqlutils(db_path, pooled=True)
+        try:
+            process_pipeline(url, db)
+            success, found = db.select("SELECT 1 FROM restaurants WHERE url = ?", (url,))
+            return success and len(found) > 0
+        except Exception as e:
+            print(f"Erreur lors de l'ajout de {url} : {e}")
+            db.rollback()
+            return False
+        finally:
+            db.close()
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return dict(zip(urls, executor.map(run, urls)))
+
+
+######################################
+#### MISE À JOUR INCRÉMENTALE ########
+######################################
+
+
+def avis_key(avis):
+    """Clé naturelle (nom_utilisateur, jour, titre_avis) d'un avis scrapé."""
+    return (avis["nom_utilisateur"], avis["date_avis"], avis["titre_avis"])
+
+
+def known_avis_keys(db, id_restaurant):
+    """Clés naturelles (nom_utilisateur, jour, titre_avis) des avis déjà enregistrés."""
+    # substr : des avis scrapés avant la normalisation des dates ont aussi l'heure
+    success, rows = db.select(
+        """SELECT nom_utilisateur, substr(date_avis, 1, 10), titre_avis
+           FROM avis WHERE id_restaurant = ?""",
+        (id_restaurant,),
+    )
+    if not success:
+        print(f"Erreur lors de la lecture des avis existants : {rows}")
+        return set()
+    return set(rows)
+
+
+def scrape_new_avis(restaurant_url, id_restaurant, known_keys, max_pages=50):
+    """Parcourt les pages d'avis, des plus récentes aux plus anciennes, et retient les
+    avis qui ne sont pas encore enregistrés.
+
+    L'ordre des avis de TripAdvisor n'est pas strictement chronologique : un nouvel
+    avis peut suivre un avis déjà connu. Le parcours ne s'arrête donc qu'à la
+    première page dont tous les avis sont déjà connus (ou vide).
+
+    Retourne les nouveaux avis (sans identifiant), le nombre de pages lues et le
+    nombre total d'avis affiché par la première page (None s'il est introuvable).
+    """
+    seen = set(known_keys)
+    new_avis = []
+    total_comments = None
+    for page_num in range(max_pages):
+        url = f"{restaurant_url}-or{page_num * 15}"
+        try:
+            # La première page est toujours revalidée auprès du serveur
+            response = fetch(url, max_age=0 if page_num == 0 else None)
+        except requests.exceptions.RequestException as e:
+            print(f"Erreur lors de la récupération de la page {url} : {e}")
+            return new_avis, page_num, total_comments
+        if page_num == 0 and response.status_code == 200:
+            info = parse_restaurant_info(response.text, restaurant_url)
+            total_comments = info["total_comments"] or None
+        page_avis = parse_avis_pages([url], [response], id_restaurant)
+
+        nb_new = 0
+        for avis in page_avis:
+            key = avis_key(avis)
+            if key not in seen:
+                seen.add(key)
+                new_avis.append(avis)
+                nb_new += 1
+        if nb_new == 0:
+            return new_avis, page_num + 1, total_comments
+    return new_avis, max_pages, total_comments
+
+
+def update_restaurant_avis(restaurant_url, db, max_pages=50):
+    """Ajoute les nouveaux avis d'un restaurant déjà enregistré (mise à jour incrémentale).
+
+    Le nombre total d'avis du restaurant est celui affiché par sa page (à défaut,
+    l'ancien total plus les avis ajoutés).
+    Retourne (True, (id_restaurant, nombre d'avis ajoutés)) ou (False, message).
+    La transaction est validée par cette fonction.
+    """
+    success, found = db.select(
+        "SELECT id_restaurant FROM restaurants WHERE url = ?", (restaurant_url,)
+    )
+    if not success or not found:
+        return False, f"Restaurant inconnu : {restaurant_url}"
+    id_restaurant = found[0][0]
+
+    new_avis, nb_pages, total_comments = scrape_new_avis(
+        restaurant_url, id_restaurant, known_avis_keys(db, id_restaurant), max_pages
+    )
+    print(f"Restaurant {id_restaurant} : {len(new_avis)} nouveaux avis ({nb_pages} pages lues)")
+    if not new_avis and total_comments is None:
+        return True, (id_restaurant, 0)
+
+    try:
+        db.begin()
+        nb_inserted = 0
+        if new_avis:
+            # Les identifiants sont attribués par la base ; les avis déjà présents
+            # (même clé naturelle) sont ignorés
+            rows = [(id_restaurant,) + tuple(avis.values())[1:] for avis in new_avis]
+            success, message = db.upsert("avis", rows, column_names=COLAVIS[1:])
+            if not success:
+                db.rollback()
+                return False, f"Erreur lors de l'insertion dans 'avis': {message}"
+            nb_inserted = len(message["inserted"])
+        if total_comments is None:
+            success, current = db.select(
+                "SELECT total_comments FROM restaurants WHERE id_restaurant = ?",
+                (id_restaurant,),
+            )
+            if not success:
+                db.rollback()
+                return False, f"Erreur lors de la lecture du restaurant : {current}"
+            total_comments = (current[0][0] or 0) + nb_inserted
+        db.update(
+            "restaurants",
+            {"total_comments": total_comments},
+            where=[f"id_restaurant = {int(id_restaurant)}"],
+        )
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        return False, f"Erreur lors de l'insertion des nouveaux avis : {e}"
+    return True, (id_restaurant, nb_inserted)
+
+
+###################################
+#### VERSION ASYNCHRONE (httpx) ####
+###################################
+
+
+async def fetch_async(http_client, url, conditional=True, **kwargs):
+    """Requête GET asynchrone soumise aux limites de débit de `rate_limiter`.
+
+    Le cache disque et les validateurs (ETag / Last-Modified) sont partagés avec la
+    session synchrone `client`, mode rejeu compris. Les réponses 429 et 5xx sont
+    retentées comme par `client` (voir ScrapingClient.backoff), chaque essai
+    reprenant une place dans `rate_limiter`.
+    """
+    full_url = client.full_url(url, kwargs.get("params"))
+    # Les accès au cache (disque) sont faits hors de la boucle d'événements
+    cached = await asyncio.to_thread(client.lookup, full_url, conditional)
+    if cached is not None:
+        return httpx.Response(
+            cached["status"],
+            headers=cached["headers"],
+            content=cached["content"],
+            request=httpx.Request("GET", full_url),
+        )
+
+    conditional_headers = (
+        await asyncio.to_thread(client.conditional_headers, full_url)
+        if conditional
+        else {}
+    )
+    kwargs["headers"] = {
+        **conditional_headers,
+        **kwargs.get("headers", {}),
+    }
+    for attempt in range(client.retries + 1):
+        async with rate_limiter.async_slot(url):
+            response = await http_client.get(url, **kwargs)
+        status = response.status_code
+        if status not in ScrapingClient.RETRY_STATUSES or attempt == client.retries:
+            break
+        client.record(full_url, len(response.content))
+        await asyncio.sleep(client.backoff(url, status, response.headers, attempt))
+    if response.status_code < 400:
+        rate_limiter.speed_up(url)
+
+    body = await asyncio.to_thread(
+        client.handle_response,
+        full_url,
+        response.status_code,
+        response.headers,
+        response.content,
+    )
+    if body is not None:
+        return httpx.Response(
+            200, headers=response.headers, content=body, request=response.request
+        )
+    return response
+
+
+async def scrape_restaurant_info_async(http_client, restaurant_url, max_fetches=3):
+    """Version asynchrone de fetch_restaurant_info.
+
+    Retourne les informations complètes (adresse et nombre d'avis) ou None.
+    """
+    # En mode rejeu, un re-téléchargement renverrait la même page
+    max_fetches = 1 if client.offline else max_fetches
+    for attempt in range(max_fetches):
+        if attempt:
+            await asyncio.sleep(retry_delay(attempt))
+        try:
+            response = await fetch_async(
+                http_client, restaurant_url, conditional=attempt == 0
+            )
+            if response.status_code != 200:
+                print(
+                    f"Erreur: code de statut {response.status_code} pour {restaurant_url}"
+                )
+                continue
+            # Le parsing (extracteurs de repli compris) est fait hors de la boucle d'événements
+            info = await asyncio.to_thread(
+                parse_restaurant_info, response.text, restaurant_url
+            )
+            if restaurant_info_complete(info):
+                return info
+            print(f"Tentative {attempt + 1}: localisation ou nombre d'avis introuvable")
+        except Exception as e:
+            print(f"Erreur lors du scraping de {restaurant_url} : {e}")
+    return None
+
+
+async def enrich_geographic_data_async(http_client, localisation):
+    """Version asynchrone de enrich_geographic_data, sans attribution d'identifiant.
+
+    Utilise le même cache géographique que la version synchrone.
+    """
+    cached = await asyncio.to_thread(geo_cache.get_coordinates, localisation)
+    if cached is not None:
+        lat, lon = cached
+    else:
+        response = await fetch_async(
+            http_client,
+            NOMINATIM_URL,
+            params=nominatim_params(localisation),
+            headers=NOMINATIM_HEADERS,
+        )
+        data = response.json() if response.status_code == 200 else None
+        if not data:
+            print(f"Impossible de récupérer les coordonnées pour {localisation}")
+            return None
+        lat, lon = float(data[0].get("lat")), float(data[0].get("lon"))
+        await asyncio.to_thread(geo_cache.store_coordinates, localisation, lat, lon)
+
+    # Une seule requête Overpass pour les tuiles manquantes, comptes calculés localement
+    restaurant_density, transport_count = 0, 0
+    missing = await asyncio.to_thread(geo_cache.missing_tiles, lat, lon, 500)
+    response = None
+    if missing:
+        response = await fetch_async(
+            http_client,
+            OVERPASS_URL,
+            params={"data": overpass_pois_query(geo_cache.tiles_bbox(missing))},
+        )
+        if response.status_code == 200:
+            await asyncio.to_thread(
+                geo_cache.store_tiles, missing, response.json()["elements"]
+            )
+        else:
+            print(f"Erreur lors de la requête Overpass : {response.status_code}")
+    if not missing or response.status_code == 200:
+        restaurant_density, transport_count = await asyncio.to_thread(
+            geo_cache.count_nearby, lat, lon, 500
+        )
+    return {
+        "id_localisation": None,
+        "id_restaurant": None,
+        "localisation": localisation,
+        "latitude": lat,
+        "longitude": lon,
+        "restaurant_density": restaurant_density,
+        "transport_count": transport_count,
+    }
+
+
+async def scrape_avis_async(http_client, restaurant_url, total_comments, max_pages=5):
+    """Version asynchrone de scrape_avis : toutes les pages sont demandées en parallèle."""
+    nb_pages = max_pages
+    if total_comments:
+        nb_pages = min(max_pages, ceil(total_comments / 15))
+    urls = [f"{restaurant_url}-or{page_num * 15}" for page_num in range(nb_pages)]
+
+    responses = await asyncio.gather(
+        *(fetch_async(http_client, url) for url in urls), return_exceptions=True
+    )
+    responses = [None if isinstance(r, Exception) else r for r in responses]
+    avis_list = await asyncio.to_thread(parse_avis_pages, urls, responses, None)
+    return [{"id_avis": None, **avis} for avis in avis_list]
+
+
+async def _process_one_async(http_client, url, db):
+    """Pipeline asynchrone pour un restaurant : retourne True s'il a été ajouté."""
+    if existing_restaurant(db, url) is not None:
+        return False
+
+    info = await scrape_restaurant_info_async(http_client, url)
+    if not info:
+        print("Impossible de scraper les informations principales. Arrêt du pipeline.")
+        return False
+
+    # La géolocalisation et les pages d'avis sont récupérées en parallèle
+    geo_data, avis_data = await asyncio.gather(
+        enrich_geographic_data_async(http_client, info["localisation"]),
+        scrape_avis_async(http_client, url, info["total_comments"]),
+    )
+    if not geo_data:
+        print("Impossible d'enrichir les données géographiques. Arrêt du pipeline.")
+        return False
+    if not avis_data:
+        print("Impossible de scraper les avis. Arrêt du pipeline.")
+        return False
+
+    restaurant_row = (
+        None,
+        info["nom"],
+        info["categorie"],
+        info["tags"],
+        info["price"],
+        info["note_globale"],
+        info["total_comments"],
+        info["url"],
+    )
+    # L'écriture est synchrone : les restaurants sont enregistrés l'un après l'autre
+    if store_restaurant(
+        db,
+        restaurant_row,
+        tuple(geo_data.values()),
+        [tuple(avis.values()) for avis in avis_data],
+    ):
+        db.commit()
+        return True
+    return False
+
+
+async def process_pipeline_async(urls, db):
+    """Pipeline asynchrone pour une ou plusieurs URLs de restaurants.
+
+    Les étapes indépendantes (géolocalisation, requêtes Overpass, pages d'avis) et
+    les différents restaurants sont traités en parallèle, avec des connexions
+    keep-alive partagées et les limites de débit de `rate_limiter`.
+    Retourne un dictionnaire URL -> True si le restaurant a été ajouté.
+    """
+    if isinstance(urls, str):
+        urls = [urls]
+
+    limits = httpx.Limits(
+        max_connections=rate_limiter.max_in_flight * 2,
+        max_keepalive_connections=rate_limiter.max_in_flight,
+    )
+    async with httpx.AsyncClient(
+        headers={**headers, "Accept-Encoding": ACCEPT_ENCODING},
+        limits=limits,
+        timeout=30,
+        follow_redirects=True,
+    ) as http_client:
+        results = await asyncio.gather(
+            *(_process_one_async(http_client, url, db) for url in urls),
+            return_exceptions=True,
+        )
+    return {url: result is True for url, result in zip(urls, results)}
 
 
 # # execution du pipeline
@@ -0,0 +1,449 @@
+import os
+import random
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from email.utils import parsedate_to_datetime
+
+import requests
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+
+try:
+    import brotli  # noqa: F401 - urllib3 et httpx décodent "br" s'il est installé
+
+    ACCEPT_ENCODING = "gzip, deflate, br"
+except ImportError:
+    try:
+        import brotlicffi  # noqa: F401
+
+        ACCEPT_ENCODING = "gzip, deflate, br"
+    except ImportError:
+        ACCEPT_ENCODING = "gzip, deflate"
+
+
+class CacheMiss(requests.exceptions.ConnectionError):
+    """Raised in replay mode when a requested URL is not in the response cache."""
+
+
+def retry_after_seconds(value):
+    """
+    Returns the delay (seconds) of a Retry-After header, given in seconds or as an
+    HTTP date, or None if it is missing or invalid.
+    """
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class ValidatorStore:
+    """
+    Bounded store of HTTP validators (ETag / Last-Modified) and of the matching bodies.
+
+    A page stored here can be revalidated with a conditional GET: the server answers
+    304 Not Modified and the body is served from the store instead of downloaded again.
+
+    Attributes:
+        max_entries (int): Maximum number of pages kept (least recently used evicted first).
+    """
+
+    def __init__(self, max_entries: int = 2048) -> None:
+        """
+        Initializes an empty store.
+
+        Args:
+            max_entries (int): Maximum number of pages kept.
+        """
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def conditional_headers(self, url: str) -> dict:
+        """
+        Returns the If-None-Match / If-Modified-Since headers known for `url`.
+        """
+        with self._lock:
+            entry = self._entries.get(url)
+            if entry is None:
+                return {}
+            self._entries.move_to_end(url)
+        etag, last_modified, _ = entry
+        conditional = {}
+        if etag:
+            conditional["If-None-Match"] = etag
+        if last_modified:
+            conditional["If-Modified-Since"] = last_modified
+        return conditional
+
+    def body(self, url: str):
+        """
+        Returns the stored body of `url`, or None.
+        """
+        with self._lock:
+            entry = self._entries.get(url)
+        return entry[2] if entry else None
+
+    def store(self, url: str, response_headers, content: bytes) -> None:
+        """
+        Stores the validators of a 200 response, if the server sent any.
+
+        Args:
+            url (str): The full URL (query string included).
+            response_headers: The response headers (case-insensitive mapping).
+            content (bytes): The decoded body.
+        """
+        etag = response_headers.get("ETag")
+        last_modified = response_headers.get("Last-Modified")
+        if not etag and not last_modified:
+            return
+        with self._lock:
+            self._entries[url] = (etag, last_modified, content)
+            self._entries.move_to_end(url)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+class ScrapingClient:
+    """
+    HTTP client shared by every scraping request of the process.
+
+    It keeps one pooled `requests.Session` (keep-alive connections, gzip/brotli),
+    retries 429 and 5xx responses with exponential backoff (honouring Retry-After),
+    revalidates known pages with conditional GETs and routes every request through
+    the process' `HostRateLimiter`. Each retry takes a new slot of the limiter, and
+    429/503 answers slow the host down (see `backoff`).
+
+    With a `ResponseCache`, fresh cached responses are served without any request,
+    and in replay (offline) mode every response comes from the cache.
+
+    Attributes:
+        rate_limiter (HostRateLimiter): Politeness rules applied to each request.
+        timeout (float): Default timeout of a request, in seconds.
+        retries (int): Maximum number of retries per request.
+        backoff_factor (float): Base of the exponential backoff between retries.
+        backoff_max (float): Maximum delay between two attempts, in seconds.
+        validators (ValidatorStore): ETag / Last-Modified store for conditional GETs.
+        cache (ResponseCache): On-disk response cache, None to disable it.
+        session (requests.Session): The pooled session.
+        nb_requests (int): Number of requests sent.
+        nb_not_modified (int): Number of 304 answers served from `validators`.
+        nb_cache_hits (int): Number of responses served from `cache` without a request.
+        bytes_downloaded (int): Size of the bodies received from the network.
+        url_stats (dict): Full URLs mapped to their attempts, bytes and 304 counts.
+    """
+
+    RETRY_STATUSES = (429, 500, 502, 503, 504)
+    # Réponses après lesquelles l'hôte est ralenti dans le limiteur
+    SLOW_DOWN_STATUSES = (429, 503)
+
+    def __init__(
+        self,
+        rate_limiter,
+        headers: dict = None,
+        timeout: float = 30,
+        retries: int = 3,
+        backoff_factor: float = 2.0,
+        pool_maxsize: int = None,
+        cache=None,
+    ) -> None:
+        """
+        Initializes the session.
+
+        Args:
+            rate_limiter (HostRateLimiter): Politeness rules applied to each request.
+            headers (dict, optional): Default headers of the session.
+            timeout (float): Default timeout of a request, in seconds.
+            retries (int): Maximum number of retries per request.
+            backoff_factor (float): Base of the exponential backoff between retries.
+            pool_maxsize (int, optional): Connections kept per host. Defaults to
+                `rate_limiter.max_in_flight`.
+            cache (ResponseCache, optional): On-disk response cache.
+        """
+        self.rate_limiter = rate_limiter
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff_factor = backoff_factor
+        self.backoff_max = 60
+        self.validators = ValidatorStore()
+        self.cache = cache
+        self._offline = None
+        self.nb_requests = 0
+        self.nb_not_modified = 0
+        self.nb_cache_hits = 0
+        self.bytes_downloaded = 0
+        self.url_stats = {}
+        self._lock = threading.Lock()
+
+        # Pas de retries dans l'adaptateur : ils sont faits par `get`, chacun sous
+        # les limites de `rate_limiter` (seau de l'hôte, budget, requêtes simultanées)
+        pool_maxsize = pool_maxsize or rate_limiter.max_in_flight
+        adapter = HTTPAdapter(pool_connections=8, pool_maxsize=pool_maxsize, max_retries=0)
+        self.session = requests.Session()
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.session.headers.update(headers or {})
+        self.session.headers["Accept-Encoding"] = ACCEPT_ENCODING
+
+    @property
+    def offline(self) -> bool:
+        """
+        Whether the client replays the cache instead of using the network.
+
+        Set by `replay()`, or else by the SCRAPING_OFFLINE environment variable.
+        """
+        if self._offline is not None:
+            return self._offline
+        return os.getenv("SCRAPING_OFFLINE", "") not in ("", "0")
+
+    @contextmanager
+    def replay(self):
+        """
+        Context manager running every request from the cache, without network access.
+
+        Raises:
+            ValueError: If the client has no cache.
+        """
+        if self.cache is None:
+            raise ValueError("Le mode rejeu nécessite un cache de réponses")
+        previous, self._offline = self._offline, True
+        try:
+            yield self
+        finally:
+            self._offline = previous
+
+    @staticmethod
+    def full_url(url: str, params: dict = None) -> str:
+        """
+        Returns the URL with its encoded query string, used as key by the stores.
+        """
+        return requests.Request("GET", url, params=params).prepare().url
+
+    def lookup(self, full_url: str, conditional: bool = True, max_age: float = None):
+        """
+        Returns the cached response to serve for `full_url` without any request.
+
+        Args:
+            full_url (str): The full URL (query string included).
+            conditional (bool): False when the caller forces a fresh download.
+            max_age (float, optional): Maximum age (seconds) of a cached response
+                served without revalidation. Defaults to the cache TTL.
+
+        Returns:
+            dict: The cache entry (see `ResponseCache.get`), or None if the request
+            must be sent.
+
+        Raises:
+            CacheMiss: In replay mode, if the URL is not cached.
+        """
+        cached = self.cache.get(full_url) if self.cache is not None else None
+        if cached is not None and max_age is not None:
+            cached["fresh"] = time.time() - cached["fetched_at"] < max_age
+        if cached is not None and (self.offline or (conditional and cached["fresh"])):
+            with self._lock:
+                self.nb_cache_hits += 1
+            return cached
+        if self.offline:
+            raise CacheMiss(f"{full_url} absent du cache (mode rejeu)")
+        return None
+
+    def conditional_headers(self, full_url: str) -> dict:
+        """
+        Returns the If-None-Match / If-Modified-Since headers known for `full_url`,
+        from `validators` or else from a stale cache entry.
+        """
+        conditional = self.validators.conditional_headers(full_url)
+        if not conditional and self.cache is not None:
+            cached = self.cache.get(full_url)
+            if cached is not None:
+                if cached["headers"].get("ETag"):
+                    conditional["If-None-Match"] = cached["headers"]["ETag"]
+                if cached["headers"].get("Last-Modified"):
+                    conditional["If-Modified-Since"] = cached["headers"]["Last-Modified"]
+        return conditional
+
+    def handle_response(self, full_url: str, status: int, headers, content: bytes):
+        """
+        Accounts for a network response and updates the validators and the cache.
+
+        Args:
+            full_url (str): The full URL (query string included).
+            status (int): The HTTP status.
+            headers: The response headers (case-insensitive mapping).
+            content (bytes): The decoded body.
+
+        Returns:
+            bytes: The known body if the server answered 304 Not Modified, else None.
+        """
+        body = None
+        if status == 304:
+            body = self.validators.body(full_url)
+            if body is None and self.cache is not None:
+                cached = self.cache.get(full_url)
+                body = cached["content"] if cached is not None else None
+            if body is not None and self.cache is not None:
+                self.cache.touch(full_url)
+        elif status == 200:
+            self.validators.store(full_url, headers, content)
+            if self.cache is not None:
+                self.cache.put(full_url, status, headers, content)
+        self.record(full_url, len(content), body is not None)
+        return body
+
+    def get(
+        self,
+        url: str,
+        params: dict = None,
+        conditional: bool = True,
+        max_age: float = None,
+        **kwargs,
+    ) -> requests.Response:
+        """
+        Sends a rate-limited, conditional GET request, or serves it from the cache.
+
+        Args:
+            url (str): The URL to fetch.
+            params (dict, optional): The query string parameters.
+            conditional (bool): Whether to use the cache and revalidate a known page
+                instead of downloading it again. Disable it to force a fresh download.
+            max_age (float, optional): Maximum age (seconds) of a cached response served
+                without revalidation, e.g. 0 to always revalidate. Defaults to the cache TTL.
+            **kwargs: Passed to `requests.Session.get` (headers, timeout...).
+
+        Returns:
+            requests.Response: The response. A 304 answer to a conditional request is
+            returned as a 200 whose body is the known one, with the `not_modified`
+            attribute set to True; `from_cache` is True when no request was sent.
+
+        Raises:
+            BudgetExceeded: If the request budget of the rate limiter is exhausted.
+            CacheMiss: In replay mode, if the URL is not cached.
+            requests.exceptions.RequestException: On network errors.
+        """
+        full_url = self.full_url(url, params)
+        cached = self.lookup(full_url, conditional, max_age)
+        if cached is not None:
+            return self._cached_response(full_url, cached)
+
+        request_headers = {
+            **(self.conditional_headers(full_url) if conditional else {}),
+            **kwargs.pop("headers", {}),
+        }
+        kwargs.setdefault("timeout", self.timeout)
+
+        for attempt in range(self.retries + 1):
+            with self.rate_limiter.slot(url):
+                response = self.session.get(
+                    url, params=params, headers=request_headers, **kwargs
+                )
+            if response.status_code not in self.RETRY_STATUSES or attempt == self.retries:
+                break
+            # La dernière réponse en erreur est retournée à l'appelant, qui teste le statut
+            self.record(full_url, len(response.content))
+            time.sleep(self.backoff(url, response.status_code, response.headers, attempt))
+        if response.status_code < 400:
+            self.rate_limiter.speed_up(url)
+
+        response.from_cache = False
+        response.not_modified = False
+        body = self.handle_response(
+            full_url, response.status_code, response.headers, response.content
+        )
+        if body is not None:
+            # Page inchangée : le corps connu est servi comme une réponse 200
+            response.status_code = 200
+            response._content = body
+            response.not_modified = True
+        return response
+
+    def backoff(self, url: str, status: int, response_headers, attempt: int) -> float:
+        """
+        Prepares the retry of a 429/5xx answer and returns how long to wait before it.
+
+        Args:
+            url (str): The requested URL.
+            status (int): The HTTP status of the answer.
+            response_headers: The headers of the answer (case-insensitive mapping).
+            attempt (int): Number of the failed attempt, starting at 0.
+
+        Returns:
+            float: The delay (seconds) the caller must wait. After a 429 or 503, the
+            host is slowed down in `rate_limiter`, which holds all its requests
+            during the delay: 0 is returned and the retry waits for its slot.
+
+        Notes:
+            The delay is the Retry-After of the answer, or else an exponential
+            backoff (`backoff_factor` * 2 ** attempt, at most `backoff_max`, with jitter).
+        """
+        delay = retry_after_seconds(response_headers.get("Retry-After"))
+        if delay is None:
+            delay = min(self.backoff_max, self.backoff_factor * 2**attempt)
+            delay += random.uniform(0, delay / 2)
+        print(f"Réponse {status} pour {url}, nouvel essai dans {delay:.1f}s")
+        if status in self.SLOW_DOWN_STATUSES:
+            self.rate_limiter.slow_down(url, delay)
+            return 0.0
+        return delay
+
+    @staticmethod
+    def _cached_response(full_url: str, cached: dict) -> requests.Response:
+        response = requests.Response()
+        response.status_code = cached["status"]
+        response.headers = CaseInsensitiveDict(cached["headers"])
+        response.encoding = get_encoding_from_headers(response.headers) or "utf-8"
+        response.url = full_url
+        response._content = cached["content"]
+        response.from_cache = True
+        response.not_modified = False
+        return response
+
+    def record(self, url: str, nb_bytes: int, not_modified: bool = False) -> None:
+        """
+        Accounts for one request to `url` in the global and per-URL counters.
+
+        Args:
+            url (str): The full URL (query string included).
+            nb_bytes (int): Size of the body received from the network.
+            not_modified (bool): Whether the server answered 304 Not Modified.
+        """
+        with self._lock:
+            self.nb_requests += 1
+            self.bytes_downloaded += nb_bytes
+            self.nb_not_modified += not_modified
+            stats = self.url_stats.setdefault(
+                url, {"attempts": 0, "bytes": 0, "not_modified": 0}
+            )
+            stats["attempts"] += 1
+            stats["bytes"] += nb_bytes
+            stats["not_modified"] += not_modified
+
+    def stats(self) -> dict:
+        """
+        Returns the counters of the client.
+
+        Returns:
+            dict: nb_requests, nb_not_modified, nb_cache_hits and bytes_downloaded.
+        """
+        with self._lock:
+            return {
+                "nb_requests": self.nb_requests,
+                "nb_not_modified": self.nb_not_modified,
+                "nb_cache_hits": self.nb_cache_hits,
+                "bytes_downloaded": self.bytes_downloaded,
+            }
+
+    def close(self) -> None:
+        """
+        Closes the pooled connections and the cache.
+        """
+        self.session.close()
+        if self.cache is not None:
+            self.cache.close()
@@ -1,26 +1,277 @@
-from transformers import pipeline
+from transformers import AutoTokenizer, pipeline
 from sqlutils import sqlutils
 from pathlib import Path
+import os
 import pandas as pd
-import multiprocessing
-from concurrent.futures import ThreadPoolExecutor
+import threading
+import time
+import torch
 
 
+MODEL_NAME = "nlptown/bert-base-multilingual-uncased-sentiment"
 
-def get_label(review, classifier):
-    # Appliquer le classifier sur les 1500 premiers caractères de l'avis
-    res = classifier(review[:1500])
-    # Retourner le label et le score
-    return res[0]["label"]
+# Dossier où sont mis en cache les modèles exportés en ONNX
+ONNX_CACHE_DIR = Path(__file__).parent / "data" / "models"
 
 
-def generate_label(id_restaurant):
+def load_onnx_model(model_name: str = MODEL_NAME, cache_dir: Path = ONNX_CACHE_DIR):
+    """
+    Returns the model exported to ONNX with dynamic int8 quantization, and its tokenizer.
+
+    Args:
+        model_name (str): The Hugging Face model to export.
+        cache_dir (Path): Folder where the exported model is kept between runs.
+
+    Returns:
+        tuple: (ORTModelForSequenceClassification, tokenizer).
+
+    Raises:
+        ImportError: If optimum and onnxruntime are not installed.
+
+    Notes:
+        The export and quantization only run the first time; afterwards the
+        quantized file is loaded directly from `cache_dir`.
+    """
+    try:
+        from optimum.onnxruntime import ORTModelForSequenceClassification, ORTQuantizer
+        from optimum.onnxruntime.configuration import AutoQuantizationConfig
+    except ImportError as e:
+        raise ImportError(
+            "Le backend 'onnx' nécessite optimum et onnxruntime : "
+            "pip install optimum[onnxruntime]"
+        ) from e
+
+    model_dir = cache_dir / f"{model_name.replace('/', '--')}-onnx-int8"
+    model_file = "model_quantized.onnx"
+
+    if not (model_dir / model_file).exists():
+        print(f"Export ONNX et quantification de {model_name} vers {model_dir}...")
+        export_dir = model_dir / "fp32"
+        ort_model = ORTModelForSequenceClassification.from_pretrained(
+            model_name, export=True
+        )
+        ort_model.save_pretrained(export_dir)
+        # Quantification dynamique int8 des poids (activations quantifiées à la volée)
+        quantizer = ORTQuantizer.from_pretrained(export_dir)
+        quantizer.quantize(
+            save_dir=model_dir,
+            quantization_config=AutoQuantizationConfig.avx2(
+                is_static=False, per_channel=False
+            ),
+        )
+        AutoTokenizer.from_pretrained(model_name).save_pretrained(model_dir)
+
+    model = ORTModelForSequenceClassification.from_pretrained(
+        model_dir, file_name=model_file
+    )
+    tokenizer = AutoTokenizer.from_pretrained(model_dir)
+    return model, tokenizer
+
+
+class SentimentEngine:
+    """
+    Process-wide sentiment classifier, loaded once and kept in memory.
+
+    Use `SentimentEngine.get()` rather than the constructor: the first call loads
+    the tokenizer and BERT weights, the following ones (Ajout tab, batch scripts)
+    reuse the same instance.
+
+    Attributes:
+        model_name (str): The Hugging Face model used for classification.
+        backend (str): "torch" or "onnx".
+        classifier (Pipeline): The transformers sentiment-analysis pipeline.
+        batch_size (int): Number of reviews sent to the model at once.
+        max_length (int): Maximum number of tokens kept from each review.
+        load_time (float): Seconds spent loading the model.
+        memory_footprint (int): Size of the model weights in bytes.
+    """
+
+    _instance = None
+    _lock = threading.Lock()
+
+    def __init__(
+        self,
+        model_name: str = MODEL_NAME,
+        backend: str = None,
+        batch_size: int = 32,
+        num_threads: int = None,
+    ) -> None:
+        """
+        Loads the model. Prefer `SentimentEngine.get()`.
+
+        Args:
+            model_name (str): The Hugging Face model used for classification.
+            backend (str, optional): "torch" or "onnx". Defaults to the
+                SENTIMENT_BACKEND environment variable ("torch" if unset).
+            batch_size (int): Number of reviews sent to the model at once.
+            num_threads (int, optional): Number of torch intra-op threads.
+                Defaults to the torch setting (one per physical core).
+        """
+        if num_threads:
+            torch.set_num_threads(num_threads)
+        start = time.perf_counter()
+        self.model_name = model_name
+        # Backends disponibles : "torch" (pipeline transformers) ou "onnx" (ONNX
+        # Runtime, quantifié en int8, nécessite `pip install optimum[onnxruntime]`)
+        self.backend = backend or os.getenv("SENTIMENT_BACKEND", "torch")
+        if self.backend == "onnx":
+            model, tokenizer = load_onnx_model(model_name)
+            self.classifier = pipeline(
+                "sentiment-analysis", model=model, tokenizer=tokenizer
+            )
+            self.memory_footprint = sum(
+                f.stat().st_size for f in Path(model.model_save_dir).glob("*.onnx")
+            )
+        elif self.backend == "torch":
+            self.classifier = pipeline(
+                "sentiment-analysis", model=model_name, tokenizer=model_name
+            )
+            self.memory_footprint = sum(
+                p.numel() * p.element_size()
+                for p in self.classifier.model.parameters()
+            )
+        else:
+            raise ValueError(f"Backend inconnu : {self.backend} (torch ou onnx)")
+        self.batch_size = batch_size
+        self.max_length = min(512, self.classifier.tokenizer.model_max_length)
+        self.load_time = time.perf_counter() - start
+        self.nb_reviews = 0
+
+    @classmethod
+    def get(cls, **kwargs) -> "SentimentEngine":
+        """
+        Returns the shared engine, loading the model on the first call.
+
+        Args:
+            **kwargs: Constructor arguments, only used when the model is loaded.
+
+        Returns:
+            SentimentEngine: The engine of the current process.
+        """
+        if cls._instance is None:
+            with cls._lock:
+                if cls._instance is None:
+                    cls._instance = cls(**kwargs)
+                    print(f"Modèle de sentiment chargé : {cls._instance.stats()}")
+        return cls._instance
+
+    @classmethod
+    def preload(cls) -> None:
+        """
+        Loads the model in a background thread, so that it is warm when needed.
+        """
+        if cls._instance is None:
+            threading.Thread(target=cls.get, daemon=True).start()
+
+    def predict(self, reviews: list, batch_size: int = None) -> list:
+        """
+        Returns the label ("1 star" ... "5 stars") of each review.
+
+        Args:
+            reviews (list): The review texts.
+            batch_size (int, optional): Overrides `self.batch_size` for this call.
+
+        Returns:
+            list: One label per review, in the same order.
+
+        Notes:
+            Reviews are sorted by length and grouped in mini-batches, each one padded
+            only to its longest review. Reviews longer than `max_length` tokens are
+            truncated by the tokenizer.
+        """
+        batch_size = batch_size or self.batch_size
+        tokenizer = self.classifier.tokenizer
+        model = self.classifier.model
+        texts = [str(review) if review is not None else "" for review in reviews]
+
+        # Trier par longueur limite le padding au sein de chaque lot
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+        labels = [None] * len(texts)
+
+        with torch.inference_mode():
+            for start in range(0, len(order), batch_size):
+                batch = order[start : start + batch_size]
+                inputs = tokenizer(
+                    [texts[i] for i in batch],
+                    padding=True,
+                    truncation=True,
+                    max_length=self.max_length,
+                    return_tensors="pt",
+                ).to(model.device)
+                predictions = model(**inputs).logits.argmax(dim=-1).tolist()
+                for i, prediction in zip(batch, predictions):
+                    labels[i] = model.config.id2label[prediction]
+
+        self.nb_reviews += len(labels)
+        return labels
+
+    def stats(self) -> dict:
+        """
+        Returns the load time and memory footprint of the model.
+        """
+        return {
+            "model": self.model_name,
+            "backend": self.backend,
+            "load_time_s": round(self.load_time, 2),
+            "memory_mb": round(self.memory_footprint / 1024**2, 1),
+            "nb_reviews": self.nb_reviews,
+        }
+
+
+def check_backend_agreement(backend="onnx", sample_size=200, db_path=None):
+    """
+    Compares the labels of a backend with the reference torch model on a sample of reviews.
+
+    Args:
+        backend (str): The backend to check against the torch pipeline.
+        sample_size (int): Number of reviews drawn at random from `avis`.
+        db_path (Path, optional): Database path, defaults to data/friands.db.
+
+    Returns:
+        dict: The agreement rate, the mean absolute gap in stars and the throughput
+        (reviews per second) of both backends.
+    """
+    bdd = sqlutils(db_path or Path("data/friands.db"), pooled=True)
+    success, t_avis = bdd.select(
+        "SELECT contenu_avis FROM avis ORDER BY RANDOM() LIMIT ?", (sample_size,)
+    )
+    if not success:
+        raise RuntimeError(f"Erreur lors de l'extraction des avis : {t_avis}")
+    reviews = [r[0] for r in t_avis]
+
+    results = {}
+    for name in ("torch", backend):
+        # Le moteur partagé est réutilisé s'il utilise déjà ce backend
+        shared = SentimentEngine._instance
+        engine = shared if shared and shared.backend == name else SentimentEngine(backend=name)
+        start = time.perf_counter()
+        labels = engine.predict(reviews)
+        duration = time.perf_counter() - start
+        results[name] = {
+            "stars": [int(label.split()[0]) for label in labels],
+            "reviews_per_s": round(len(reviews) / max(duration, 1e-9), 1),
+            "memory_mb": engine.stats()["memory_mb"],
+        }
+
+    reference, candidate = results["torch"]["stars"], results[backend]["stars"]
+    pairs = list(zip(reference, candidate))
+    return {
+        "sample_size": len(pairs),
+        "agreement": round(sum(a == b for a, b in pairs) / max(len(pairs), 1), 3),
+        "mean_abs_gap": round(sum(abs(a - b) for a, b in pairs) / max(len(pairs), 1), 3),
+        "torch": {k: v for k, v in results["torch"].items() if k != "stars"},
+        backend: {k: v for k, v in results[backend].items() if k != "stars"},
+    }
+
+
+def generate_label(id_restaurant, db_path=Path("data/friands.db")):
     # Récupération des avis depuis la base de données
-    db_path = Path("data/friands.db")
-    bdd = sqlutils(db_path)
+    bdd = sqlutils(db_path, pooled=True)
 
-    query = f"SELECT id_avis, contenu_avis FROM avis WHERE id_restaurant = {id_restaurant} AND label IS NULL"
-    success, t_avis = bdd.select(query)
+    success, t_avis = bdd.select(
+        "SELECT id_avis, contenu_avis FROM avis WHERE id_restaurant = ? AND label IS NULL",
+        (id_restaurant,),
+    )
 
     if not success:
         return (
@@ -34,46 +285,30 @@ def generate_label(id_restaurant):
             # Insertion des avis dans un dataframe pour plus de souplesse
             df = pd.DataFrame(t_avis, columns=["id_avis", "contenu_avis"])
 
-    # Création du classifier
-    classifier = pipeline(
-        "sentiment-analysis",
-        model="nlptown/bert-base-multilingual-uncased-sentiment",
-        tokenizer="nlptown/bert-base-multilingual-uncased-sentiment",
-    )
-
-    ## Avec multi-threading
-    n_jobs = multiprocessing.cpu_count()
-    # start_time = time.time()
-    with ThreadPoolExecutor(max_workers=n_jobs) as executor:
-        # Utiliser threadpoolexecutor pour faire appel à la fonction get_label et remplir df["label"]
-        results = list(
-            executor.map(
-                get_label, df["contenu_avis"], [classifier] * len(df["contenu_avis"])
-            )
-        )
+    # Classifier partagé par tout le processus, chargé une seule fois
+    engine = SentimentEngine.get()
+    results = engine.predict(df["contenu_avis"].tolist())
 
     df["label"] = results
 
-    # Insérer les labels calculés dans la base de données avec update
-    reussi = 0
-
-    for index, row in df.iterrows():
-        success, t_insert = bdd.update(
-            table_name="avis",
-            data={"label": row["label"].split()[0]},
-            where=[f"id_avis = '{row['id_avis']}'"],
-        )
+    # Insérer les labels calculés dans la base de données, en une seule requête
+    # préparée et une seule transaction
+    success, t_insert = bdd.update_many(
+        table_name="avis",
+        key_column="id_avis",
+        rows=[
+            (int(label.split()[0]), int(id_avis))
+            for label, id_avis in zip(df["label"], df["id_avis"])
+        ],
+        columns=["label"],
+    )
 
-        if success:
-            reussi += 1
-        else:
-            break
-    if reussi != len(df):
+    if not success:
         bdd.rollback()
         return (
             False,
-            f"Erreur lors de la mise à jour du label {row['id_avis']} : {t_insert}. Toutes les modifications ont été annulées.",
+            f"Erreur lors de la mise à jour des labels : {t_insert}. Toutes les modifications ont été annulées.",
         )
     else:
         bdd.commit()
-        return True, f"{reussi} avis mis à jour avec succès."
+        return True, f"{len(df)} avis mis à jour avec succès."
@@ -1,65 +1,582 @@
+import atexit
+import re
 import sqlite3
+import threading
+import time
+import weakref
+from contextlib import contextmanager
 from pathlib import Path
 import csv
 
 
+# Profil de performance appliqué à chaque ouverture de connexion
+# - WAL : les lecteurs ne sont plus bloqués par les insertions du scraping
+# - synchronous NORMAL : sûr en WAL, évite un fsync par commit
+# - cache_size négatif = taille en Kio (64 Mo), mmap_size en octets (256 Mo)
+PRAGMA_PROFILE = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "cache_size": -64000,
+    "mmap_size": 268435456,
+    "temp_store": "MEMORY",
+    "busy_timeout": 30000,
+}
+
+# Réglages temporaires pendant un chargement en masse (load_from_csv)
+# synchronous OFF : pas de fsync pendant le chargement, la transaction unique
+# est de toute façon annulée en cas d'erreur
+LOAD_PRAGMAS = {
+    "synchronous": "OFF",
+    "cache_size": -262144,
+}
+
+
+def connect(filepath: Path, pragmas: dict = None, **kwargs) -> sqlite3.Connection:
+    """
+    Open a sqlite connection and apply a PRAGMA profile to it.
+
+    Args:
+        filepath (Path): Path to the sqlite database file.
+        pragmas (dict, optional): PRAGMA names mapped to their values.
+            Defaults to `PRAGMA_PROFILE`; pass an empty dict to keep sqlite defaults.
+        **kwargs: Extra arguments passed to `sqlite3.connect`.
+
+    Returns:
+        sqlite3.Connection: The configured connection.
+    """
+    conn = sqlite3.connect(filepath, **kwargs)
+    for name, value in (PRAGMA_PROFILE if pragmas is None else pragmas).items():
+        conn.execute(f"PRAGMA {name} = {value}")
+    return conn
+
+
+class ConnectionPool:
+    """
+    Process-wide pool of sqlite connections for one database file.
+
+    Each thread gets its own read connection (opened lazily and reused across
+    calls), while all writes go through a single shared connection guarded by
+    a lock, so that concurrent writers are serialized in Python instead of
+    failing with "database is locked". The writer is held by one `sqlutils`
+    instance at a time: two instances never share a transaction, even in the
+    same thread.
+
+    Attributes:
+        filepath (Path): Path to the sqlite database file.
+        timeout (float): Seconds to wait for the writer before giving up.
+        pragmas (dict): PRAGMA profile applied to every connection of the pool.
+    """
+
+    _pools = {}
+    _pools_lock = threading.Lock()
+
+    def __init__(self, filepath: Path, timeout: float = 30.0, pragmas: dict = None):
+        """
+        Initialize a new pool. Use `ConnectionPool.get()` to share pools.
+
+        Args:
+            filepath (Path): Path to the sqlite database file.
+            timeout (float): Seconds to wait for the writer before giving up.
+            pragmas (dict, optional): PRAGMA profile, defaults to `PRAGMA_PROFILE`.
+        """
+        self.filepath = filepath
+        self.timeout = timeout
+        self.pragmas = PRAGMA_PROFILE if pragmas is None else pragmas
+        self._readers = {}
+        self._readers_lock = threading.Lock()
+        self._writer = None
+        self._writer_cond = threading.Condition()
+        self._writer_owner = None
+        self._writer_depth = 0
+
+    @classmethod
+    def get(cls, filepath: Path, pragmas: dict = None) -> "ConnectionPool":
+        """
+        Return the pool shared by the whole process for a database file.
+
+        Args:
+            filepath (Path): Path to the sqlite database file.
+            pragmas (dict, optional): PRAGMA profile used if the pool is created
+                by this call. Ignored if the pool already exists.
+
+        Returns:
+            ConnectionPool: The pool associated with the resolved path.
+        """
+        key = str(Path(filepath).resolve())
+        with cls._pools_lock:
+            if key not in cls._pools:
+                cls._pools[key] = cls(Path(filepath), pragmas=pragmas)
+            return cls._pools[key]
+
+    @classmethod
+    def close_all(cls) -> None:
+        """
+        Close every pool of the process.
+        """
+        with cls._pools_lock:
+            pools = list(cls._pools.values())
+            cls._pools.clear()
+        for pool in pools:
+            pool.close()
+
+    def _connect(self) -> sqlite3.Connection:
+        # Les connexions peuvent être fermées depuis un autre thread (nettoyage)
+        return connect(
+            self.filepath,
+            self.pragmas,
+            timeout=self.timeout,
+            check_same_thread=False,
+        )
+
+    def reader(self) -> sqlite3.Connection:
+        """
+        Return the read connection of the calling thread, opening it if needed.
+
+        Returns:
+            sqlite3.Connection: A connection restricted to queries.
+        """
+        thread = threading.current_thread()
+        with self._readers_lock:
+            entry = self._readers.get(thread.ident)
+            if entry is not None and entry[0]() is thread:
+                return entry[1]
+
+            # Fermer les connexions des threads terminés (ex: reruns streamlit)
+            for ident, (ref, conn) in list(self._readers.items()):
+                owner = ref()
+                if owner is None or not owner.is_alive() or ident == thread.ident:
+                    conn.close()
+                    del self._readers[ident]
+
+            conn = self._connect()
+            conn.execute("PRAGMA query_only = ON")
+            self._readers[thread.ident] = (weakref.ref(thread), conn)
+            return conn
+
+    def acquire_writer(self, owner=None) -> sqlite3.Connection:
+        """
+        Acquire the shared write connection.
+
+        The writer belongs to one `owner` (e.g. a `sqlutils` instance) of one thread,
+        so that two instances never share a transaction. The same owner may acquire
+        it several times; each acquisition must be matched by a call to
+        `release_writer()`.
+
+        Args:
+            owner (object, optional): The object holding the transaction.
+
+        Returns:
+            sqlite3.Connection: The write connection.
+
+        Raises:
+            sqlite3.OperationalError: If the writer is still busy after `timeout` seconds,
+                or at once if another owner of the calling thread holds it (waiting
+                for it would never end).
+        """
+        me = (threading.get_ident(), id(owner))
+        with self._writer_cond:
+            owner_thread = self._writer_owner and self._writer_owner[0]
+            if owner_thread == me[0] and self._writer_owner != me:
+                raise sqlite3.OperationalError(
+                    "database is locked (writer held by another instance of this thread)"
+                )
+            if self._writer_owner != me:
+                if not self._writer_cond.wait_for(
+                    lambda: self._writer_owner is None, self.timeout
+                ):
+                    raise sqlite3.OperationalError(
+                        f"database is locked (writer busy for {self.timeout}s)"
+                    )
+                self._writer_owner = me
+            self._writer_depth += 1
+            if self._writer is None:
+                self._writer = self._connect()
+            return self._writer
+
+    def release_writer(self, owner=None) -> None:
+        """
+        Release one acquisition of the shared write connection by `owner`
+        (possibly from another thread, e.g. when it is garbage collected).
+        """
+        with self._writer_cond:
+            if self._writer_depth == 0 or self._writer_owner[1] != id(owner):
+                return
+            self._writer_depth -= 1
+            if self._writer_depth == 0:
+                self._writer_owner = None
+                self._writer_cond.notify()
+
+    def close(self) -> None:
+        """
+        Commit pending writes and close every connection of the pool.
+        """
+        with self._readers_lock:
+            for _, conn in self._readers.values():
+                conn.close()
+            self._readers.clear()
+        with self._writer_cond:
+            if self._writer is not None:
+                self._writer.commit()
+                self._writer.close()
+                self._writer = None
+
+
+atexit.register(ConnectionPool.close_all)
+
+
 class sqlutils:
-    def __init__(self, filepath: Path):
+    def __init__(self, filepath: Path, pooled: bool = False, pragmas: dict = None):
         # Vérifier que le fichier db existe
         """
         Initialize a new sqlite database connection.
 
         Args:
             filepath (Path): Path to the sqlite database file.
+            pooled (bool): If True, lease connections from the process-wide
+                `ConnectionPool` instead of opening a private connection.
+            pragmas (dict, optional): PRAGMA profile applied when the connection
+                opens. Defaults to `PRAGMA_PROFILE` (WAL, synchronous=NORMAL...).
 
         Notes:
             If the file does not exist, it will be created.
+            A pooled instance reads through the read connection of the current
+            thread and takes the shared writer on its first write; the writer
+            is held until `commit()`, `rollback()` or `close()`.
         """
         if not filepath.exists():
             # Si le fichier n'existe pas, on crée le dossier parent et le fichier
             filepath.parent.mkdir(parents=True, exist_ok=True)
             filepath.touch()
 
-        # initialiser la connexion à la base de données
-        self.db = sqlite3.connect(filepath)
-        self.cursor = self.db.cursor()
+        self.pool = ConnectionPool.get(filepath, pragmas) if pooled else None
+        self._writing = False
+        self._closed = False
+
+        if self.pool is None:
+            # initialiser la connexion à la base de données
+            self._db = connect(filepath, pragmas)
+
+    @property
+    def db(self) -> sqlite3.Connection:
+        """
+        The connection currently used by this instance.
+        """
+        return self._conn()
+
+    def _conn(self, write: bool = False) -> sqlite3.Connection:
+        """
+        Return the connection to use for the next statement.
+
+        Args:
+            write (bool): True if the statement modifies the database.
+
+        Returns:
+            sqlite3.Connection: The private connection, the shared writer when
+            a write transaction is open (so that reads see pending writes), or
+            the read connection of the current thread.
+        """
+        if self.pool is None:
+            return self._db
+        if write and not self._writing:
+            self.pool.acquire_writer(self)
+            self._writing = True
+        if self._writing:
+            return self.pool._writer
+        return self.pool.reader()
+
+    def _end_transaction(self, commit: bool) -> None:
+        """
+        Commit or rollback the current transaction and release the writer.
+        """
+        if self.pool is None:
+            if commit:
+                self._db.commit()
+            else:
+                self._db.rollback()
+            return
+        if not self._writing:
+            return
+        try:
+            # Le pool a pu être fermé entre-temps (arrêt du processus)
+            writer = self.pool._writer
+            if writer is not None and commit:
+                writer.commit()
+            elif writer is not None:
+                writer.rollback()
+        finally:
+            self._writing = False
+            self.pool.release_writer(self)
 
-    def create_table(self, table_name: str, schema: dict) -> tuple:
+    def create_table(self, table_name: str, schema: dict, indexes: dict = None) -> tuple:
         """
         Create a new table in the database.
 
         Args:
             table_name (str): The name of the table to create.
             schema (dict): A dictionary mapping column names to their data type.
+            indexes (dict, optional): Secondary indexes of the table (see `create_indexes`).
 
         Returns:
             str: A message indicating whether the table was created successfully or already existed.
 
         Notes:
             If the table already exists, this method will return a message indicating that the table already exists.
+            Columns of `schema` missing from an existing table are added (ALTER TABLE ... ADD COLUMN).
+            The indexes are created (or migrated) in both cases.
         """
-        self.cursor.execute(
-            "SELECT 1 FROM sqlite_master WHERE type='table' AND name=?", (table_name,)
-        )
-        if self.cursor.fetchone():
-            return (False, f"La table '{table_name}' existe déjà")
+        try:
+            cursor = self._conn(write=True).cursor()
+            cursor.execute(
+                "SELECT 1 FROM sqlite_master WHERE type='table' AND name=?", (table_name,)
+            )
+            if cursor.fetchone():
+                result = (False, f"La table '{table_name}' existe déjà")
+                # Migration : ajouter les colonnes déclarées depuis la création de la table
+                existing = {col[1] for col in cursor.execute(f"PRAGMA table_info({table_name})")}
+                for column, definition in schema.items():
+                    if column not in existing:
+                        cursor.execute(f"ALTER TABLE {table_name} ADD COLUMN {column} {definition}")
+            else:
+                schema_str = ", ".join(f"{k} {v}" for k, v in schema.items())
+                cursor.execute(f"CREATE TABLE {table_name} ({schema_str})")
+                result = (True, f"Table '{table_name}' crée avec succès")
+        except sqlite3.Error as e:
+            return (False, f"Erreur lors de la création de '{table_name}' : {e}")
+
+        if indexes:
+            success, message = self.create_indexes(table_name, indexes)
+            if not success:
+                return (False, message)
+        return result
+
+    def create_indexes(self, table_name: str, indexes: dict) -> tuple:
+        """
+        Create or migrate the secondary indexes of a table.
+
+        Args:
+            table_name (str): The name of the indexed table.
+            indexes (dict): A dictionary mapping index names to their definition:
+                {"columns": "col1, col2", "unique": bool, "where": "condition"}.
+
+        Returns:
+            tuple: (True, message) with the created index names, (False, error message) otherwise.
+
+        Notes:
+            An existing index whose definition differs from the declared one is
+            dropped and rebuilt. Indexes that are already up to date are left untouched.
+        """
+        created = []
+        try:
+            cursor = self._conn(write=True).cursor()
+            for name, spec in indexes.items():
+                query = (
+                    f"CREATE {'UNIQUE ' if spec.get('unique') else ''}INDEX {name} "
+                    f"ON {table_name} ({spec['columns']})"
+                )
+                if spec.get("where"):
+                    query += f" WHERE {spec['where']}"
+
+                existing = cursor.execute(
+                    "SELECT sql FROM sqlite_master WHERE type='index' AND name=?",
+                    (name,),
+                ).fetchone()
+                if existing and existing[0] == query:
+                    continue
+                if existing:
+                    # Définition modifiée : on reconstruit l'index
+                    cursor.execute(f"DROP INDEX {name}")
+                cursor.execute(query)
+                created.append(name)
+            return (True, f"Index créés sur '{table_name}' : {created}")
+        except sqlite3.Error as e:
+            return (False, f"Erreur lors de la création des index de '{table_name}' : {e}")
+
+    def create_fts(self, fts_name: str, spec: dict) -> tuple:
+        """
+        Create an FTS5 full-text index over a table, kept in sync by triggers.
+
+        Args:
+            fts_name (str): The name of the FTS5 virtual table.
+            spec (dict): The index definition: {"content": source table,
+                "content_rowid": its primary key, "columns": "col1, col2",
+                "tokenize": FTS5 tokenizer}.
+
+        Returns:
+            tuple: (True, message) if the index was created, (False, message) if it
+            already existed or an error occurred.
+
+        Notes:
+            The index is filled from the existing rows when it is created. After
+            that, insert/update/delete triggers on the source table keep it up to date.
+        """
+        table, key = spec["content"], spec["content_rowid"]
+        columns = [col.strip() for col in spec["columns"].split(",")]
+        new_cols = ", ".join(f"new.{col}" for col in columns)
+        old_cols = ", ".join(f"old.{col}" for col in columns)
+        try:
+            cursor = self._conn(write=True).cursor()
+            if cursor.execute(
+                "SELECT 1 FROM sqlite_master WHERE type='table' AND name=?",
+                (fts_name,),
+            ).fetchone():
+                return (False, f"L'index plein texte '{fts_name}' existe déjà")
+
+            cursor.execute(
+                f"CREATE VIRTUAL TABLE {fts_name} USING fts5({', '.join(columns)}, "
+                f"content='{table}', content_rowid='{key}', tokenize='{spec['tokenize']}')"
+            )
+            cursor.execute(
+                f"""CREATE TRIGGER {fts_name}_ai AFTER INSERT ON {table} BEGIN
+                    INSERT INTO {fts_name}(rowid, {spec['columns']}) VALUES (new.{key}, {new_cols});
+                END"""
+            )
+            cursor.execute(
+                f"""CREATE TRIGGER {fts_name}_ad AFTER DELETE ON {table} BEGIN
+                    INSERT INTO {fts_name}({fts_name}, rowid, {spec['columns']}) VALUES ('delete', old.{key}, {old_cols});
+                END"""
+            )
+            cursor.execute(
+                f"""CREATE TRIGGER {fts_name}_au AFTER UPDATE OF {spec['columns']} ON {table} BEGIN
+                    INSERT INTO {fts_name}({fts_name}, rowid, {spec['columns']}) VALUES ('delete', old.{key}, {old_cols});
+                    INSERT INTO {fts_name}(rowid, {spec['columns']}) VALUES (new.{key}, {new_cols});
+                END"""
+            )
+            # Indexer les lignes déjà présentes
+            cursor.execute(f"INSERT INTO {fts_name}({fts_name}) VALUES ('rebuild')")
+            return (True, f"Index plein texte '{fts_name}' crée avec succès")
+        except sqlite3.Error as e:
+            return (False, f"Erreur lors de la création de '{fts_name}' : {e}")
+
+    def create_rtree(self, rtree_name: str, spec: dict) -> tuple:
+        """
+        Create an R*Tree spatial index over the points of a table, kept in sync by triggers.
+
+        Args:
+            rtree_name (str): The name of the R*Tree virtual table.
+            spec (dict): The index definition: {"content": source table,
+                "content_rowid": its integer primary key, "latitude": latitude column,
+                "longitude": longitude column}.
+
+        Returns:
+            tuple: (True, message) if the index was created, (False, message) if it
+            already existed or an error occurred.
+
+        Notes:
+            The R*Tree columns are (id, min_lat, max_lat, min_lon, max_lon); a point
+            is stored as a box of zero size. The index is filled from the existing rows
+            when it is created, then kept up to date by insert/update/delete triggers.
+        """
+        table, key = spec["content"], spec["content_rowid"]
+        lat, lon = spec["latitude"], spec["longitude"]
+        try:
+            cursor = self._conn(write=True).cursor()
+            if cursor.execute(
+                "SELECT 1 FROM sqlite_master WHERE type='table' AND name=?",
+                (rtree_name,),
+            ).fetchone():
+                return (False, f"L'index spatial '{rtree_name}' existe déjà")
+
+            cursor.execute(
+                f"CREATE VIRTUAL TABLE {rtree_name} USING rtree(id, min_lat, max_lat, min_lon, max_lon)"
+            )
+            cursor.execute(
+                f"""CREATE TRIGGER {rtree_name}_ai AFTER INSERT ON {table}
+                WHEN new.{lat} IS NOT NULL AND new.{lon} IS NOT NULL BEGIN
+                    INSERT INTO {rtree_name} VALUES (new.{key}, new.{lat}, new.{lat}, new.{lon}, new.{lon});
+                END"""
+            )
+            cursor.execute(
+                f"""CREATE TRIGGER {rtree_name}_ad AFTER DELETE ON {table} BEGIN
+                    DELETE FROM {rtree_name} WHERE id = old.{key};
+                END"""
+            )
+            cursor.execute(
+                f"""CREATE TRIGGER {rtree_name}_au AFTER UPDATE OF {lat}, {lon} ON {table} BEGIN
+                    DELETE FROM {rtree_name} WHERE id = old.{key};
+                    INSERT INTO {rtree_name}
+                    SELECT new.{key}, new.{lat}, new.{lat}, new.{lon}, new.{lon}
+                    WHERE new.{lat} IS NOT NULL AND new.{lon} IS NOT NULL;
+                END"""
+            )
+            # Indexer les lignes déjà présentes
+            cursor.execute(
+                f"""INSERT INTO {rtree_name}
+                SELECT {key}, {lat}, {lat}, {lon}, {lon} FROM {table}
+                WHERE {lat} IS NOT NULL AND {lon} IS NOT NULL"""
+            )
+            return (True, f"Index spatial '{rtree_name}' crée avec succès")
+        except sqlite3.Error as e:
+            return (False, f"Erreur lors de la création de '{rtree_name}' : {e}")
+
+    def search_reviews(
+        self,
+        query: str,
+        id_restaurant: int = None,
+        limit: int = 20,
+        offset: int = 0,
+        snippet_tokens: int = 32,
+    ) -> tuple:
+        """
+        Search reviews by keywords through the `avis_fts` full-text index.
+
+        Args:
+            query (str): The keywords typed by the user. Each word is matched as a
+                prefix, accents and case are ignored.
+            id_restaurant (int, optional): Restrict the search to one restaurant.
+            limit (int): Maximum number of results (-1 for no limit).
+            offset (int): Number of results to skip, for pagination.
+            snippet_tokens (int): Length of the returned excerpt in tokens.
+                If 0, the whole highlighted review is returned instead.
+
+        Returns:
+            tuple: (True, rows) where each row is (id_avis, id_restaurant, date_avis,
+            titre_avis, excerpt, rank), best matches first; matched terms are
+            wrapped in `**`. (False, error message) otherwise.
+        """
+        # Chaque mot devient un préfixe entre guillemets : pas d'erreur de syntaxe FTS5
+        terms = re.findall(r"\w+", query)
+        if not terms:
+            return (True, [])
+        match = " ".join(f'"{term}"*' for term in terms)
+        if id_restaurant is not None:
+            id_restaurant = int(id_restaurant)
+
+        if snippet_tokens:
+            excerpt = f"snippet(avis_fts, 1, '**', '**', '…', {int(snippet_tokens)})"
         else:
-            schema_str = ", ".join(f"{k} {v}" for k, v in schema.items())
-            self.cursor.execute(f"CREATE TABLE {table_name} ({schema_str})")
-            return (True, f"Table '{table_name}' crée avec succès")
+            excerpt = "highlight(avis_fts, 1, '**', '**')"
+
+        return self.select(
+            f"""
+            SELECT a.id_avis,
+                   a.id_restaurant,
+                   a.date_avis,
+                   highlight(avis_fts, 0, '**', '**'),
+                   {excerpt},
+                   avis_fts.rank
+            FROM avis_fts
+            JOIN avis a ON a.id_avis = avis_fts.rowid
+            WHERE avis_fts MATCH ?
+            AND (? IS NULL OR a.id_restaurant = ?)
+            ORDER BY avis_fts.rank
+            LIMIT ? OFFSET ?
+            """,
+            (match, id_restaurant, id_restaurant, limit, offset),
+        )
 
-    def select(self, query: str) -> tuple:
+    def select(self, query: str, params: tuple = ()) -> tuple:
         """
         Execute a complete SQL query.
 
         Args:
             query (str): The SQL query to execute.
+            params (tuple, optional): Values bound to the `?` placeholders of the query.
 
         Returns:
             tuple: (True, result) if successful, (False, error message) otherwise.
         """
         try:
-            result = self.cursor.execute(query).fetchall()
+            result = self._conn().cursor().execute(query, params).fetchall()
             return (True, result)
         except sqlite3.Error as e:
             return (False, str(e))
@@ -70,6 +587,7 @@ class sqlutils:
         rows: list,
         column_names: list = None,
         chk_duplicates: bool = False,
+        returning: str = None,
     ) -> tuple:
         """
         Insert one or more rows into the table.
@@ -79,20 +597,31 @@ class sqlutils:
             rows (list): A list of tuples or lists, each containing the values to insert.
             column_names (list): A list of column names to insert into. If None, will use all columns from the table.
             chk_duplicates (bool): If True, will check if the row already exists in the table before inserting.
+            returning (str, optional): A column (e.g. the primary key) to return for each inserted row.
 
         Returns:
             tuple: A tuple containing a boolean indicating whether the insert was successful and a message describing the result of the insert.
+            With `returning`, the message is replaced by the list of the returned values, in the order of `rows`.
 
         Notes:
             If `column_names` is specified, it must match the length of the first row in `rows`.
             If `chk_duplicates` is True, this method will check if the rows already exist in the table before inserting.
             If at least one row already exists, the method will return a tuple containing False and a message indicating that first duplicate row.
             It will not insert any rows if a duplicate is found.
+            Leaving an INTEGER PRIMARY KEY out of `column_names` (or setting it to None) lets
+            sqlite assign it when the row is written, which is safe with concurrent writers;
+            use `returning` to get the assigned keys back.
         """
 
+        try:
+            cursor = self._conn(write=True).cursor()
+        except sqlite3.Error as error:
+            # Connexion d'écriture occupée par un autre thread au-delà du délai
+            return (False, str(error))
+
         if not column_names:
             # Si aucune colonne fournie, utiliser toutes les colonnes de la table
-            schema_info = self.cursor.execute(
+            schema_info = cursor.execute(
                 f"PRAGMA table_info({table_name})"
             ).fetchall()
             # Toutes les colonnes sauf la clé primaire
@@ -104,54 +633,206 @@ class sqlutils:
             column_names = [col[1] for col in schema_info]
 
         if chk_duplicates:
-            # Vérifier si des enregistrements existent déjà
-            schema_info = self.cursor.execute(
-                f"PRAGMA table_info({table_name})"
-            ).fetchall()
-            non_pk_cols = [
-                col[1] for col in schema_info if col[5] == 0 and col[1] in column_names
-            ]
-            condition_placeholders = " AND ".join([f"{col} = ?" for col in non_pk_cols])
-
-            for row in rows:
-                check_values = [row[column_names.index(col)] for col in non_pk_cols]
-
-                if self.cursor.execute(
-                    f"SELECT 1 FROM {table_name} WHERE {condition_placeholders}",
-                    check_values,
-                ).fetchone():
-                    self.db.rollback()
-                    return (
-                        False,
-                        f"doublon trouvé dans la table '{table_name}' : {row}",
-                    )
-            # condition_placeholders = " AND ".join(
-            #     [f"{col} = ?" for col in column_names]
-            # )
-            # for row in rows:
-            #     if self.cursor.execute(
-            #         f"SELECT 1 FROM {table_name} WHERE {condition_placeholders}", row
-            #     ).fetchone():
-            #         self.db.rollback()
-            #         return (
-            #             False,
-            #             f"doublon trouvé dans la table '{table_name}' : {row}",
-            #         )
+            # Vérifier si des enregistrements existent déjà, en une seule requête :
+            # les lignes sont chargées dans une table temporaire puis comparées à la
+            # table cible sur sa clé naturelle (index unique), ou à défaut sur
+            # toutes les colonnes hors clé primaire
+            key_cols = self._natural_key(table_name, column_names)
+            if key_cols is None:
+                schema_info = cursor.execute(
+                    f"PRAGMA table_info({table_name})"
+                ).fetchall()
+                key_cols = [
+                    col[1] for col in schema_info if col[5] == 0 and col[1] in column_names
+                ]
+            if not key_cols:
+                return (
+                    False,
+                    f"Aucune colonne pour comparer les lignes de '{table_name}' (doublons)",
+                )
+            condition = " AND ".join([f"t.{col} = s.{col}" for col in key_cols])
+
+            staging = f"_staging_{table_name}"
+            try:
+                cursor.execute(f"DROP TABLE IF EXISTS temp.{staging}")
+                cursor.execute(
+                    f"CREATE TEMP TABLE {staging} AS "
+                    f"SELECT 0 AS _pos, {', '.join(column_names)} FROM {table_name} WHERE 0"
+                )
+                cursor.executemany(
+                    f"INSERT INTO temp.{staging} VALUES ({', '.join(['?'] * (len(column_names) + 1))})",
+                    [(pos, *row) for pos, row in enumerate(rows)],
+                )
+                duplicate = cursor.execute(
+                    f"""SELECT s._pos FROM temp.{staging} s
+                    WHERE EXISTS (SELECT 1 FROM {table_name} t WHERE {condition})
+                    ORDER BY s._pos LIMIT 1"""
+                ).fetchone()
+                cursor.execute(f"DROP TABLE temp.{staging}")
+            except sqlite3.Error as error:
+                return (False, str(error))
+
+            if duplicate:
+                self.rollback()
+                return (
+                    False,
+                    f"doublon trouvé dans la table '{table_name}' : {rows[duplicate[0]]}",
+                )
 
         try:
             placeholders = ", ".join(["?"] * len(column_names))
             query = f"INSERT INTO {table_name} ({', '.join(column_names)}) VALUES ({placeholders})"
-            self.cursor.executemany(query, rows)
-            return (True, f"{self.cursor.rowcount} row(s) successfully inserted")
+            if returning:
+                # executemany ne renvoie pas les lignes de RETURNING : une requête par ligne
+                query += f" RETURNING {returning}"
+                return (True, [cursor.execute(query, row).fetchone()[0] for row in rows])
+            cursor.executemany(query, rows)
+            return (True, f"{cursor.rowcount} row(s) successfully inserted")
         except sqlite3.Error as error:
             return (False, str(error))
 
+    def _natural_key(self, table_name: str, column_names: list) -> list:
+        """
+        Return the columns of the first unique index of the table covered by `column_names`.
+
+        Args:
+            table_name (str): The name of the table.
+            column_names (list): The columns available in the inserted rows.
+
+        Returns:
+            list: The key columns, or None if no declared unique index applies.
+
+        Notes:
+            Only indexes created with CREATE UNIQUE INDEX (see `create_indexes`) are
+            considered, partial indexes and the primary key are ignored.
+        """
+        conn = self._conn()
+        # index_list : (seq, name, unique, origin, partial)
+        for index in conn.execute(f"PRAGMA index_list({table_name})").fetchall():
+            if index[2] and index[3] == "c" and not index[4]:
+                cols = [c[2] for c in conn.execute(f"PRAGMA index_info({index[1]})")]
+                if cols and all(col in column_names for col in cols):
+                    return cols
+        return None
+
+    def upsert(
+        self,
+        table_name: str,
+        rows: list,
+        column_names: list = None,
+        update: bool = False,
+    ) -> tuple:
+        """
+        Insert rows, skipping (or updating) those whose natural key already exists.
+
+        Args:
+            table_name (str): The name of the table to insert into.
+            rows (list): A list of tuples or lists, each containing the values to insert.
+            column_names (list): A list of column names to insert into. If None, will use all columns from the table.
+            update (bool): If True, existing rows are updated with the new values
+                (except key and primary key columns) instead of being skipped.
+
+        Returns:
+            tuple: (True, report) where report is a dict with the "inserted", "updated"
+            and "skipped" rows, (False, error message) otherwise.
+
+        Notes:
+            The natural key is the first unique index of the table covered by
+            `column_names` (e.g. `idx_avis_natural_key`). The rows are loaded into a
+            temporary table and classified against the target by one query, then
+            written by one prepared INSERT ... ON CONFLICT through `executemany`.
+            A row repeating the key of an earlier row of `rows` counts as updated
+            (or skipped). A conflict on another constraint (e.g. the primary key) is
+            an error: the rows are then rolled back to a savepoint, the earlier
+            writes of the transaction are kept.
+        """
+        try:
+            cursor = self._conn(write=True).cursor()
+            schema_info = cursor.execute(f"PRAGMA table_info({table_name})").fetchall()
+        except sqlite3.Error as error:
+            return (False, str(error))
+        if not column_names:
+            column_names = [col[1] for col in schema_info]
+
+        key_cols = self._natural_key(table_name, column_names)
+        if key_cols is None:
+            return (False, f"Aucune clé naturelle (index unique) pour la table '{table_name}'")
+
+        query = (
+            f"INSERT INTO {table_name} ({', '.join(column_names)}) "
+            f"VALUES ({', '.join(['?'] * len(column_names))}) "
+            f"ON CONFLICT ({', '.join(key_cols)}) "
+        )
+        pk_cols = [col[1] for col in schema_info if col[5]]
+        set_cols = [col for col in column_names if col not in key_cols + pk_cols]
+        if update and set_cols:
+            query += "DO UPDATE SET " + ", ".join(f"{col} = excluded.{col}" for col in set_cols)
+        else:
+            query += "DO NOTHING"
+        staging = f"_staging_{table_name}"
+        match = " AND ".join(f"t.{col} = s.{col}" for col in key_cols)
+        same_key = " AND ".join(f"s2.{col} = s.{col}" for col in key_cols)
+
+        report = {"inserted": [], "updated": [], "skipped": []}
+        existing = "updated" if update and set_cols else "skipped"
+        try:
+            with self._savepoint(cursor, "upsert"):
+                # Lignes existantes (dans la table ou plus haut dans `rows`), en une requête
+                cursor.execute(f"DROP TABLE IF EXISTS temp.{staging}")
+                cursor.execute(
+                    f"CREATE TEMP TABLE {staging} AS "
+                    f"SELECT 0 AS _pos, {', '.join(column_names)} FROM {table_name} WHERE 0"
+                )
+                cursor.executemany(
+                    f"INSERT INTO temp.{staging} VALUES ({', '.join(['?'] * (len(column_names) + 1))})",
+                    [(pos, *row) for pos, row in enumerate(rows)],
+                )
+                status = cursor.execute(
+                    f"""SELECT s._pos,
+                        EXISTS (SELECT 1 FROM {table_name} t WHERE {match})
+                        OR s._pos > (SELECT MIN(s2._pos) FROM temp.{staging} s2 WHERE {same_key})
+                    FROM temp.{staging} s ORDER BY s._pos"""
+                ).fetchall()
+                cursor.execute(f"DROP TABLE temp.{staging}")
+
+                cursor.executemany(query, rows)
+        except sqlite3.Error as error:
+            return (False, str(error))
+
+        for pos, exists in status:
+            report[existing if exists else "inserted"].append(rows[pos])
+        return (True, report)
+
+    @contextmanager
+    def _savepoint(self, cursor: sqlite3.Cursor, name: str):
+        """
+        Run the statements of the block in a savepoint of the current transaction.
+
+        Notes:
+            On error, only the statements of the block are rolled back (ROLLBACK TO)
+            and the exception is raised again: the earlier writes of the transaction
+            are kept, the caller decides to commit or rollback.
+        """
+        if not cursor.connection.in_transaction:
+            cursor.execute("BEGIN")
+        cursor.execute(f"SAVEPOINT {name}")
+        try:
+            yield
+        except BaseException:
+            cursor.execute(f"ROLLBACK TO {name}")
+            cursor.execute(f"RELEASE {name}")
+            raise
+        cursor.execute(f"RELEASE {name}")
+
     def load_from_csv(
         self,
         table_name: str,
         filepath: Path,
         delimiter: str = ",",
         encoding: str = "utf-8",
+        batch_size: int = 10000,
+        converters: dict = None,
+        pragmas: dict = None,
     ) -> tuple:
         """
         Load data from a CSV file into the table, only inserting columns present in the CSV header.
@@ -161,36 +842,89 @@ class sqlutils:
             filepath (Path): The path to the CSV file.
             delimiter (str): CSV delimiter (default: ',').
             encoding (str): File encoding (default: 'utf-8').
+            batch_size (int): Number of rows sent to each `executemany` call.
+            converters (dict, optional): Column names mapped to a function applied
+                to the raw CSV string (e.g. {"note_restaurant": float}).
+            pragmas (dict, optional): PRAGMA settings used during the load and restored
+                afterwards. Defaults to `LOAD_PRAGMAS`; pass an empty dict to keep the
+                connection settings.
 
         Returns:
-            tuple: (success: bool, message: str)
-        """
-        with open(filepath, "r", encoding=encoding) as csvfile:
-            reader = csv.DictReader(
-                csvfile, delimiter=delimiter
-            )  # First line = header by default
-            nb_rows = 0
-            for row in reader:
-
-                # Filtrer les colonnes présentes dans le CSV
-                columns = ", ".join(row.keys())
-                placeholders = ", ".join(["?" for _ in row])
-                values = tuple(row.values())
-
-                # Construire et exécuter la requête INSERT
-                try:
-                    self.cursor.execute(
-                        f"INSERT INTO {table_name} ({columns}) VALUES ({placeholders})",
-                        values,
-                    )
-                    nb_rows += 1
-                except Exception as e:
-                    self.db.rollback()
-                    return (False, f"Error inserting row: {e}")
+            tuple: (success: bool, message: str), the message reports the load rate.
+
+        Notes:
+            The file is streamed: only one batch of rows is held in memory.
+            All rows are inserted in a single transaction, rolled back on the first error.
+        """
+        try:
+            conn = self._conn(write=True)
+        except sqlite3.Error as e:
+            return (False, f"Error loading '{filepath}' into '{table_name}': {e}")
+        cursor = conn.cursor()
+        pragmas = LOAD_PRAGMAS if pragmas is None else pragmas
+        converters = converters or {}
+
+        # Sauvegarder les réglages courants avant de passer en mode chargement
+        # (synchronous ne peut pas changer au milieu d'une transaction)
+        previous = {}
+        if not conn.in_transaction:
+            for name, value in pragmas.items():
+                previous[name] = cursor.execute(f"PRAGMA {name}").fetchone()[0]
+                cursor.execute(f"PRAGMA {name} = {value}")
+
+        start = time.perf_counter()
+        nb_rows = 0
+        try:
+            with open(filepath, "r", encoding=encoding, newline="") as csvfile:
+                reader = csv.reader(csvfile, delimiter=delimiter)
+                # First line = header
+                columns = next(reader, None)
+                if not columns:
+                    raise ValueError(f"empty CSV file '{filepath}'")
+                nb_cols = len(columns)
+                convert = [(i, converters[col]) for i, col in enumerate(columns) if col in converters]
+
+                # Requête préparée une seule fois pour tout le fichier
+                query = (
+                    f"INSERT INTO {table_name} ({', '.join(columns)}) "
+                    f"VALUES ({', '.join(['?'] * nb_cols)})"
+                )
+
+                batch = []
+                for row in reader:
+                    # Compléter ou tronquer les lignes mal formées (comme csv.DictReader)
+                    if len(row) != nb_cols:
+                        row = (row + [None] * nb_cols)[:nb_cols]
+                    for i, fun in convert:
+                        row[i] = fun(row[i]) if row[i] not in ("", None) else None
+                    batch.append(row)
+                    if len(batch) >= batch_size:
+                        cursor.executemany(query, batch)
+                        nb_rows += len(batch)
+                        batch = []
+                if batch:
+                    cursor.executemany(query, batch)
+                    nb_rows += len(batch)
+            result = (True, None)
+        except Exception as e:
+            result = (False, f"Error inserting batch starting at row {nb_rows + 1}: {e}")
+
+        if result[0]:
+            conn.commit()
+        else:
+            conn.rollback()
+        for name, value in previous.items():
+            conn.execute(f"PRAGMA {name} = {value}")
+        # Libérer la connexion d'écriture (instance du pool)
         self.commit()
+        if not result[0]:
+            return result
+
+        duration = time.perf_counter() - start
         return (
             True,
-            f"Successfully loaded {nb_rows} rows from '{filepath}' into '{table_name}'",
+            f"Successfully loaded {nb_rows} rows from '{filepath}' into '{table_name}' "
+            f"in {duration:.2f}s ({nb_rows / max(duration, 1e-9):.0f} rows/s)",
         )
 
     def update(self, table_name: str, data: dict, where: list = None) -> tuple:
@@ -215,10 +949,55 @@ class sqlutils:
         if where:
             query += f" WHERE {' AND '.join(where)}"
         try:
-            self.cursor.execute(query, values)
+            cursor = self._conn(write=True).cursor()
+            cursor.execute(query, values)
             return (
                 True,
-                f"{self.cursor.rowcount} row(s) successfully updated",
+                f"{cursor.rowcount} row(s) successfully updated",
+            )
+        except Exception as e:
+            return (False, str(e))
+
+    def update_many(
+        self, table_name: str, key_column: str, rows: list, columns: list = None
+    ) -> tuple:
+        """
+        Update many rows, each identified by its key, in a single statement.
+
+        Args:
+            table_name (str): The name of the table to update.
+            key_column (str): The column identifying each row (e.g. "id_avis").
+            rows (list): Either dictionaries mapping column names (including `key_column`)
+                to their new values, or sequences of values in `columns` order followed by the key.
+            columns (list, optional): The updated columns when `rows` are sequences.
+                If None, they are taken from the keys of the first dictionary.
+
+        Returns:
+            tuple: A tuple containing a boolean indicating whether the update was successful and a message describing the result of the update.
+
+        Notes:
+            One prepared UPDATE is run through `executemany` inside the current transaction.
+            If an error occurs, the rows are rolled back to a savepoint: either every row
+            is updated or none, and the earlier writes of the transaction are kept.
+        """
+        if not rows:
+            return (True, "0 row(s) successfully updated")
+        if columns is None:
+            columns = [col for col in rows[0] if col != key_column]
+            params = [[row[col] for col in columns] + [row[key_column]] for row in rows]
+        else:
+            params = rows
+
+        set_clause = ", ".join(f"{col} = ?" for col in columns)
+        query = f"UPDATE {table_name} SET {set_clause} WHERE {key_column} = ?"
+        try:
+            cursor = self._conn(write=True).cursor()
+            with self._savepoint(cursor, "update_many"):
+                cursor.executemany(query, params)
+                nb_updated = cursor.rowcount
+            return (
+                True,
+                f"{nb_updated} row(s) successfully updated ({len(params)} requested)",
             )
         except Exception as e:
             return (False, str(e))
@@ -240,11 +1019,32 @@ class sqlutils:
         """
         try:
             query = f"DELETE FROM {table_name} WHERE {' AND '.join(where)}"
-            self.cursor.execute(query)
-            return (True, f"{self.cursor.rowcount} row(s) successfully deleted")
+            cursor = self._conn(write=True).cursor()
+            cursor.execute(query)
+            return (True, f"{cursor.rowcount} row(s) successfully deleted")
         except Exception as e:
             return (False, str(e))
 
+    def begin(self) -> tuple:
+        """
+        Start a write transaction immediately.
+
+        Returns:
+            tuple: (True, message) if successful, (False, error message) otherwise.
+
+        Notes:
+            Until `commit()` or `rollback()`, no other writer can interleave and the
+            reads of this instance go through the write transaction. This is useful
+            to read values (e.g. a counter) and write them back atomically.
+        """
+        try:
+            conn = self._conn(write=True)
+            if not conn.in_transaction:
+                conn.execute("BEGIN IMMEDIATE")
+            return (True, "Transaction started")
+        except sqlite3.Error as e:
+            return (False, str(e))
+
     def commit(self) -> tuple:
         """
         Commit the current transaction.
@@ -255,7 +1055,7 @@ class sqlutils:
             commit or rollback the transaction when the connection is closed.
         """
         try:
-            self.db.commit()
+            self._end_transaction(commit=True)
             return (True, "Commit successful")
         except sqlite3.Error as e:
             return (False, str(e))
@@ -270,7 +1070,7 @@ class sqlutils:
         commit the transaction when the connection is closed.
         """
         try:
-            self.db.rollback()
+            self._end_transaction(commit=False)
             return (True, "Rollback successful")
         except sqlite3.Error as e:
             return (False, str(e))
@@ -283,20 +1083,61 @@ class sqlutils:
             This method is used to perform database maintenance operations : vacuuming, analyze, and optimize.
         """
         try:
-            self.db.execute("PRAGMA optimize")
+            self._conn().execute("PRAGMA optimize")
             return (True, "Maintenance successful")
         except Exception as e:
             return (False, str(e))
 
+    def diagnostics(self) -> tuple:
+        """
+        Report the PRAGMA settings in effect on the current connection.
+
+        Returns:
+            tuple: (True, dict) mapping each PRAGMA of `PRAGMA_PROFILE` (plus
+            page_size) to its current value, (False, error message) otherwise.
+        """
+        try:
+            conn = self._conn()
+            names = list(PRAGMA_PROFILE) + ["page_size"]
+            return (
+                True,
+                {name: conn.execute(f"PRAGMA {name}").fetchone()[0] for name in names},
+            )
+        except sqlite3.Error as e:
+            return (False, str(e))
+
+    def close(self) -> tuple:
+        """
+        Commit any pending changes and close the connection.
+
+        Notes:
+            A pooled instance only gives its connections back to the pool
+            (releasing the writer if it holds it); they are not closed.
+            Calling this method several times is harmless.
+        """
+        if self._closed:
+            return (True, "Already closed")
+        result = self.commit()
+        self._closed = True
+        if self.pool is None:
+            self._db.close()
+        return result
+
     def __del__(self):
         """
-        Close the database connection and commit any pending changes when the object
-        is garbage collected.
+        Close the database connection when the object is garbage collected.
 
         Notes:
             This method is called when the object is garbage collected.
             It is used to ensure that the database connection is always closed,
-            even if the object is not explicitly closed.
+            even if the object is not explicitly closed. A private connection
+            commits its pending changes; a pooled instance rolls back the
+            transaction it left open and releases the writer.
         """
-        self.commit()
-        self.db.close()
+        if not hasattr(self, "_closed") or self._closed:
+            return
+        if self.pool is not None:
+            self.rollback()
+            self._closed = True
+        else:
+            self.close()
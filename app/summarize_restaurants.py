@@ -0,0 +1,108 @@
+import asyncio
+import os
+import time
+from pathlib import Path
+
+import dotenv
+from sqlutils import sqlutils
+from summary_generator import SUMMARY_UP_TO_DATE, generate_summary, mistral_rate_limiter
+
+
+async def summarize_restaurants_async(
+    db_path, api_key, ids=None, max_workers=4, nb_mois=18, backend=None
+):
+    """Génère les résumés de plusieurs restaurants avec un pool borné de workers.
+
+    Chaque worker prend le restaurant suivant de la file et appelle generate_summary
+    dans un thread ; toutes les requêtes partagent le limiteur de l'API Mistral, qui
+    ralentit sur les réponses 429 et réaccélère ensuite.
+    Chaque résumé est validé avec l'empreinte de ses avis : après un arrêt, une
+    nouvelle exécution ignore sans appel à l'API les restaurants déjà traités.
+    `backend` choisit le modèle (voir summary_generator.get_backend) : le backend
+    extractif ou le serveur simulé permettent de mesurer le débit hors ligne.
+    Retourne un dictionnaire id_restaurant -> (succès, message).
+    """
+    if ids is None:
+        db = sqlutils(db_path, pooled=True)
+        success, rows = db.select("SELECT id_restaurant FROM restaurants ORDER BY id_restaurant")
+        db.close()
+        if not success:
+            print(f"Erreur lors de la lecture des restaurants : {rows}")
+            return {}
+        ids = [id_restaurant for (id_restaurant,) in rows]
+
+    queue = asyncio.Queue()
+    for id_restaurant in ids:
+        queue.put_nowait(id_restaurant)
+    results = {}
+    counts = {"mis à jour": 0, "à jour": 0, "en erreur": 0}
+    limiter = mistral_rate_limiter(max_workers)
+    nb_requests = limiter.nb_requests
+    start = time.perf_counter()
+
+    async def worker():
+        while not queue.empty():
+            id_restaurant = queue.get_nowait()
+            try:
+                result = await asyncio.to_thread(
+                    generate_summary,
+                    id_restaurant,
+                    api_key,
+                    nb_mois=nb_mois,
+                    max_workers=max_workers,
+                    db_path=db_path,
+                    backend=backend,
+                )
+            except Exception as e:
+                result = (False, f"Erreur lors de la génération du résumé : {e}")
+            results[id_restaurant] = result
+
+            if not result[0]:
+                counts["en erreur"] += 1
+            elif result[1].startswith(SUMMARY_UP_TO_DATE):
+                counts["à jour"] += 1
+            else:
+                counts["mis à jour"] += 1
+            # Avancement et débit depuis le début du traitement
+            minutes = (time.perf_counter() - start) / 60
+            print(
+                f"[{len(results)}/{len(ids)}] {result[1]} "
+                f"({len(results) / minutes:.1f} restaurants/min, "
+                f"{(limiter.nb_requests - nb_requests) / minutes:.1f} requêtes API/min)"
+            )
+
+    await asyncio.gather(*(worker() for _ in range(max_workers)))
+
+    minutes = (time.perf_counter() - start) / 60
+    print(
+        f"{len(results)} restaurants en {minutes:.1f} min : "
+        + ", ".join(f"{n} {status}" for status, n in counts.items())
+        + f", {limiter.nb_requests - nb_requests} requêtes API"
+    )
+    return results
+
+
+def summarize_restaurants(
+    db_path, api_key, ids=None, max_workers=4, nb_mois=18, backend=None
+):
+    """Version bloquante de summarize_restaurants_async (scripts, tâche nocturne)."""
+    return asyncio.run(
+        summarize_restaurants_async(
+            db_path,
+            api_key,
+            ids=ids,
+            max_workers=max_workers,
+            nb_mois=nb_mois,
+            backend=backend,
+        )
+    )
+
+
+if __name__ == "__main__":
+    # Exécution depuis le dossier app : python summarize_restaurants.py
+    dotenv.load_dotenv()
+    summarize_restaurants(
+        Path("data/friands.db"),
+        os.getenv("MISTRAL_API_KEY"),
+        max_workers=int(os.getenv("MISTRAL_MAX_CONCURRENCY", 4)),
+    )
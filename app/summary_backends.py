@@ -0,0 +1,162 @@
+import re
+from pathlib import Path
+
+import numpy as np
+
+
+# Mots vides ignorés pour comparer les phrases (même liste que les nuages de mots)
+STOPWORDS_PATH = Path(__file__).parent / "stopwords-fr.txt"
+
+# Séparateur d'avis (" --- ") essayé en premier, pour ne pas le laisser en tête de phrase
+SENTENCE_SPLIT = re.compile(r"\s*-{3}\s+|(?<=[.!?…])\s+|\n+")
+WORD = re.compile(r"\w+")
+
+
+def prompt_body(query: str) -> str:
+    """
+    Returns the text to summarize of a prompt built by summary_generator, without
+    its instruction (everything before the first " : '") and quotes.
+    """
+    _, _, body = query.partition(" : '")
+    body = body or query
+    return body.replace("' Nouveaux avis : '", " --- ").strip("' ")
+
+
+class SummarizerBackend:
+    """
+    Interface of the summarization backends used by summary_generator.
+
+    A backend answers the prompts of summary_generator: an instruction followed by
+    the reviews (or partial summaries) to summarize, separated by " --- ".
+
+    Attributes:
+        model (str): Name of the model, part of the digest of the summaries it writes.
+        rate_limiter (HostRateLimiter): Limits applied to the queries, None if none.
+    """
+
+    model = None
+    rate_limiter = None
+
+    def query(self, query: str, temperature: float = 0.5) -> str:
+        """
+        Returns the answer of the backend to a prompt.
+        """
+        raise NotImplementedError
+
+    def stream(self, query: str, temperature: float = 0.5):
+        """
+        Yields the answer of the backend to a prompt as it is generated (in a single
+        piece for backends that cannot stream).
+        """
+        yield self.query(query, temperature=temperature)
+
+
+class ExtractiveSummarizer(SummarizerBackend):
+    """
+    Local extractive summarizer (TextRank): the summary is made of the most central
+    sentences of the reviews, in their original order.
+
+    Sentences are the nodes of a graph weighted by their word overlap, normalized by
+    their lengths (Mihalcea & Tarau, 2004), and ranked with PageRank. It needs neither
+    network nor API key, is deterministic and answers in milliseconds.
+
+    Attributes:
+        nb_sentences (int): Number of sentences of a summary.
+        min_words (int): Sentences with fewer content words are not considered.
+        damping (float): PageRank damping factor.
+        stopwords (set): Words ignored when comparing sentences.
+    """
+
+    model = "textrank"
+
+    def __init__(
+        self,
+        nb_sentences: int = 5,
+        min_words: int = 4,
+        damping: float = 0.85,
+        stopwords_path: Path = STOPWORDS_PATH,
+    ) -> None:
+        """
+        Initializes the summarizer.
+
+        Args:
+            nb_sentences (int): Number of sentences of a summary.
+            min_words (int): Sentences with fewer content words are not considered.
+            damping (float): PageRank damping factor.
+            stopwords_path (Path): File with one stopword per line.
+        """
+        self.nb_sentences = nb_sentences
+        self.min_words = min_words
+        self.damping = damping
+        with open(stopwords_path, encoding="utf-8") as f:
+            self.stopwords = {line.strip() for line in f if line.strip()}
+
+    def sentences(self, text: str) -> tuple:
+        """
+        Splits a text into distinct sentences and their sets of content words.
+
+        Returns:
+            tuple: (sentences, word sets), sentences too short being left out.
+        """
+        sentences, words = [], []
+        seen = set()
+        for sentence in SENTENCE_SPLIT.split(text):
+            sentence = sentence.strip()
+            key = sentence.lower()
+            if not sentence or key in seen:
+                continue
+            seen.add(key)
+            content = {w for w in WORD.findall(key) if w not in self.stopwords}
+            if len(content) >= self.min_words:
+                sentences.append(sentence)
+                words.append(content)
+        return sentences, words
+
+    def rank(self, words: list, max_iter: int = 100, tol: float = 1e-6) -> np.ndarray:
+        """
+        Returns the TextRank score of each sentence, given its set of content words.
+        """
+        vocabulary = {}
+        rows, cols = [], []
+        for i, content in enumerate(words):
+            for word in content:
+                rows.append(i)
+                cols.append(vocabulary.setdefault(word, len(vocabulary)))
+        incidence = np.zeros((len(words), len(vocabulary)), dtype=np.float32)
+        incidence[rows, cols] = 1
+
+        # Similarité : mots communs / (log |Si| + log |Sj|)
+        overlap = incidence @ incidence.T
+        log_lengths = np.log(incidence.sum(axis=1))
+        similarity = overlap / (log_lengths[:, None] + log_lengths[None, :])
+        np.fill_diagonal(similarity, 0)
+
+        # PageRank sur le graphe pondéré (une phrase isolée ne distribue rien)
+        totals = similarity.sum(axis=1, keepdims=True)
+        transition = np.divide(similarity, totals, out=np.zeros_like(similarity), where=totals > 0)
+        n = len(words)
+        scores = np.full(n, 1 / n)
+        for _ in range(max_iter):
+            previous = scores
+            scores = (1 - self.damping) / n + self.damping * (transition.T @ scores)
+            if np.abs(scores - previous).sum() < tol:
+                break
+        return scores
+
+    def summarize(self, text: str) -> str:
+        """
+        Returns the `nb_sentences` most central sentences of a text, in their order.
+        """
+        sentences, words = self.sentences(text)
+        if len(sentences) <= self.nb_sentences:
+            return " ".join(sentences)
+        scores = self.rank(words)
+        # Tri stable : à score égal, la phrase la plus ancienne l'emporte
+        best = np.argsort(-scores, kind="stable")[: self.nb_sentences]
+        return " ".join(sentences[i] for i in sorted(best))
+
+    def query(self, query: str, temperature: float = 0.5) -> str:
+        """
+        Summarizes the text of a summary_generator prompt (the temperature is ignored).
+        """
+        return self.summarize(prompt_body(query))
@@ -1,11 +1,50 @@
 from mistralai import Mistral
+import hashlib
 import os
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from functools import lru_cache
+from math import ceil
 import pandas as pd
 from pathlib import Path
 from sqlutils import sqlutils
-
-
-class MistralAPI:
+from rate_limiter import HostRateLimiter
+from summary_backends import ExtractiveSummarizer, SummarizerBackend
+
+try:
+    from mistral_common.tokens.tokenizers.mistral import MistralTokenizer
+except ImportError:
+    MistralTokenizer = None
+
+
+# Modèle utilisé pour les résumés et taille de son contexte (en tokens)
+MODEL = "pixtral-large-latest"
+MODEL_CONTEXT = 131072
+# Tokens réservés à la réponse du modèle dans chaque requête
+OUTPUT_RESERVE = 4096
+# Taille visée des morceaux d'avis : plusieurs petits morceaux résumés en parallèle
+# répondent plus vite qu'un seul morceau remplissant tout le contexte
+CHUNK_TOKENS = 24000
+# Sans tokenizer Mistral, estimation prudente (un token Mistral fait ~4 caractères en français)
+CHARS_PER_TOKEN = 3
+
+MISTRAL_API_URL = "https://api.mistral.ai/v1/chat/completions"
+# Réponses de l'API après lesquelles une requête est retentée
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+SUMMARY_QUERY = "Analyser ces avis de clients concernant un restaurant, puis produire un unique résumé de ces avis, court mais riche d'informations. Ne pas produire de liste de points positifs ou négatifs."
+REDUCE_QUERY = "Voici plusieurs résumés partiels des avis de clients concernant un même restaurant. Les fusionner en un unique résumé cohérent, court mais riche d'informations, sans répétitions. Ne pas produire de liste de points positifs ou négatifs."
+UPDATE_QUERY = "Voici le résumé actuel des avis de clients concernant un restaurant, suivi de nouveaux avis. Mettre à jour ce résumé pour tenir compte des nouveaux avis, en restant court mais riche d'informations. Ne pas produire de liste de points positifs ou négatifs."
+REVIEW_SEPARATOR = " --- "
+# Début du message de generate_summary quand le résumé n'a pas eu besoin d'être recalculé
+SUMMARY_UP_TO_DATE = "Résumé à jour"
+# Part maximale de nouveaux avis intégrés au résumé existant plutôt que de tout résumer
+INCREMENTAL_MAX_SHARE = 0.25
+
+
+class MistralAPI(SummarizerBackend):
     """
     A client for interacting with the MistralAI API.
 
@@ -14,12 +53,18 @@ class MistralAPI:
         model (str): The model to use for queries.
     """
 
-    def __init__(self, model: str) -> None:
+    def __init__(
+        self, model: str, rate_limiter: HostRateLimiter = None, server_url: str = None
+    ) -> None:
         """
         Initializes the MistralAPI with the given model.
 
         Args:
             model (str): The model to use for queries.
+            rate_limiter (HostRateLimiter, optional): Limits applied to every query
+                (requests per second and concurrent requests).
+            server_url (str, optional): Another server implementing the API, e.g.
+                mock_mistral_server.py. Defaults to MISTRAL_SERVER_URL, if set.
 
         Raises:
             ValueError: If the MISTRAL_API_KEY environment variable is not set.
@@ -29,10 +74,13 @@ class MistralAPI:
             raise ValueError(
                 "No MISTRAL_API_KEY as environment variable, please set it!"
             )
-        self.client = Mistral(api_key=api_key)
+        self.client = Mistral(
+            api_key=api_key, server_url=server_url or os.getenv("MISTRAL_SERVER_URL")
+        )
         self.model = model
+        self.rate_limiter = rate_limiter
 
-    def query(self, query: str, temperature: float = 0.5) -> str:
+    def query(self, query: str, temperature: float = 0.5, max_retries: int = 5) -> str:
         """
         Sends a query to the MistralAI API and returns the response.
 
@@ -40,10 +88,84 @@ class MistralAPI:
             query (str): The input query to send to the model.
             temperature (float, optional): The temperature parameter for controlling
                                           the randomness of the output. Defaults to 0.5.
+            max_retries (int, optional): Retries after a rate-limit (429) or server error.
 
         Returns:
             str: The response from the API.
+
+        Notes:
+            Retries wait for the Retry-After delay of the answer, or an exponential
+            backoff. A 429 answer also halves the request rate of `rate_limiter`,
+            which then recovers gradually with each successful query.
         """
+        for attempt in range(max_retries + 1):
+            try:
+                with self._slot():
+                    response = self._complete(query, temperature)
+            except Exception as e:
+                self._backoff(e, attempt, max_retries)
+                continue
+            if self.rate_limiter is not None:
+                self.rate_limiter.speed_up(MISTRAL_API_URL)
+            return response
+
+    def stream(self, query: str, temperature: float = 0.5, max_retries: int = 5):
+        """
+        Sends a query to the MistralAI API and yields the response as it is generated.
+
+        Args:
+            query (str): The input query to send to the model.
+            temperature (float, optional): The temperature parameter. Defaults to 0.5.
+            max_retries (int, optional): Retries after a rate-limit (429) or server error.
+
+        Yields:
+            str: The successive pieces of the response (chat stream).
+
+        Notes:
+            Errors are retried as in `query` while the stream is being opened; once
+            text has been yielded, an error is raised to the caller.
+        """
+        for attempt in range(max_retries + 1):
+            with self._slot():
+                try:
+                    events = self.client.chat.stream(
+                        model=self.model,
+                        temperature=temperature,
+                        messages=[{"role": "user", "content": query}],
+                    )
+                except Exception as e:
+                    error = e
+                else:
+                    with events:
+                        for event in events:
+                            delta = event.data.choices[0].delta.content
+                            if isinstance(delta, str) and delta:
+                                yield delta
+                    if self.rate_limiter is not None:
+                        self.rate_limiter.speed_up(MISTRAL_API_URL)
+                    return
+            self._backoff(error, attempt, max_retries)
+
+    def _slot(self):
+        # Limites de débit de l'API, si un limiteur est fourni
+        if self.rate_limiter is None:
+            return nullcontext()
+        return self.rate_limiter.slot(MISTRAL_API_URL)
+
+    def _backoff(self, error: Exception, attempt: int, max_retries: int) -> None:
+        # Relance `error` si elle n'est pas temporaire, sinon attend avant le prochain essai
+        status = getattr(error, "status_code", None)
+        if status not in RETRY_STATUSES or attempt == max_retries:
+            raise error
+        delay = _retry_after(error)
+        if status == 429 and self.rate_limiter is not None:
+            self.rate_limiter.slow_down(MISTRAL_API_URL, delay)
+        if delay is None:
+            delay = min(60, 2 ** (attempt + 1)) * random.uniform(1, 1.5)
+        print(f"Réponse {status} de l'API Mistral, nouvel essai dans {delay:.1f}s")
+        time.sleep(delay)
+
+    def _complete(self, query: str, temperature: float) -> str:
         chat_response = self.client.chat.complete(
             model=self.model,
             temperature=temperature,
@@ -57,6 +179,77 @@ class MistralAPI:
         return chat_response.choices[0].message.content
 
 
+def get_backend(name=None, max_workers=4) -> SummarizerBackend:
+    """
+    Returns a summarization backend.
+
+    Args:
+        name (str, optional): "mistral" (hosted API, or MISTRAL_SERVER_URL) or
+            "extractive" (local TextRank). Defaults to SUMMARY_BACKEND, else "mistral".
+        max_workers (int): Concurrent queries allowed to the Mistral API.
+
+    Raises:
+        ValueError: If the backend is unknown.
+    """
+    name = name or os.getenv("SUMMARY_BACKEND", "mistral")
+    if name == "mistral":
+        return MistralAPI(model=MODEL, rate_limiter=mistral_rate_limiter(max_workers))
+    if name in ("extractive", "textrank"):
+        return ExtractiveSummarizer()
+    raise ValueError(f"Backend de résumé inconnu : {name}")
+
+
+def _retry_after(error):
+    # Délai Retry-After (secondes) de la réponse HTTP attachée à une erreur du SDK
+    response = getattr(error, "raw_response", None)
+    try:
+        return float(response.headers.get("retry-after"))
+    except (AttributeError, TypeError, ValueError):
+        return None
+
+
+@lru_cache(maxsize=None)
+def mistral_rate_limiter(max_workers: int) -> HostRateLimiter:
+    """
+    Returns the limiter shared by the queries to the Mistral API.
+
+    The sustained rate comes from MISTRAL_RATE_LIMIT (requests per second, 1 by
+    default, the limit of the free tier); `max_workers` bounds the concurrent queries.
+    """
+    return HostRateLimiter(
+        default_rate=float(os.getenv("MISTRAL_RATE_LIMIT", 1)),
+        capacity=max_workers,
+        jitter=(0, 0),
+        max_in_flight=max_workers,
+    )
+
+
+@lru_cache(maxsize=None)
+def load_tokenizer(model: str = MODEL):
+    """
+    Returns the tokenizer of a Mistral model, or None if mistral_common is not
+    installed or does not know the model.
+    """
+    if MistralTokenizer is None:
+        return None
+    try:
+        return MistralTokenizer.from_model(model).instruct_tokenizer.tokenizer
+    except Exception as e:
+        print(f"Tokenizer indisponible pour {model}, estimation du nombre de tokens : {e}")
+        return None
+
+
+def count_tokens(text: str, model: str = MODEL) -> int:
+    """
+    Returns the number of tokens of a text for the model (an upper estimate
+    without its tokenizer).
+    """
+    tokenizer = load_tokenizer(model)
+    if tokenizer is None:
+        return ceil(len(text) / CHARS_PER_TOKEN)
+    return len(tokenizer.encode(text, bos=False, eos=False))
+
+
 def split_text(text, max_length):
     """
     Splits the text into chunks of maximum length.
@@ -66,13 +259,203 @@ def split_text(text, max_length):
         yield " ".join(words[i : i + max_length])
 
 
-def generate_summary(id_resto, cle_api_mistral, nb_mois=18):
+def chunk_reviews(reviews, max_tokens, model=MODEL):
+    """
+    Regroupe des avis (ou des résumés partiels) en morceaux d'au plus `max_tokens` tokens.
+
+    Les avis ne sont pas coupés, sauf un avis dépassant à lui seul le budget, découpé
+    par mots. Retourne la liste des morceaux, avis séparés par REVIEW_SEPARATOR.
+    """
+    separator_tokens = count_tokens(REVIEW_SEPARATOR, model)
+    chunks, current, current_tokens = [], [], 0
+    for review in reviews:
+        nb_tokens = count_tokens(review, model)
+        if nb_tokens > max_tokens:
+            # Avis trop long : fenêtres de mots proportionnelles au budget
+            nb_words = max(1, int(len(review.split()) * max_tokens / nb_tokens * 0.9))
+            parts = list(split_text(review, nb_words))
+        else:
+            parts = [review]
+        for part in parts:
+            part_tokens = count_tokens(part, model) if len(parts) > 1 else nb_tokens
+            if current and current_tokens + separator_tokens + part_tokens > max_tokens:
+                chunks.append(REVIEW_SEPARATOR.join(current))
+                current, current_tokens = [], 0
+            current_tokens += part_tokens + (separator_tokens if current else 0)
+            current.append(part)
+    if current:
+        chunks.append(REVIEW_SEPARATOR.join(current))
+    return chunks
+
+
+def summarize_reviews(
+    reviews, backend, chunk_tokens=CHUNK_TOKENS, max_workers=4, temperature=0.1
+):
+    """
+    Résume des avis en map-reduce hiérarchique.
+
+    Les avis sont regroupés en morceaux tenant dans le contexte du modèle, résumés en
+    parallèle (map), puis les résumés partiels sont fusionnés par un appel final
+    (reduce) ; s'ils ne tiennent pas dans un seul appel, ils sont d'abord fusionnés
+    par groupes, en parallèle, autant de fois que nécessaire.
+    Retourne le résumé.
+    """
+    prompt = map_reduce_prompt(reviews, backend, chunk_tokens, max_workers, temperature)
+    return backend.query(prompt, temperature=temperature) if prompt else ""
+
+
+def map_reduce_prompt(
+    reviews, backend, chunk_tokens=CHUNK_TOKENS, max_workers=4, temperature=0.1
+):
+    """
+    Exécute le map-reduce de summarize_reviews jusqu'à son dernier appel, et retourne
+    le prompt de cet appel (None s'il n'y a pas d'avis), pour l'envoyer en streaming.
+    """
+    model = backend.model
+    prompt_tokens = max(count_tokens(SUMMARY_QUERY, model), count_tokens(REDUCE_QUERY, model))
+    # Les fusions peuvent remplir tout le contexte, les morceaux d'avis sont plus petits
+    reduce_budget = MODEL_CONTEXT - OUTPUT_RESERVE - prompt_tokens
+    budget = min(chunk_tokens, reduce_budget)
+
+    def summarize(query, chunk):
+        return backend.query(f"{query} : '{chunk}'", temperature=temperature)
+
+    chunks = chunk_reviews(reviews, budget, model)
+    if len(chunks) <= 1:
+        return f"{SUMMARY_QUERY} : '{chunks[0]}'" if chunks else None
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        summaries = list(executor.map(lambda c: summarize(SUMMARY_QUERY, c), chunks))
+        while True:
+            groups = chunk_reviews(summaries, reduce_budget, model)
+            if len(groups) == 1:
+                return f"{REDUCE_QUERY} : '{groups[0]}'"
+            if len(groups) == len(summaries):
+                raise RuntimeError("Résumés partiels trop longs pour être fusionnés")
+            summaries = list(executor.map(lambda g: summarize(REDUCE_QUERY, g), groups))
+
+
+def summary_digest(avis, model=MODEL):
+    """
+    Returns the SHA-256 of a review set, as (id_avis, contenu_avis) pairs, and of the
+    model and prompts used to summarize it.
+    """
+    digest = hashlib.sha256()
+    for part in (model, SUMMARY_QUERY, REDUCE_QUERY, UPDATE_QUERY):
+        digest.update(part.encode("utf-8") + b"\0")
+    for id_avis, contenu_avis in sorted(avis):
+        digest.update(f"{id_avis}\0{contenu_avis}\0".encode("utf-8"))
+    return digest.hexdigest()
+
+
+def update_summary(summary, reviews, backend, temperature=0.1):
+    """
+    Updates a summary with new reviews in a single query.
+
+    Returns:
+        str: The updated summary, or None if the reviews do not fit in one query.
+    """
+    prompt = update_prompt(summary, reviews, backend)
+    if prompt is None:
+        return None
+    return backend.query(prompt, temperature=temperature)
+
+
+def update_prompt(summary, reviews, backend):
+    """
+    Returns the prompt updating a summary with new reviews, or None if the reviews
+    do not fit in one query.
+    """
+    model = backend.model
+    budget = (
+        MODEL_CONTEXT
+        - OUTPUT_RESERVE
+        - count_tokens(UPDATE_QUERY, model)
+        - count_tokens(summary, model)
+    )
+    chunks = chunk_reviews(reviews, budget, model) if budget > 0 else []
+    if len(chunks) != 1:
+        return None
+    return f"{UPDATE_QUERY} : '{summary}' Nouveaux avis : '{chunks[0]}'"
+
+
+class SummaryStream:
+    """
+    Iterator over the text of a summary as it is generated (see `stream_summary`).
+
+    Attributes:
+        result (tuple): (success, message) as returned by `generate_summary`, set
+            once the iteration is over (None before).
+    """
+
+    def __init__(self, steps) -> None:
+        """
+        Wraps the generator of `_generate_summary`.
+        """
+        self._steps = steps
+        self.result = None
+
+    def __iter__(self):
+        self.result = yield from self._steps
+
+
+def generate_summary(
+    id_resto,
+    cle_api_mistral,
+    nb_mois=18,
+    max_workers=None,
+    db_path=Path("data/friands.db"),
+    backend=None,
+):
+    summary = SummaryStream(
+        _generate_summary(
+            id_resto, cle_api_mistral, nb_mois, max_workers, db_path, backend, stream=False
+        )
+    )
+    for _ in summary:
+        pass
+    return summary.result
+
+
+def stream_summary(
+    id_resto,
+    cle_api_mistral,
+    nb_mois=18,
+    max_workers=None,
+    db_path=Path("data/friands.db"),
+    backend=None,
+):
+    """Version en streaming de generate_summary, pour l'afficher au fil de l'eau.
+
+    Le résumé est produit par morceaux dès les premiers tokens du dernier appel au
+    modèle (les étapes map du map-reduce, s'il y en a, sont faites avant). Il n'est
+    enregistré, avec son empreinte, qu'une fois complet : un flux interrompu ne laisse
+    pas de résumé partiel en base. Le résultat (succès, message) est disponible dans
+    l'attribut `result` une fois le flux parcouru (ex. par st.write_stream).
+    """
+    return SummaryStream(
+        _generate_summary(
+            id_resto, cle_api_mistral, nb_mois, max_workers, db_path, backend, stream=True
+        )
+    )
+
+
+def _generate_summary(
+    id_resto, cle_api_mistral, nb_mois, max_workers, db_path, backend, stream
+):
+    # Nombre de requêtes simultanées vers l'API (MISTRAL_MAX_CONCURRENCY, 4 par défaut)
+    if max_workers is None:
+        max_workers = int(os.getenv("MISTRAL_MAX_CONCURRENCY", 4))
+
     # on passe la clé en environnement
-    os.environ["MISTRAL_API_KEY"] = cle_api_mistral
+    if cle_api_mistral:
+        os.environ["MISTRAL_API_KEY"] = cle_api_mistral
+
+    # Backend de résumé : nom (voir get_backend) ou instance de SummarizerBackend
+    if backend is None or isinstance(backend, str):
+        backend = get_backend(backend, max_workers)
 
     # Récupération des avis depuis la base de données
-    db_path = Path("data/friands.db")
-    bdd = sqlutils(db_path)
+    bdd = sqlutils(db_path, pooled=True)
 
     # Déterminer la date du jour puis la date du jour moins 18 mois
     date_min = pd.Timestamp.now() - pd.DateOffset(months=nb_mois)
@@ -99,7 +482,6 @@ def generate_summary(id_resto, cle_api_mistral, nb_mois=18):
     """
     )
 
-
     if not success:
         return (
             False,
@@ -108,9 +490,16 @@ def generate_summary(id_resto, cle_api_mistral, nb_mois=18):
 
     # Si aucun avis n'est trouvé
     if not t_avis or len(t_avis) == 0:
+        message_none = "Trop peu d'avis ces 18 derniers mois pour générer un résumé fiable."
+        yield message_none
         success, t_update_none = bdd.update(
             table_name="restaurants",
-            data={"summary": "Trop peu d'avis ces 18 derniers mois pour générer un résumé fiable."},
+            data={
+                "summary": message_none,
+                "summary_digest": None,
+                "summary_id_avis": None,
+                "summary_model": None,
+            },
             where=[f"id_restaurant = {id_resto}"],
         )
         if not success:
@@ -142,71 +531,100 @@ def generate_summary(id_resto, cle_api_mistral, nb_mois=18):
             "label",
         ],
     )
-    # joindre tous les avis pour le restaurant
-    df_grouped = (
-        df.groupby("id_restaurant")
-        .agg(
-            {
-                "nom_restaurant": "first",
-                "contenu_avis": lambda x: " --- ".join(x),
-            }
+    avis = [
+        (int(id_avis), contenu_avis)
+        for id_avis, contenu_avis in zip(df["id_avis"], df["contenu_avis"])
+        if contenu_avis
+    ]
+
+    # Résumé précédent : inutile d'appeler l'API si les avis et le prompt n'ont pas changé
+    digest = summary_digest(avis, backend.model)
+    success, t_current = bdd.select(
+        """SELECT summary, summary_digest, summary_id_avis, summary_model
+           FROM restaurants WHERE id_restaurant = ?""",
+        (id_resto,),
+    )
+    if not success:
+        return (
+            False,
+            f"Erreur lors de la lecture du résumé du restaurant {id_resto} : {t_current}",
         )
-        .reset_index()
+    previous_summary, previous_digest, previous_id_avis, previous_model = (
+        t_current[0] if t_current else (None, None, None, None)
     )
+    if digest == previous_digest:
+        yield previous_summary
+        return (True, f"{SUMMARY_UP_TO_DATE} pour le restaurant {id_resto} (avis inchangés)")
 
-    # Application du modèle mistral pour générer le résumé
-    model = "pixtral-large-latest"
-    model_max_length = 131072
-    # Instanciation de la classe MistralAPI
-    model_mistral = MistralAPI(model=model)
-
-    query = "Analyser ces avis de clients concernant un restaurant, puis produire un unique résumé de ces avis, court mais riche d'informations. Ne pas produire de liste de points positifs ou négatifs."
     temperature = 0.1
 
-    for index, row in df_grouped.iterrows():
-
-        reviews = row["contenu_avis"]
-
-        chunks = list(
-            split_text(reviews, model_max_length)
-        )  # Adjust the chunk size as needed
-
-        summaries = []
-
-        for chunk in chunks:
-
-            summary = model_mistral.query(
-                f"{query} : '{chunk}'", temperature=temperature
-            )
-
-            summaries.append(summary)
-
-        full_summary = " ".join(summaries)
-
-        # Ajouter le résumé à df_grouped
-        df_grouped.loc[index, "resume"] = full_summary
-
-    # Updater les résumés dans la base de données
-    for index, row in df_grouped.iterrows():
-
-        success, t_insert = bdd.update(
-            table_name="restaurants",
-            data={"summary": row["resume"]},
-            where=[f"id_restaurant = '{row['id_restaurant']}'"],
+    # Les identifiants d'avis sont croissants : les avis postérieurs au résumé sont nouveaux.
+    # Un résumé d'un autre backend (ex. extractif en attendant le LLM) est refait en entier
+    incremental = (
+        previous_summary
+        and previous_digest
+        and previous_id_avis is not None
+        and previous_model == backend.model
+    )
+    new_reviews = [c for i, c in avis if incremental and i > previous_id_avis]
+    full_summary, prompt = None, None
+    restamped = incremental and not new_reviews
+    if restamped:
+        # Seuls des avis sont sortis de la fenêtre de nb_mois : le résumé reste valable
+        full_summary = previous_summary
+        yield full_summary
+    elif incremental and len(new_reviews) <= INCREMENTAL_MAX_SHARE * len(avis):
+        # Quelques nouveaux avis : mise à jour du résumé existant en un seul appel
+        prompt = update_prompt(previous_summary, new_reviews, backend)
+    if full_summary is None and prompt is None:
+        # Résumé en map-reduce : morceaux découpés selon le tokenizer du modèle
+        prompt = map_reduce_prompt(
+            [c for _, c in avis],
+            backend,
+            max_workers=max_workers,
+            temperature=temperature,
         )
-
-        if not success:
-
-            bdd.rollback()
-            return (
-                False,
-                f"Erreur lors de l'insertion du résumé pour le restaurant {row['id_restaurant']} : {t_insert}",
-            )
-
+    if full_summary is None:
+        # Dernier appel au modèle, transmis au fur et à mesure en streaming
+        if prompt is None:
+            pieces = []
+        elif stream:
+            pieces = backend.stream(prompt, temperature=temperature)
         else:
-            bdd.commit()
-            return (
-                True,
-                f"Résumé inséré pour le restaurant {row['id_restaurant']} ({t_insert})",
-            )
+            pieces = [backend.query(prompt, temperature=temperature)]
+        full_summary = ""
+        for piece in pieces:
+            full_summary += piece
+            yield piece
+
+    # Updater le résumé et son empreinte dans la base de données, une fois complet
+    # (un flux interrompu ne laisse pas de résumé partiel)
+    success, t_insert = bdd.update(
+        table_name="restaurants",
+        data={
+            "summary": full_summary,
+            "summary_digest": digest,
+            "summary_id_avis": max(i for i, _ in avis) if avis else None,
+            "summary_model": backend.model,
+        },
+        where=[f"id_restaurant = {int(id_resto)}"],
+    )
+
+    if not success:
+        bdd.rollback()
+        return (
+            False,
+            f"Erreur lors de l'insertion du résumé pour le restaurant {id_resto} : {t_insert}",
+        )
 
+    bdd.commit()
+    if restamped:
+        # Résumé inchangé, seule son empreinte a été mise à jour
+        return (
+            True,
+            f"{SUMMARY_UP_TO_DATE} pour le restaurant {id_resto} (empreinte mise à jour)",
+        )
+    return (
+        True,
+        f"Résumé inséré pour le restaurant {id_resto} ({t_insert})",
+    )
@@ -0,0 +1,97 @@
+import os
+import tempfile
+import threading
+from datetime import date
+from pathlib import Path
+
+from mock_mistral_server import MockMistralServer
+from schemaDB import schemaDB, indexesDB
+from sqlutils import ConnectionPool, sqlutils
+from summary_generator import MODEL, stream_summary
+
+"""
+Vérifie la génération d'un résumé en streaming (stream_summary) de bout en bout, avec
+le client Mistral et le serveur simulé, sans clé ni réseau.
+
+Exemple (depuis le dossier app) :
+    python summary_stream_test.py
+"""
+
+
+AVIS = [
+    "Accueil chaleureux et service rapide, les plats du jour sont copieux et bien assaisonnés.",
+    "La quenelle de brochet était excellente, sauce nantua onctueuse et portion généreuse.",
+    "Cadre typique de bouchon lyonnais, un peu bruyant le samedi soir mais très convivial.",
+    "Les desserts maison valent le détour, la tarte aux pralines est une vraie réussite.",
+    "Rapport qualité prix correct pour le quartier, la carte des vins est bien choisie.",
+    "Service un peu lent lors de notre visite, mais le serveur était aimable et attentif.",
+]
+
+
+def test_stream_summary_mock():
+    server = MockMistralServer(("127.0.0.1", 0))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    previous_url = os.environ.get("MISTRAL_SERVER_URL")
+    os.environ["MISTRAL_SERVER_URL"] = server.url
+
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            db_path = Path(tmp) / "friands.db"
+            db = sqlutils(db_path)
+            for table in ("restaurants", "avis"):
+                db.create_table(table, schemaDB[table], indexesDB.get(table))
+            success, ids = db.insert(
+                "restaurants",
+                [("Bouchon de test", "https://example.org/bouchon")],
+                column_names=["nom", "url"],
+                returning="id_restaurant",
+            )
+            assert success, ids
+            id_restaurant = ids[0]
+            success, message = db.insert(
+                "avis",
+                [
+                    (id_restaurant, f"client {i}", 4.0, date.today().isoformat(), f"Avis {i}", contenu)
+                    for i, contenu in enumerate(AVIS)
+                ],
+                column_names=[
+                    "id_restaurant",
+                    "nom_utilisateur",
+                    "note_restaurant",
+                    "date_avis",
+                    "titre_avis",
+                    "contenu_avis",
+                ],
+            )
+            assert success, message
+            db.commit()
+            db.close()
+
+            # Résumé reçu morceau par morceau, enregistré une fois complet
+            stream = stream_summary(id_restaurant, "mock", db_path=db_path, backend="mistral")
+            pieces = list(stream)
+            assert stream.result is not None and stream.result[0], stream.result
+            assert len(pieces) > 1, pieces
+
+            db = sqlutils(db_path)
+            success, rows = db.select(
+                "SELECT summary, summary_model FROM restaurants WHERE id_restaurant = ?",
+                (id_restaurant,),
+            )
+            db.close()
+            assert success, rows
+            assert rows[0] == ("".join(pieces), MODEL), rows
+            ConnectionPool.close_all()
+    finally:
+        server.shutdown()
+        server.server_close()
+        if previous_url is None:
+            os.environ.pop("MISTRAL_SERVER_URL", None)
+        else:
+            os.environ["MISTRAL_SERVER_URL"] = previous_url
+
+    print(f"{len(pieces)} morceaux reçus, résumé enregistré : {''.join(pieces)!r}")
+
+
+if __name__ == "__main__":
+    test_stream_summary_mock()
@@ -0,0 +1,75 @@
+import argparse
+import locale
+import sys
+import time
+from pathlib import Path
+
+# Parseurs partagés avec l'application (app/html_parsing.py)
+sys.path.append(str(Path(__file__).resolve().parents[2] / "app"))
+from html_parsing import parse_avis_page_bs4, parse_avis_page_lxml
+
+"""
+Ce script compare les temps d'analyse des pages d'avis TripAdvisor :
+    - bs4 : BeautifulSoup avec html.parser (chemin historique)
+    - bs4+lxml : BeautifulSoup avec l'analyseur lxml
+    - lxml : sélecteurs précompilés et extraction en un seul parcours
+
+Les pages utilisées sont des fichiers HTML sauvegardés (par défaut debug.html).
+Le script vérifie aussi que les parseurs extraient exactement les mêmes avis.
+
+Exemple :
+    python src/utils/benchmark_parsing.py src/utils/debug.html --repeat 20
+"""
+
+# Les dates des avis sont en français ("Rédigé le 12 janvier 2025")
+locale.setlocale(locale.LC_TIME, "fr_FR.UTF-8")
+
+PARSERS = {
+    "bs4": lambda html: parse_avis_page_bs4(html, None),
+    "bs4+lxml": lambda html: parse_avis_page_bs4(html, None, features="lxml"),
+    "lxml": lambda html: parse_avis_page_lxml(html, None),
+}
+
+
+def benchmark(fixtures, repeat):
+    pages = [Path(fixture).read_text(encoding="utf-8") for fixture in fixtures]
+    nb_mo = sum(len(page.encode("utf-8")) for page in pages) / 1e6
+    print(f"{len(pages)} pages ({nb_mo:.1f} Mo), {repeat} répétitions")
+
+    results = {}
+    for name, parser in PARSERS.items():
+        try:
+            start = time.perf_counter()
+            for _ in range(repeat):
+                avis = [parser(page) for page in pages]
+            elapsed = (time.perf_counter() - start) / repeat
+        except ImportError as e:
+            print(f"{name:>10} : ignoré ({e})")
+            continue
+        results[name] = avis
+        nb_avis = sum(len(page_avis) for page_avis in avis)
+        print(
+            f"{name:>10} : {elapsed * 1000:8.1f} ms par passage, "
+            f"{elapsed * 1e6 / max(nb_avis, 1):8.1f} µs par avis ({nb_avis} avis)"
+        )
+
+    # Les parseurs doivent être interchangeables
+    reference = results.get("bs4")
+    for name, avis in results.items():
+        if reference is not None and avis != reference:
+            print(f"ATTENTION : {name} n'extrait pas les mêmes avis que bs4")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Compare les parseurs de pages d'avis TripAdvisor"
+    )
+    parser.add_argument(
+        "fixtures",
+        nargs="*",
+        default=[Path(__file__).resolve().parent / "debug.html"],
+        help="Pages HTML sauvegardées",
+    )
+    parser.add_argument("--repeat", type=int, default=10)
+    args = parser.parse_args()
+    benchmark(args.fixtures, args.repeat)
@@ -0,0 +1,152 @@
+import gc
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from schemaDB import schemaDB, indexesDB
+from sqlutils import ConnectionPool, sqlutils
+
+"""
+Vérifie le pool de connexions de sqlutils : écritures concurrentes sérialisées, délai
+d'attente de la connexion d'écriture, deux instances dans un même thread et instance
+détruite sans commit.
+
+Exemple (depuis le dossier src/utils) :
+    python connection_pool_test.py
+"""
+
+
+def new_db(tmp, timeout=30.0):
+    """Base vide avec la table restaurants, et le pool partagé réglé sur `timeout`."""
+    db_path = Path(tmp) / "friands.db"
+    db = sqlutils(db_path)
+    db.create_table("restaurants", schemaDB["restaurants"], indexesDB["restaurants"])
+    db.close()
+    ConnectionPool.get(db_path).timeout = timeout
+    return db_path
+
+
+def count_restaurants(db_path):
+    db = sqlutils(db_path)
+    success, rows = db.select("SELECT COUNT(*) FROM restaurants")
+    db.close()
+    assert success, rows
+    return rows[0][0]
+
+
+def insert_restaurant(db, url):
+    return db.insert("restaurants", [("Restaurant", url)], column_names=["nom", "url"])
+
+
+def test_concurrent_writers():
+    # Chaque thread écrit par sa propre instance : les transactions se suivent
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = new_db(tmp)
+        errors = []
+
+        def write(i):
+            db = sqlutils(db_path, pooled=True)
+            for j in range(20):
+                success, message = insert_restaurant(db, f"https://example.org/{i}/{j}")
+                if not success:
+                    errors.append(message)
+            time.sleep(0.01)
+            db.commit()
+
+        threads = [threading.Thread(target=write, args=(i,)) for i in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        ConnectionPool.close_all()
+
+        assert not errors, errors
+        assert count_restaurants(db_path) == 8 * 20
+
+
+def test_writer_timeout():
+    # La connexion d'écriture reste prise par un autre thread au-delà du délai
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = new_db(tmp, timeout=0.2)
+        holding, done = threading.Event(), threading.Event()
+
+        def hold():
+            db = sqlutils(db_path, pooled=True)
+            insert_restaurant(db, "https://example.org/attente")
+            holding.set()
+            done.wait(5)
+            db.commit()
+
+        thread = threading.Thread(target=hold)
+        thread.start()
+        holding.wait(5)
+
+        db = sqlutils(db_path, pooled=True)
+        start = time.perf_counter()
+        success, message = insert_restaurant(db, "https://example.org/refus")
+        waited = time.perf_counter() - start
+        assert not success and "database is locked" in message, message
+        assert 0.15 <= waited < 2, waited
+
+        # Une fois la connexion libérée, l'écriture passe
+        done.set()
+        thread.join()
+        success, message = insert_restaurant(db, "https://example.org/refus")
+        assert success, message
+        db.commit()
+        ConnectionPool.close_all()
+
+        assert count_restaurants(db_path) == 2
+
+
+def test_same_thread_instances():
+    # Une seconde instance du même thread échoue tout de suite au lieu d'attendre
+    # indéfiniment, et n'annule pas les écritures de la première
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = new_db(tmp)
+        first = sqlutils(db_path, pooled=True)
+        second = sqlutils(db_path, pooled=True)
+
+        success, message = insert_restaurant(first, "https://example.org/premier")
+        assert success, message
+        start = time.perf_counter()
+        success, message = insert_restaurant(second, "https://example.org/second")
+        assert not success and "another instance" in message, message
+        assert time.perf_counter() - start < 1
+
+        second.rollback()
+        first.commit()
+        success, message = insert_restaurant(second, "https://example.org/second")
+        assert success, message
+        second.commit()
+        ConnectionPool.close_all()
+
+        assert count_restaurants(db_path) == 2
+
+
+def test_garbage_collected_instance():
+    # Une instance détruite sans commit annule ses écritures et libère la connexion
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = new_db(tmp)
+        db = sqlutils(db_path, pooled=True)
+        success, message = insert_restaurant(db, "https://example.org/abandon")
+        assert success, message
+        del db
+        gc.collect()
+
+        db = sqlutils(db_path, pooled=True)
+        success, message = insert_restaurant(db, "https://example.org/suivant")
+        assert success, message
+        db.commit()
+        ConnectionPool.close_all()
+
+        assert count_restaurants(db_path) == 1
+
+
+if __name__ == "__main__":
+    test_concurrent_writers()
+    test_writer_timeout()
+    test_same_thread_instances()
+    test_garbage_collected_instance()
+    print("Pool de connexions : tous les tests passent")
@@ -0,0 +1,91 @@
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# Modules de l'application (app/)
+sys.path.append(str(Path(__file__).resolve().parents[2] / "app"))
+from geo_cache import GeoCache, bounding_box, distances, geohash, tile_bbox, tiles_covering
+
+"""
+Vérifie le cache géographique : geohash et tuiles, cache du géocodage par adresse
+normalisée, et comptage local des points d'intérêt autour d'un restaurant.
+
+Exemple (depuis le dossier src/utils) :
+    python geo_cache_test.py
+"""
+
+
+# Place Bellecour, Lyon
+LAT, LON = 45.7578, 4.8320
+
+
+def test_geohash():
+    # Valeur de référence de la définition du geohash
+    assert geohash(57.64911, 10.40744, 11) == "u4pruydqqvj"
+    tile = geohash(LAT, LON)
+    assert len(tile) == 6 and tile.startswith("u05k"), tile
+
+    south, west, north, east = tile_bbox(tile)
+    assert south <= LAT < north and west <= LON < east
+    assert geohash(south + 1e-9, west + 1e-9) == tile
+
+    # Les tuiles couvrent tout le cercle : ses bords et son centre
+    bbox = bounding_box(LAT, LON, 500)
+    tiles = tiles_covering(bbox)
+    assert tile in tiles and len(tiles) == len(set(tiles))
+    for lat, lon in [(bbox[0], bbox[1]), (bbox[2], bbox[3]), (bbox[0], bbox[3])]:
+        assert geohash(lat, lon) in tiles
+
+    # 0,001 degré de latitude : environ 111 m
+    assert abs(distances(LAT, LON, [(LAT + 0.001, LON)])[0] - 111.2) < 0.5
+
+
+def test_coordinates():
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = GeoCache(Path(tmp) / "geo_cache.db", ttl=0.2)
+        assert cache.get_coordinates("Place Bellecour, Lyon") is None
+        cache.store_coordinates("Place Bellecour, Lyon", LAT, LON)
+        # Casse, accents et ponctuation ignorés
+        assert cache.get_coordinates("  place  bellecour LYON ") == (LAT, LON)
+        assert cache.get_coordinates("Plâce Bellecour - Lyon") == (LAT, LON)
+        time.sleep(0.25)
+        assert cache.get_coordinates("Place Bellecour, Lyon") is None
+        cache.close()
+
+
+def test_count_nearby():
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = GeoCache(Path(tmp) / "geo_cache.db")
+        tiles = cache.missing_tiles(LAT, LON, 500)
+        assert tiles == cache.tiles(LAT, LON, 500)
+        elements = [
+            # À 111 m : comptés
+            {"type": "node", "id": 1, "lat": LAT + 0.001, "lon": LON, "tags": {"amenity": "restaurant"}},
+            {"type": "node", "id": 2, "lat": LAT, "lon": LON + 0.001, "tags": {"highway": "bus_stop"}},
+            # Chemin : coordonnées de son centre
+            {"type": "way", "id": 3, "center": {"lat": LAT - 0.002, "lon": LON}, "tags": {"amenity": "restaurant"}},
+            # Dans une tuile couverte mais à plus de 500 m
+            {"type": "node", "id": 4, "lat": LAT + 0.0055, "lon": LON, "tags": {"amenity": "restaurant"}},
+            # Hors des tuiles demandées, ou sans coordonnées : ignorés
+            {"type": "node", "id": 5, "lat": LAT + 0.1, "lon": LON, "tags": {"amenity": "restaurant"}},
+            {"type": "relation", "id": 6, "tags": {"amenity": "restaurant"}},
+        ]
+        assert geohash(LAT + 0.0055, LON) in tiles
+        assert cache.store_tiles(tiles, elements) == 4
+
+        assert cache.missing_tiles(LAT, LON, 500) == []
+        assert cache.count_nearby(LAT, LON, 500) == (2, 1)
+        assert cache.count_nearby(LAT, LON, 150) == (1, 1)
+
+        # Une tuile rechargée remplace ses anciens points
+        cache.store_tiles([geohash(LAT, LON + 0.001)], [])
+        assert cache.count_nearby(LAT, LON, 500)[1] == 0
+        cache.close()
+
+
+if __name__ == "__main__":
+    test_geohash()
+    test_coordinates()
+    test_count_nearby()
+    print("Cache géographique : tous les tests passent")
@@ -0,0 +1,94 @@
+import locale
+import os
+import sys
+from pathlib import Path
+
+# Parseurs partagés avec l'application (app/html_parsing.py)
+sys.path.append(str(Path(__file__).resolve().parents[2] / "app"))
+from html_parsing import parse_avis_page, parse_avis_page_bs4, parse_avis_page_lxml
+
+"""
+Vérifie que les parseurs des pages d'avis TripAdvisor (bs4 et lxml) extraient
+exactement les mêmes avis, sur la page sauvegardée debug.html et sur une page
+construite pour leurs cas limites.
+
+Exemple (depuis le dossier src/utils) :
+    python html_parsing_test.py
+"""
+
+# Les dates des avis sont en français ("Rédigé le 12 janvier 2025")
+locale.setlocale(locale.LC_TIME, "fr_FR.UTF-8")
+
+DEBUG_HTML = Path(__file__).resolve().parent / "debug.html"
+
+AVIS_HTML = """
+<html><body>
+<div class="_c">
+  <span class="biGQs _P fiohW fOtGX">Marie L</span>
+  <svg class="UctUV d H0"><title>4,0 sur 5 bulles</title></svg>
+  <div class="biGQs _P fiohW qWPrE ncFvv fOtGX">Très “bon” bouchon !</div>
+  <div class="biGQs _P pZUbB ncFvv osNWb">Rédigé le 3 mars 2024</div>
+  <span class="JguWG">Quenelle   excellente, <b>service</b> rapide.</span>
+  <span class="JguWG">Second bloc ignoré</span>
+</div>
+<div class="x _c">
+  <span class="biGQs _P fiohW fOtGX extra">Classe différente : ignorée</span>
+  <svg class="UctUV"></svg>
+  <div class="biGQs _P pZUbB ncFvv osNWb">Rédigé le 15 décembre 2023</div>
+</div>
+</body></html>
+"""
+
+
+def test_debug_page():
+    html = DEBUG_HTML.read_text(encoding="utf-8")
+    reference = parse_avis_page_bs4(html, 1)
+    assert reference, "aucun avis extrait de debug.html"
+    assert parse_avis_page_lxml(html, 1) == reference
+    assert parse_avis_page_bs4(html, 1, features="lxml") == reference
+    for avis in reference:
+        assert avis["id_restaurant"] == 1
+        assert len(avis["date_avis"]) == 10 and avis["date_avis"][4] == "-", avis
+        assert avis["note_restaurant"] is None or 1 <= avis["note_restaurant"] <= 5, avis
+
+
+def test_edge_cases():
+    avis = parse_avis_page_bs4(AVIS_HTML, 7)
+    assert parse_avis_page_lxml(AVIS_HTML, 7) == avis
+    assert avis == [
+        {
+            "id_restaurant": 7,
+            "nom_utilisateur": "Marie L",
+            "note_restaurant": 4.0,
+            "date_avis": "2024-03-03",
+            "titre_avis": "Très bon bouchon",
+            "contenu_avis": "Quenelle excellente, service rapide.",
+        },
+        {
+            "id_restaurant": 7,
+            "nom_utilisateur": "Anonyme",
+            "note_restaurant": None,
+            "date_avis": "2023-12-15",
+            "titre_avis": "Titre non disponible",
+            "contenu_avis": "Contenu non disponible",
+        },
+    ], avis
+
+
+def test_backend_choice():
+    previous = os.environ.get("SCRAPING_PARSER")
+    try:
+        os.environ["SCRAPING_PARSER"] = "bs4"
+        assert parse_avis_page(AVIS_HTML, 7) == parse_avis_page(AVIS_HTML, 7, backend="lxml")
+    finally:
+        if previous is None:
+            os.environ.pop("SCRAPING_PARSER", None)
+        else:
+            os.environ["SCRAPING_PARSER"] = previous
+
+
+if __name__ == "__main__":
+    test_debug_page()
+    test_edge_cases()
+    test_backend_choice()
+    print("Parseurs des pages d'avis : tous les tests passent")
@@ -0,0 +1,108 @@
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# Modules de l'application (app/)
+sys.path.append(str(Path(__file__).resolve().parents[2] / "app"))
+from http_cache import ResponseCache
+from rate_limiter import HostRateLimiter
+from scraping_client import CacheMiss, ScrapingClient
+
+"""
+Vérifie le cache disque des réponses HTTP (ResponseCache) : durée de fraîcheur,
+éviction par âge et par taille (LRU), corps identiques stockés une fois, et rejeu
+hors ligne par le ScrapingClient.
+
+Exemple (depuis le dossier src/utils) :
+    python http_cache_test.py
+"""
+
+
+HEADERS = {"Content-Type": "text/html; charset=utf-8", "ETag": '"v1"', "Set-Cookie": "x"}
+
+
+def test_ttl():
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = ResponseCache(Path(tmp), ttl=0.2, max_age=0.5)
+        assert cache.get("https://example.org/a") is None
+        cache.put("https://example.org/a", 200, HEADERS, b"<html>a</html>")
+
+        cached = cache.get("https://example.org/a")
+        assert cached["fresh"] and cached["content"] == b"<html>a</html>", cached
+        # Seuls les en-têtes utiles sont conservés
+        assert cached["headers"] == {"Content-Type": HEADERS["Content-Type"], "ETag": '"v1"'}
+
+        # Périmée après `ttl`, de nouveau fraîche après une réponse 304
+        time.sleep(0.25)
+        assert not cache.get("https://example.org/a")["fresh"]
+        cache.touch("https://example.org/a")
+        assert cache.get("https://example.org/a")["fresh"]
+
+        # Supprimée après `max_age`, avec son corps
+        time.sleep(0.55)
+        assert cache.evict() == 1
+        assert cache.get("https://example.org/a") is None
+        assert cache.size() == 0 and not list((Path(tmp) / "objects").rglob("*.gz"))
+        cache.close()
+
+
+def test_lru_eviction():
+    with tempfile.TemporaryDirectory() as tmp:
+        # Corps aléatoires : incompressibles, environ 10 Kio chacun une fois compressés
+        cache = ResponseCache(Path(tmp), max_bytes=35 * 1024)
+        bodies = {name: os.urandom(10 * 1024) for name in "abc"}
+        for name, body in bodies.items():
+            cache.put(f"https://example.org/{name}", 200, HEADERS, body)
+            time.sleep(0.01)
+        # Un corps identique sous une autre URL n'est stocké qu'une fois
+        cache.put("https://example.org/copie-a", 200, HEADERS, bodies["a"])
+        assert cache.size() < 35 * 1024
+
+        # "a" est relue : "b", la moins récemment utilisée, part en premier
+        time.sleep(0.01)
+        cache.get("https://example.org/a")
+        cache.get("https://example.org/copie-a")
+        time.sleep(0.01)
+        cache.put("https://example.org/d", 200, HEADERS, os.urandom(10 * 1024))
+
+        assert cache.get("https://example.org/b") is None
+        for name in ("a", "copie-a", "c", "d"):
+            assert cache.get(f"https://example.org/{name}") is not None, name
+        assert cache.size() <= 35 * 1024
+        cache.close()
+
+
+def test_replay():
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = ResponseCache(Path(tmp), ttl=0)
+        url = "https://example.org/Restaurant_Review.html"
+        cache.put(ScrapingClient.full_url(url, {"page": 2}), 200, HEADERS, "<p>café</p>".encode())
+        client = ScrapingClient(HostRateLimiter(jitter=(0, 0)), cache=cache)
+
+        # Hors ligne, même une entrée périmée est servie, sans requête
+        with client.replay():
+            response = client.get(url, params={"page": 2})
+            assert response.from_cache and response.text == "<p>café</p>", response.text
+            try:
+                client.get(url, params={"page": 3})
+                raise AssertionError("URL absente du cache servie en mode rejeu")
+            except CacheMiss:
+                pass
+        assert not client.offline
+        assert client.stats()["nb_requests"] == 0 and client.stats()["nb_cache_hits"] == 1
+
+        try:
+            with ScrapingClient(HostRateLimiter()).replay():
+                raise AssertionError("mode rejeu sans cache")
+        except ValueError:
+            pass
+        client.close()
+
+
+if __name__ == "__main__":
+    test_ttl()
+    test_lru_eviction()
+    test_replay()
+    print("Cache des réponses HTTP : tous les tests passent")
@@ -0,0 +1,127 @@
+import json
+import sys
+import tempfile
+from pathlib import Path
+
+import pandas as pd
+
+# Modules de l'application (app/)
+sys.path.append(str(Path(__file__).resolve().parents[2] / "app"))
+from poi_index import count_nearby_pois, import_pois, read_geojson, recompute_geo_counts
+from schemaDB import schemaDB, indexesDB
+from sqlutils import sqlutils
+
+"""
+Vérifie l'index local des points d'intérêt OSM : lecture d'un export GeoJSON, import
+dans la table pois et son R*Tree, et comptes restaurant_density / transport_count
+recalculés pour la table geographie.
+
+Exemple (depuis le dossier src/utils) :
+    python poi_index_test.py
+"""
+
+
+# Place Bellecour, Lyon ; 0,001 degré de latitude : environ 111 m
+LAT, LON = 45.7578, 4.8320
+
+
+def point(lat, lon, properties, feature_id=None):
+    feature = {
+        "type": "Feature",
+        "properties": properties,
+        "geometry": {"type": "Point", "coordinates": [lon, lat]},
+    }
+    if feature_id is not None:
+        feature["id"] = feature_id
+    return feature
+
+
+def write_geojson(path, features):
+    data = {"type": "FeatureCollection", "features": features}
+    path.write_text(json.dumps(data), encoding="utf-8")
+    return path
+
+
+FEATURES = [
+    point(LAT + 0.001, LON, {"@id": "node/1", "amenity": "restaurant"}),
+    point(LAT + 0.002, LON, {"tags": {"amenity": "restaurant"}}, feature_id="node/2"),
+    point(LAT - 0.003, LON, {"id": "node/3", "highway": "bus_stop"}),
+    point(LAT + 0.006, LON, {"@id": "node/4", "railway": "station"}),
+    # Sans identifiant : une clé par position, pas un seul objet "None"
+    point(LAT, LON + 0.001, {"amenity": "subway"}),
+    point(LAT, LON - 0.001, {"amenity": "subway"}),
+    # Ni restaurant ni transport : ignoré
+    point(LAT, LON, {"@id": "node/7", "amenity": "bench"}),
+    # Bâtiment : centre de ses sommets
+    {
+        "type": "Feature",
+        "properties": {"@id": "way/8", "amenity": "restaurant"},
+        "geometry": {
+            "type": "Polygon",
+            "coordinates": [
+                [
+                    [LON - 0.0001, LAT - 0.0011],
+                    [LON + 0.0001, LAT - 0.0011],
+                    [LON + 0.0001, LAT - 0.0009],
+                    [LON - 0.0001, LAT - 0.0009],
+                ]
+            ],
+        },
+    },
+]
+
+
+def test_read_geojson():
+    with tempfile.TemporaryDirectory() as tmp:
+        pois = read_geojson(write_geojson(Path(tmp) / "lyon.geojson", FEATURES))
+        ids = [p[0] for p in pois]
+        assert len(pois) == 7 and len(set(ids)) == 7, pois
+        assert ids[:4] == ["node/1", "node/2", "node/3", "node/4"], ids
+        assert ids[4].startswith("transport/") and ids[4] != ids[5], ids
+        osm_id, kind, lat, lon = pois[-1]
+        assert (osm_id, kind) == ("way/8", "restaurant")
+        assert abs(lat - (LAT - 0.001)) < 1e-9 and abs(lon - LON) < 1e-9
+
+        # Un nouvel export donne les mêmes clés aux objets sans identifiant
+        assert read_geojson(write_geojson(Path(tmp) / "bis.geojson", FEATURES)) == pois
+
+
+def test_counts():
+    with tempfile.TemporaryDirectory() as tmp:
+        db = sqlutils(Path(tmp) / "friands.db")
+        db.create_table("geographie", schemaDB["geographie"], indexesDB["geographie"])
+        db.insert(
+            "geographie",
+            [(1, LAT, LON), (2, LAT + 0.006, LON), (3, None, None)],
+            column_names=["id_restaurant", "latitude", "longitude"],
+        )
+        db.commit()
+
+        geojson = write_geojson(Path(tmp) / "lyon.geojson", FEATURES)
+        success, message = import_pois(db, geojson)
+        assert success and message.startswith("7 points d'intérêt ajoutés, 0 mis à jour"), message
+        # Réimport : les objets sont mis à jour, pas dupliqués
+        success, message = import_pois(db, geojson)
+        assert success and message.startswith("0 points d'intérêt ajoutés, 7 mis à jour"), message
+        assert db.select("SELECT COUNT(*) FROM pois_rtree")[1] == [(7,)]
+
+        points = pd.DataFrame({"latitude": [LAT, LAT, None], "longitude": [LON, LON + 1, None]})
+        counts = count_nearby_pois(db, points, 500)
+        assert counts.values.tolist() == [[3, 3], [0, 0]], counts
+        assert counts.index.tolist() == [0, 1]
+        counts = count_nearby_pois(db, points, 150)
+        assert counts.values.tolist() == [[2, 2], [0, 0]], counts
+
+        success, message = recompute_geo_counts(db, 500)
+        assert success, message
+        assert db.select(
+            """SELECT id_restaurant, restaurant_density, transport_count
+               FROM geographie ORDER BY id_restaurant"""
+        )[1] == [(1, 3, 3), (2, 1, 1), (3, None, None)]
+        db.close()
+
+
+if __name__ == "__main__":
+    test_read_geojson()
+    test_counts()
+    print("Index des points d'intérêt : tous les tests passent")
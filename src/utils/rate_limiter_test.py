@@ -0,0 +1,117 @@
+import asyncio
+import sys
+import threading
+import time
+from pathlib import Path
+
+# Modules de l'application (app/)
+sys.path.append(str(Path(__file__).resolve().parents[2] / "app"))
+from rate_limiter import BudgetExceeded, HostRateLimiter, TokenBucket
+
+"""
+Vérifie les règles de politesse du scraping : débit et rafale d'un TokenBucket,
+ralentissement et réaccélération, buckets par hôte, budget de requêtes et plafond de
+requêtes simultanées partagé entre threads et boucle asyncio (HostRateLimiter).
+
+Exemple (depuis le dossier src/utils) :
+    python rate_limiter_test.py
+"""
+
+
+def test_token_bucket():
+    # Rafale de `capacity` jetons, puis un jeton tous les 1 / rate secondes
+    bucket = TokenBucket(rate=10, capacity=2)
+    delays = [bucket.reserve() for _ in range(4)]
+    assert delays[:2] == [0.0, 0.0], delays
+    assert abs(delays[2] - 0.1) < 0.02 and abs(delays[3] - 0.2) < 0.02, delays
+
+    # 429 : débit divisé par deux et aucune requête pendant Retry-After
+    bucket = TokenBucket(rate=10, capacity=2)
+    bucket.slow_down(pause=0.5)
+    assert bucket.rate == 5
+    assert bucket.reserve() >= 0.5
+
+    # Réaccélération progressive, jamais au-delà du débit configuré
+    for _ in range(10):
+        bucket.speed_up(max_rate=10, step=1)
+    assert bucket.rate == 10
+    bucket.slow_down(factor=0.001, min_rate=0.02)
+    assert bucket.rate == 0.02
+
+
+def test_host_buckets():
+    limiter = HostRateLimiter(
+        default_rate=1, rates={"nominatim.openstreetmap.org": 0.5}, jitter=(0, 0)
+    )
+    ta = limiter.bucket("https://www.tripadvisor.fr/Restaurant_Review-1.html")
+    assert ta is limiter.bucket("https://www.tripadvisor.fr/Restaurant_Review-2.html")
+    assert limiter.bucket("https://nominatim.openstreetmap.org/search").rate == 0.5
+
+    # Un hôte ralenti ne freine pas les autres, et revient vers son débit configuré
+    limiter.slow_down("https://www.tripadvisor.fr/a", retry_after=1)
+    assert ta.rate == 0.5
+    assert limiter.bucket("https://overpass-api.de/api/interpreter").rate == 1
+    limiter.speed_up("https://www.tripadvisor.fr/a")
+    assert abs(ta.rate - 0.6) < 1e-9, ta.rate
+
+
+def test_budget():
+    limiter = HostRateLimiter(default_rate=1000, capacity=10, jitter=(0, 0), budget=3)
+    for _ in range(3):
+        with limiter.slot("https://example.org/"):
+            pass
+    try:
+        with limiter.slot("https://example.org/"):
+            raise AssertionError("budget dépassé sans erreur")
+    except BudgetExceeded:
+        pass
+    assert limiter.nb_requests == 3
+
+
+def test_shared_in_flight_cap():
+    # Threads (slot) et coroutines (async_slot) partagent le même plafond
+    limiter = HostRateLimiter(default_rate=1000, capacity=100, jitter=(0, 0), max_in_flight=2)
+    lock = threading.Lock()
+    in_flight, peak = [0], [0]
+
+    def enter():
+        with lock:
+            in_flight[0] += 1
+            peak[0] = max(peak[0], in_flight[0])
+
+    def leave():
+        with lock:
+            in_flight[0] -= 1
+
+    def blocking_request():
+        with limiter.slot("https://example.org/"):
+            enter()
+            time.sleep(0.05)
+            leave()
+
+    async def async_request():
+        async with limiter.async_slot("https://example.org/"):
+            enter()
+            await asyncio.sleep(0.05)
+            leave()
+
+    async def main():
+        await asyncio.gather(*(async_request() for _ in range(4)))
+
+    threads = [threading.Thread(target=blocking_request) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    asyncio.run(main())
+    for thread in threads:
+        thread.join()
+
+    assert peak[0] == 2, peak
+    assert limiter.nb_requests == 8
+
+
+if __name__ == "__main__":
+    test_token_bucket()
+    test_host_buckets()
+    test_budget()
+    test_shared_in_flight_cap()
+    print("Limiteur de débit : tous les tests passent")
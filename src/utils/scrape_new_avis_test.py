@@ -0,0 +1,155 @@
+import os
+import sys
+import tempfile
+from contextlib import contextmanager
+from pathlib import Path
+
+import requests
+
+# Modules de l'application (app/), en tête : src/utils/scraping.py en est une ancienne copie
+sys.path.insert(0, str(Path(__file__).resolve().parents[2] / "app"))
+# Pas de cache disque des réponses : les pages sont simulées
+os.environ["SCRAPING_CACHE_DIR"] = "off"
+import scraping
+from schemaDB import schemaDB, indexesDB
+from sqlutils import sqlutils
+
+"""
+Vérifie la règle d'arrêt de la mise à jour incrémentale des avis (scrape_new_avis) et
+l'enregistrement des nouveaux avis et du total affiché (update_restaurant_avis), avec
+des pages simulées, sans réseau.
+
+Exemple (depuis le dossier src/utils) :
+    python scrape_new_avis_test.py
+"""
+
+
+URL = "https://www.tripadvisor.fr/Restaurant_Review-g187265-d1-Bouchon-Lyon"
+
+
+class Response:
+    status_code = 200
+
+    def __init__(self, url):
+        self.text = url
+
+
+def avis(user, date="2024-05-01"):
+    return {
+        "id_restaurant": 1,
+        "nom_utilisateur": user,
+        "note_restaurant": 4.0,
+        "date_avis": date,
+        "titre_avis": f"Avis de {user}",
+        "contenu_avis": "Très bon",
+    }
+
+
+@contextmanager
+def fake_pages(pages, total_comments=120, error_at=None):
+    """Remplace le téléchargement et l'analyse des pages d'avis de `scraping`.
+
+    `pages` liste les avis de chaque page ; les appels à fetch sont enregistrés.
+    """
+    calls = []
+
+    def fetch(url, max_age=None):
+        page_num = int(url.rsplit("-or", 1)[1]) // 15
+        calls.append((page_num, max_age))
+        if page_num == error_at:
+            raise requests.exceptions.ConnectionError("connexion refusée")
+        return Response(url)
+
+    def parse_avis_pages(urls, responses, id_restaurant):
+        page_num = int(urls[0].rsplit("-or", 1)[1]) // 15
+        return list(pages[page_num]) if page_num < len(pages) else []
+
+    def parse_restaurant_info(html, restaurant_url):
+        return {"total_comments": total_comments}
+
+    patched = {
+        "fetch": fetch,
+        "parse_avis_pages": parse_avis_pages,
+        "parse_restaurant_info": parse_restaurant_info,
+    }
+    originals = {name: getattr(scraping, name) for name in patched}
+    for name, function in patched.items():
+        setattr(scraping, name, function)
+    try:
+        yield calls
+    finally:
+        for name, function in originals.items():
+            setattr(scraping, name, function)
+
+
+def keys(*users):
+    return {scraping.avis_key(avis(user)) for user in users}
+
+
+def test_stop_rule():
+    # Un nouvel avis peut suivre un avis connu : seule une page entièrement connue arrête
+    pages = [
+        [avis("nouveau 1"), avis("connu 1")],
+        [avis("connu 2"), avis("nouveau 2")],
+        [avis("connu 3"), avis("connu 4")],
+        [avis("jamais lu")],
+    ]
+    with fake_pages(pages) as calls:
+        new_avis, nb_pages, total = scraping.scrape_new_avis(
+            URL, 1, keys("connu 1", "connu 2", "connu 3", "connu 4")
+        )
+    assert [a["nom_utilisateur"] for a in new_avis] == ["nouveau 1", "nouveau 2"], new_avis
+    assert (nb_pages, total) == (3, 120)
+    # Seule la première page est revalidée auprès du serveur
+    assert calls == [(0, 0), (1, None), (2, None)], calls
+
+
+def test_stop_on_empty_or_error():
+    # Un avis répété d'une page à l'autre n'est compté qu'une fois
+    pages = [[avis("a"), avis("b")], [avis("b"), avis("c")]]
+    with fake_pages(pages, total_comments=0):
+        new_avis, nb_pages, total = scraping.scrape_new_avis(URL, 1, set())
+    assert [a["nom_utilisateur"] for a in new_avis] == ["a", "b", "c"]
+    assert (nb_pages, total) == (3, None)
+
+    with fake_pages(pages, error_at=1):
+        new_avis, nb_pages, total = scraping.scrape_new_avis(URL, 1, set())
+    assert len(new_avis) == 2 and (nb_pages, total) == (1, 120)
+
+    with fake_pages([[avis(f"p{i}")] for i in range(10)]) as calls:
+        new_avis, nb_pages, _ = scraping.scrape_new_avis(URL, 1, set(), max_pages=4)
+    assert len(new_avis) == 4 and nb_pages == 4 and len(calls) == 4
+
+
+def test_update_restaurant_avis():
+    with tempfile.TemporaryDirectory() as tmp:
+        db = sqlutils(Path(tmp) / "friands.db")
+        for table in ("restaurants", "avis"):
+            db.create_table(table, schemaDB[table], indexesDB[table])
+        db.insert("restaurants", [("Bouchon", 100, URL)], ["nom", "total_comments", "url"])
+        known = avis("connu")
+        db.insert("avis", [tuple(known.values())], scraping.COLAVIS[1:])
+        db.commit()
+
+        # Le total affiché par la page est enregistré tel quel
+        with fake_pages([[avis("nouveau"), known], [known]], total_comments=130):
+            success, result = scraping.update_restaurant_avis(URL, db)
+        assert success and result == (1, 1), result
+        assert db.select("SELECT total_comments FROM restaurants")[1] == [(130,)]
+
+        # Sans total affiché : ancien total plus les avis ajoutés
+        with fake_pages([[avis("autre")], [known]], total_comments=0):
+            success, result = scraping.update_restaurant_avis(URL, db)
+        assert success and result == (1, 1), result
+        assert db.select("SELECT total_comments FROM restaurants")[1] == [(131,)]
+        assert db.select("SELECT COUNT(*) FROM avis")[1] == [(3,)]
+
+        assert not scraping.update_restaurant_avis(f"{URL}-inconnu", db)[0]
+        db.close()
+
+
+if __name__ == "__main__":
+    test_stop_rule()
+    test_stop_on_empty_or_error()
+    test_update_restaurant_avis()
+    print("Mise à jour incrémentale des avis : tous les tests passent")
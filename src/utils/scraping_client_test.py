@@ -0,0 +1,150 @@
+import sys
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+# Modules de l'application (app/)
+sys.path.append(str(Path(__file__).resolve().parents[2] / "app"))
+from http_cache import ResponseCache
+from rate_limiter import HostRateLimiter
+from scraping_client import ScrapingClient, retry_after_seconds
+
+"""
+Vérifie le client HTTP du scraping contre un serveur local : requêtes conditionnelles
+(ETag, réponse 304 servie avec le corps connu), nouveaux essais sur 429/503 sous les
+limites du HostRateLimiter, et Retry-After.
+
+Exemple (depuis le dossier src/utils) :
+    python scraping_client_test.py
+"""
+
+
+PAGE = "<html><body>Bouchon lyonnais</body></html>".encode()
+
+
+class Handler(BaseHTTPRequestHandler):
+    # Réponses successives de /instable, consommées dans l'ordre
+    flaky = []
+    requests = []
+
+    def do_GET(self):
+        Handler.requests.append((self.path, self.headers.get("If-None-Match")))
+        if self.path.startswith("/instable") and Handler.flaky:
+            status, retry_after = Handler.flaky.pop(0)
+            self.send_response(status)
+            self.send_header("Retry-After", retry_after)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        if self.headers.get("If-None-Match") == '"v1"':
+            self.send_response(304)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("ETag", '"v1"')
+        self.send_header("Content-Length", str(len(PAGE)))
+        self.end_headers()
+        self.wfile.write(PAGE)
+
+    def log_message(self, *args):
+        pass
+
+
+def start_server():
+    Handler.flaky, Handler.requests = [], []
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}"
+
+
+def new_client(**kwargs):
+    return ScrapingClient(
+        HostRateLimiter(default_rate=100, capacity=10, jitter=(0, 0)),
+        backoff_factor=0.01,
+        **kwargs,
+    )
+
+
+def test_conditional_get():
+    server, base = start_server()
+    client = new_client()
+    try:
+        first = client.get(f"{base}/page", params={"id": 1})
+        second = client.get(f"{base}/page", params={"id": 1})
+        assert first.status_code == 200 and not first.not_modified
+        assert second.status_code == 200 and second.not_modified
+        assert second.content == PAGE and second.text == first.text
+        assert Handler.requests == [("/page?id=1", None), ("/page?id=1", '"v1"')]
+
+        # Téléchargement forcé : pas d'en-tête conditionnel
+        assert not client.get(f"{base}/page", params={"id": 1}, conditional=False).not_modified
+        stats = client.stats()
+        assert stats["nb_requests"] == 3 and stats["nb_not_modified"] == 1, stats
+        assert stats["bytes_downloaded"] == 2 * len(PAGE), stats
+    finally:
+        client.close()
+        server.shutdown()
+        server.server_close()
+
+
+def test_conditional_get_from_cache():
+    # Une entrée périmée du cache disque fournit l'ETag et le corps de la 304
+    server, base = start_server()
+    with tempfile.TemporaryDirectory() as tmp:
+        client = new_client(cache=ResponseCache(Path(tmp), ttl=0))
+        try:
+            client.get(f"{base}/page")
+            client.validators = type(client.validators)()
+            response = client.get(f"{base}/page")
+            assert response.not_modified and not response.from_cache
+            assert response.content == PAGE
+            assert Handler.requests[-1] == ("/page", '"v1"')
+            # Fraîche avec max_age : servie sans requête
+            response = client.get(f"{base}/page", max_age=60)
+            assert response.from_cache and len(Handler.requests) == 2
+        finally:
+            client.close()
+            server.shutdown()
+            server.server_close()
+
+
+def test_retries():
+    server, base = start_server()
+    client = new_client()
+    try:
+        # 429 puis 503 : nouvel essai, chacun sous une nouvelle place du limiteur
+        Handler.flaky = [(429, "0.1"), (503, "0")]
+        response = client.get(f"{base}/instable")
+        assert response.status_code == 200 and response.content == PAGE
+        assert client.url_stats[f"{base}/instable"]["attempts"] == 3
+        assert client.rate_limiter.nb_requests == 3
+        # L'hôte a été ralenti deux fois, puis réaccéléré après le succès
+        assert client.rate_limiter.bucket(base).rate == 100 / 4 + 10
+
+        # Au-delà de `retries`, la dernière réponse en erreur est retournée
+        Handler.flaky = [(500, "0")] * 4
+        client.retries = 2
+        assert client.get(f"{base}/instable").status_code == 500
+        assert len(Handler.flaky) == 1
+    finally:
+        client.close()
+        server.shutdown()
+        server.server_close()
+
+
+def test_retry_after_seconds():
+    assert retry_after_seconds("2") == 2.0
+    assert retry_after_seconds("-3") == 0.0
+    assert retry_after_seconds("Wed, 21 Oct 2015 07:28:00 GMT") == 0.0
+    assert retry_after_seconds("bientôt") is None
+    assert retry_after_seconds(None) is None
+
+
+if __name__ == "__main__":
+    test_conditional_get()
+    test_conditional_get_from_cache()
+    test_retries()
+    test_retry_after_seconds()
+    print("Client HTTP du scraping : tous les tests passent")
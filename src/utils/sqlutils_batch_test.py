@@ -0,0 +1,189 @@
+import tempfile
+from pathlib import Path
+
+from schemaDB import schemaDB, indexesDB, ftsDB
+from sqlutils import sqlutils
+
+"""
+Vérifie les écritures en lot de sqlutils (insert avec détection des doublons, upsert,
+update_many, load_from_csv) et la recherche plein texte synchronisée par triggers.
+
+Exemple (depuis le dossier src/utils) :
+    python sqlutils_batch_test.py
+"""
+
+
+COLAVIS = ["id_restaurant", "nom_utilisateur", "date_avis", "titre_avis", "contenu_avis"]
+
+
+def new_db(tmp):
+    """Base vide avec les tables restaurants et avis, et un restaurant."""
+    db = sqlutils(Path(tmp) / "friands.db")
+    for table in ("restaurants", "avis"):
+        db.create_table(table, schemaDB[table], indexesDB[table])
+    db.insert("restaurants", [("Bouchon", "https://example.org/bouchon")], column_names=["nom", "url"])
+    db.commit()
+    return db
+
+
+def avis(user, contenu="Très bon", date="2024-05-01"):
+    return (1, user, date, f"Avis de {user}", contenu)
+
+
+def test_insert_duplicates():
+    with tempfile.TemporaryDirectory() as tmp:
+        db = new_db(tmp)
+        success, message = db.insert("avis", [avis("alice")], COLAVIS, chk_duplicates=True)
+        assert success, message
+        db.commit()
+
+        # Un seul doublon (même clé naturelle) annule tout le lot
+        success, message = db.insert(
+            "avis", [avis("bob"), avis("alice", "Autre texte")], COLAVIS, chk_duplicates=True
+        )
+        assert not success and "alice" in message, message
+        assert db.select("SELECT COUNT(*) FROM avis")[1] == [(1,)]
+
+        # Sans colonne pour comparer les lignes : erreur plutôt que tout rejeter
+        success, message = db.insert("avis", [(None,)], ["id_avis"], chk_duplicates=True)
+        assert not success and "Aucune colonne" in message, message
+        db.close()
+
+
+def test_upsert_report():
+    with tempfile.TemporaryDirectory() as tmp:
+        db = new_db(tmp)
+        db.insert("avis", [avis("alice")], COLAVIS)
+        db.commit()
+
+        rows = [avis("alice", "Modifié"), avis("bob"), avis("bob", "Répété"), avis(None), avis(None)]
+        success, report = db.upsert("avis", rows, COLAVIS)
+        assert success, report
+        # NULL n'est égal à rien : les avis sans utilisateur sont tous insérés
+        assert report["inserted"] == [rows[1], rows[3], rows[4]], report
+        assert report["skipped"] == [rows[0], rows[2]], report
+        assert report["updated"] == [], report
+        db.commit()
+
+        success, report = db.upsert("avis", [avis("bob", "Mis à jour")], COLAVIS, update=True)
+        assert success and len(report["updated"]) == 1, report
+        db.commit()
+        assert db.select(
+            "SELECT contenu_avis FROM avis WHERE nom_utilisateur IN ('alice', 'bob') ORDER BY id_avis"
+        )[1] == [("Très bon",), ("Mis à jour",)]
+        db.close()
+
+
+def test_upsert_savepoint():
+    # Une erreur annule les lignes de l'appel, pas les écritures précédentes
+    with tempfile.TemporaryDirectory() as tmp:
+        db = new_db(tmp)
+        db.insert("avis", [avis("alice")], COLAVIS)
+        success, message = db.upsert(
+            "avis",
+            [(1, 1, "bob", "2024-05-02", "Titre", "Texte"), (2, 1, "carol", "2024-05-02", "Titre", "Texte")],
+            ["id_avis"] + COLAVIS,
+        )
+        assert not success and "UNIQUE" in message, message
+        db.commit()
+        assert db.select("SELECT nom_utilisateur FROM avis")[1] == [("alice",)]
+        db.close()
+
+
+def test_update_many():
+    with tempfile.TemporaryDirectory() as tmp:
+        db = new_db(tmp)
+        db.insert("avis", [avis("alice"), avis("bob")], COLAVIS)
+        db.commit()
+
+        success, message = db.update_many("avis", "id_avis", [(5, 1), (3, 2), (4, 99)], ["label"])
+        assert success and message.startswith("2 row(s)"), message
+        success, message = db.update_many(
+            "avis", "id_avis", [{"id_avis": 1, "label": 1, "titre_avis": "Nouveau"}]
+        )
+        assert success, message
+        db.commit()
+        assert db.select("SELECT label, titre_avis FROM avis ORDER BY id_avis")[1] == [
+            (1, "Nouveau"),
+            (3, "Avis de bob"),
+        ]
+
+        # Tout ou rien : la seconde ligne reprend la clé naturelle de la première
+        success, message = db.update_many(
+            "avis",
+            "id_avis",
+            [("carol", "Avis de carol", 2), ("carol", "Avis de carol", 1)],
+            ["nom_utilisateur", "titre_avis"],
+        )
+        assert not success and "UNIQUE" in message, message
+        db.commit()
+        assert db.select("SELECT nom_utilisateur FROM avis ORDER BY id_avis")[1] == [
+            ("alice",),
+            ("bob",),
+        ]
+        db.close()
+
+
+def test_load_from_csv():
+    with tempfile.TemporaryDirectory() as tmp:
+        db = new_db(tmp)
+        csv_path = Path(tmp) / "avis.csv"
+        lines = ["id_restaurant,nom_utilisateur,note_restaurant,contenu_avis"]
+        lines += [f"1,client {i},{i % 5}.0,Avis {i}" for i in range(25)]
+        lines += ["1,ligne courte"]
+        csv_path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+
+        success, message = db.load_from_csv(
+            "avis", csv_path, batch_size=10, converters={"note_restaurant": float}
+        )
+        assert success and "26 rows" in message, message
+        assert db.select("SELECT COUNT(*), SUM(note_restaurant) FROM avis")[1] == [(26, 50.0)]
+        assert db.select("SELECT note_restaurant FROM avis WHERE nom_utilisateur = 'ligne courte'")[1] == [
+            (None,)
+        ]
+
+        # Une erreur en cours de chargement annule tout le fichier
+        csv_path.write_text("id_avis,contenu_avis\n100,ok\n1,clé déjà prise\n", encoding="utf-8")
+        success, message = db.load_from_csv("avis", csv_path)
+        assert not success and "UNIQUE" in message, message
+        assert db.select("SELECT COUNT(*) FROM avis")[1] == [(26,)]
+        db.close()
+
+
+def test_search_reviews():
+    with tempfile.TemporaryDirectory() as tmp:
+        db = new_db(tmp)
+        db.insert("avis", [avis("alice", "Le café était excellent")], COLAVIS)
+        db.commit()
+        success, message = db.create_fts("avis_fts", ftsDB["avis_fts"])
+        assert success, message
+        db.commit()
+
+        # Lignes déjà présentes indexées, accents et casse ignorés, mots en préfixe
+        success, rows = db.search_reviews("CAFE excel")
+        assert success and len(rows) == 1, rows
+        assert "**café**" in rows[0][4], rows
+        assert db.search_reviews('"(') == (True, [])
+
+        # Les triggers suivent les insertions, modifications et suppressions
+        db.insert("avis", [avis("bob", "Service lent")], COLAVIS)
+        db.update("avis", {"contenu_avis": "Thé tiède"}, ["nom_utilisateur = 'alice'"])
+        db.commit()
+        assert db.search_reviews("lent")[1][0][0] == 2
+        assert db.search_reviews("café") == (True, [])
+        assert db.search_reviews("the", id_restaurant=1)[1][0][0] == 1
+        assert db.search_reviews("the", id_restaurant=2) == (True, [])
+        db.delete("avis", ["id_avis = 2"])
+        db.commit()
+        assert db.search_reviews("lent") == (True, [])
+        db.close()
+
+
+if __name__ == "__main__":
+    test_insert_duplicates()
+    test_upsert_report()
+    test_upsert_savepoint()
+    test_update_many()
+    test_load_from_csv()
+    test_search_reviews()
+    print("Écritures en lot et recherche plein texte : tous les tests passent")